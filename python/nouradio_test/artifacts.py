@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import os
+import sys
+import json
+import shutil
+import zipfile
+import tempfile
+from pathlib import Path
+from threading import Lock
+
+# Add the local path here to make local includes easier
+try:
+    import executor
+except:
+    sys.path.append(str(Path(__file__).parent))
+    print(f"Note: Adding path {Path(__file__).parent} to the python path.")
+    import executor
+
+# The blob store of a results directory, next to its run folders
+BLOB_STORE_NAME = ".blobs"
+
+# The member of a packed run that lists its files
+ARCHIVE_INDEX_NAME = "index.json"
+
+# Files that are rewritten in place after a test finishes, so they must never share their contents
+NEVER_SHARED = {executor.RESULT_FILE_NAME, executor.COMPLETION_MARKER}
+
+# Already compressed, so they are stored in archives as is
+COMPRESSED_SUFFIXES = {".gz", ".png", ".jpg", ".jpeg", ".zip"}
+
+
+class BlobStore:
+    """A content-addressed store of artifact files.  Identical files in any configuration of any run are hard
+    links to one blob, so they take the space and the inode of one file.  Treat the linked files as read-only:
+    writing to one changes all of them.
+
+    Blobs that are no longer linked from any artifact folder are removed by prune().
+    """
+    def __init__(self, store_dir: str | Path):
+        """Open (or create) a blob store.
+
+        Args:
+            store_dir (str | Path): The store location.  It must be on the same file system as the artifacts.
+        """
+        self.store_dir: Path = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.lock = Lock()
+        self.linked_files: int = 0
+        self.saved_bytes: int = 0
+
+    def blob_path(self, digest: str) -> Path:
+        return self.store_dir / digest[:2] / digest
+
+    def add(self, path: Path) -> Path:
+        """Make sure a file's contents are in the store.  The blob is always a copy, so the file can still be
+        rewritten without changing the blob or the artifacts that link to it.
+
+        Returns:
+            Path: The blob
+        """
+        blob = self.blob_path(executor.FileHash(path))
+        if not blob.exists():
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            # Copy to a temporary name and rename, so other processes never see a partial blob.  The file itself is
+            # never linked into the store, since whoever wrote it may rewrite it later.
+            handle, temp_path = tempfile.mkstemp(dir=blob.parent, suffix=".tmp")
+            os.close(handle)
+            try:
+                shutil.copyfile(path, temp_path)
+                os.replace(temp_path, blob)
+            except OSError:
+                Path(temp_path).unlink(missing_ok=True)
+                raise
+        return blob
+
+    def place(self, source: str | Path, destination: str | Path):
+        """Put a file at its destination as a link to its blob, instead of copying it.  Falls back to a copy.
+        """
+        source, destination = Path(source), Path(destination)
+        if destination.is_dir():
+            destination = destination / source.name
+        try:
+            blob = self.add(source)
+            os.link(blob, destination)
+        except OSError:
+            # Different file systems, or links are not supported
+            shutil.copy2(source, destination)
+            return
+        with self.lock:
+            self.linked_files += 1
+            self.saved_bytes += blob.stat().st_size
+
+    def deduplicate(self, folder: str | Path) -> int:
+        """Replace every file in a folder with a link to its blob.  Files that are rewritten later (result.json and
+        the completion marker) are left alone.
+
+        Returns:
+            int: The number of files that now share a blob with another file
+        """
+        shared = 0
+        for path in sorted(Path(folder).rglob("*")):
+            if not path.is_file() or path.is_symlink() or path.name in NEVER_SHARED or path.suffix == ".tmp":
+                continue
+            try:
+                blob = self.add(path)
+                if os.path.samefile(blob, path):
+                    continue
+                # Link under a temporary name and rename over the file, so it is never missing
+                temp_path = path.with_name(f".{path.name}.link.tmp")
+                os.link(blob, temp_path)
+                os.replace(temp_path, path)
+            except OSError as e:
+                print(f"Warning: could not deduplicate {str(path)}: {e}")
+                continue
+            shared += 1
+            with self.lock:
+                self.linked_files += 1
+                self.saved_bytes += blob.stat().st_size
+        return shared
+
+    def prune(self) -> int:
+        """Remove the blobs that are not linked from anywhere else, for example after old runs were deleted.
+
+        Returns:
+            int: The number of blobs removed
+        """
+        removed = 0
+        for blob in self.store_dir.glob("*/*"):
+            try:
+                if blob.stat().st_nlink == 1:
+                    blob.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def stats(self) -> dict:
+        return {"linked_files": self.linked_files, "saved_bytes": self.saved_bytes}
+
+def PackRun(run_folder: str | Path, archive: str | Path | None = None, remove: bool = False) -> Path:
+    """Pack a finished run folder into one zip archive.  Files with the same contents are stored once.  An
+    index.json member lists every file with its size, hash and the member that holds its contents, so single
+    files can be listed and extracted without unpacking the archive.  See ListArchive() and ExtractFromArchive().
+
+    Args:
+        run_folder (str | Path): The run folder
+        archive (str | Path | None, optional): The archive to write. Defaults to None (the run folder name with ".zip").
+        remove (bool, optional): Delete the run folder once the archive is written. Defaults to False.
+
+    Returns:
+        Path: The archive
+    """
+    run_folder = Path(run_folder)
+    archive = run_folder.with_name(f"{run_folder.name}.zip") if archive is None else Path(archive)
+    temp_archive = archive.with_name(f".{archive.name}.tmp")
+    index = {}
+    members = {} # hash: member name
+    with zipfile.ZipFile(temp_archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        for path in sorted(run_folder.rglob("*")):
+            if not path.is_file():
+                continue
+            name = path.relative_to(run_folder).as_posix()
+            digest = executor.FileHash(path)
+            if digest not in members:
+                compression = zipfile.ZIP_STORED if path.suffix.lower() in COMPRESSED_SUFFIXES else zipfile.ZIP_DEFLATED
+                zf.write(path, name, compress_type=compression)
+                members[digest] = name
+            index[name] = {"size": path.stat().st_size, "sha256": digest, "member": members[digest]}
+        zf.writestr(ARCHIVE_INDEX_NAME, json.dumps({"run": run_folder.name, "files": index}, indent=2))
+    os.replace(temp_archive, archive)
+    print(f"Packed {len(index)} files ({len(members)} unique) from {str(run_folder)} into {str(archive)}")
+
+    if remove:
+        shutil.rmtree(run_folder)
+    return archive
+
+def ReadArchiveIndex(archive: str | Path) -> dict:
+    with zipfile.ZipFile(archive, "r") as zf:
+        return json.loads(zf.read(ARCHIVE_INDEX_NAME))
+
+def ListArchive(archive: str | Path) -> dict[str, dict]:
+    """List the files of a packed run.
+
+    Returns:
+        dict[str, dict]: The size, hash and archive member of each file, by its path in the run folder
+    """
+    return ReadArchiveIndex(archive)["files"]
+
+def ExtractFromArchive(archive: str | Path, names: list[str], output_dir: str | Path) -> list[Path]:
+    """Extract some files of a packed run.  Only those files are read from the archive.
+
+    Args:
+        archive (str | Path): The archive from PackRun()
+        names (list[str]): Paths in the run folder, such as "Test_1_Config_1/stdout.txt".  A folder name extracts everything in it.
+        output_dir (str | Path): Where to extract them, keeping their paths
+
+    Raises:
+        KeyError: A file is not in the archive.
+
+    Returns:
+        list[Path]: The extracted files
+    """
+    output_dir = Path(output_dir)
+    extracted = []
+    with zipfile.ZipFile(archive, "r") as zf:
+        files = json.loads(zf.read(ARCHIVE_INDEX_NAME))["files"]
+        for name in names:
+            name = name.strip("/")
+            matches = [file for file in files if file == name or file.startswith(f"{name}/")]
+            if not matches:
+                raise KeyError(f"{name} is not in {str(archive)}")
+            for file in matches:
+                destination = output_dir / file
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                with zf.open(files[file]["member"]) as source, open(destination, "wb") as of:
+                    shutil.copyfileobj(source, of)
+                extracted.append(destination)
+    return extracted
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+from pathlib import Path
+from threading import Lock
+
+
+class BatchCompiler:
+    """Compile flowgraphs in this process, the same way grcc does.  Each grcc call imports GNU Radio and
+    builds the whole block library before compiling a single file.  This class does that once and then
+    compiles any number of flowgraphs.
+
+    The GRC platform is not thread safe, so compilations through one BatchCompiler run one at a time.
+    """
+    def __init__(self):
+        """Load the GRC platform and block library.  This takes a few seconds.
+
+        Raises:
+            ImportError: GNU Radio Companion is not installed in this environment.
+        """
+        from gnuradio import gr
+        from gnuradio.grc.core.platform import Platform
+
+        self.platform = Platform(
+            name="GNU Radio Companion Compiler",
+            prefs=gr.prefs(),
+            version=gr.version(),
+            version_parts=(gr.major_version(), gr.api_version(), gr.minor_version()),
+        )
+        self.platform.build_library()
+        self.lock = Lock()
+
+    def compile(self, grc_file: str | Path, output_dir: str | Path | None = None) -> str:
+        """A drop-in replacement for grc_utilities.CompileFlowgraph().
+
+        Args:
+            grc_file (str | Path): The .grc file to compile
+            output_dir (str | Path | None, optional): Where to put the python file. Defaults to None (next to the .grc file).
+
+        Raises:
+            RuntimeError: The flowgraph is not valid.  The message contains the validation errors.
+
+        Returns:
+            str: The path of the generated python file
+        """
+        grc_file = Path(grc_file).absolute()
+        output_dir = grc_file.parent if output_dir is None else Path(output_dir).absolute()
+        print(f"Generating .py for {grc_file}")
+        with self.lock:
+            flow_graph = self.platform.make_flow_graph(str(grc_file))
+            flow_graph.validate()
+            if not flow_graph.is_valid():
+                messages = [str(message) for _, message in flow_graph.iter_error_messages()]
+                raise RuntimeError(f"Flowgraph is not valid: {'; '.join(messages)}")
+            output_dir.mkdir(parents=True, exist_ok=True)
+            generator = self.platform.Generator(flow_graph, str(output_dir))
+            generator.write()
+        return str(generator.file_path)
+
+
+# One compiler per process, created on first use
+_shared_compiler: BatchCompiler | None = None
+_shared_compiler_lock = Lock()
+
+def SharedBatchCompiler() -> BatchCompiler:
+    """Get this process's BatchCompiler, loading the GRC platform the first time.
+
+    Raises:
+        ImportError: GNU Radio Companion is not installed in this environment.
+    """
+    global _shared_compiler
+    with _shared_compiler_lock:
+        if _shared_compiler is None:
+            _shared_compiler = BatchCompiler()
+        return _shared_compiler
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import math
+
+# Written to the run folder for each search, after the configuration name
+SEARCH_FILE_SUFFIX = ".search.json"
+
+def MaxRuns(start: float, stop: float, tolerance: float) -> int:
+    """The most flowgraph runs a bisect search can take: both ends, then one run per halving of the interval
+    until it is within the tolerance.
+    """
+    width = abs(stop - start)
+    if width <= tolerance:
+        return 2
+    return 2 + math.ceil(math.log2(width / tolerance))
+
+def FormatValue(value: float | int) -> str:
+    """Write a value the way it is passed on the command line and shown in names.
+    """
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+def Passed(result: dict | None) -> bool:
+    """A point passes if its flowgraph exited normally and no Test: Stream Watch block saw a failure.
+    """
+    return result is not None and result.get("exit_code") == 0 and not result.get("stream_watch_failures")
+
+
+class BisectSearch:
+    """Find where a test changes from passing to failing as one variable moves from start to stop, for example
+    the lowest SNR that still passes.  Both ends are run first.  If they have the same outcome, there is no
+    boundary in the interval and the search stops.  Otherwise the interval is halved after each run, keeping
+    the half whose ends still differ, until it is no wider than the tolerance.
+
+    The search only chooses the values.  The caller runs each one and reports whether it passed.
+    """
+    def __init__(self, variable: str, start: float, stop: float, tolerance: float, integer: bool = False):
+        """
+        Args:
+            variable (str): The id of the variable being searched
+            start (float): One end of the interval
+            stop (float): The other end.  It may be lower than start.
+            tolerance (float): Stop once the passing and failing values are this close
+            integer (bool, optional): Only try whole numbers. Defaults to False.
+
+        Raises:
+            ValueError: The tolerance is not positive.
+        """
+        if not tolerance > 0:
+            raise ValueError(f"The bisect tolerance of {variable} must be positive, not {tolerance}")
+        self.variable: str = variable
+        self.integer: bool = integer
+        self.start: float | int = int(start) if integer else float(start)
+        self.stop: float | int = int(stop) if integer else float(stop)
+        self.tolerance: float = tolerance
+        self.points: list[dict] = []
+        self.outcomes: dict = {} # value: passed
+        self.low: float | int | None = None # The end of the current interval with the same outcome as start
+        self.high: float | int | None = None
+
+    def max_runs(self) -> int:
+        return MaxRuns(self.start, self.stop, self.tolerance)
+
+    def next_value(self) -> float | int | None:
+        """The next value to run.
+
+        Returns:
+            float | int | None: The value, or None when the search is finished
+        """
+        for end in (self.start, self.stop):
+            if end not in self.outcomes:
+                return end
+        if self.outcomes[self.start] == self.outcomes[self.stop] or len(self.points) >= self.max_runs():
+            return None
+        if self.low is None:
+            self.low, self.high = self.start, self.stop
+        if abs(self.high - self.low) <= self.tolerance:
+            return None
+        middle = math.floor((self.low + self.high) / 2) if self.integer else (self.low + self.high) / 2
+        if middle in self.outcomes:
+            # Whole numbers next to each other
+            return None
+        return middle
+
+    def report(self, value: float | int, passed: bool, name: str | None = None):
+        """Record the outcome of a value from next_value().
+
+        Args:
+            value (float | int): The value that was run
+            passed (bool): Whether the test passed.  See Passed().
+            name (str | None, optional): The configuration that ran it. Defaults to None.
+        """
+        self.outcomes[value] = passed
+        self.points.append({"value": value, "passed": passed, "name": name})
+        if self.low is not None:
+            if passed == self.outcomes[self.start]:
+                self.low = value
+            else:
+                self.high = value
+
+    def boundary(self) -> dict | None:
+        """The closest passing and failing values, or None if the test passed (or failed) at both ends.
+        """
+        if self.start not in self.outcomes or self.stop not in self.outcomes or self.outcomes[self.start] == self.outcomes[self.stop]:
+            return None
+        low, high = (self.start, self.stop) if self.low is None else (self.low, self.high)
+        passing, failing = (low, high) if self.outcomes[self.start] else (high, low)
+        return {"passing": passing, "failing": failing, "width": abs(high - low)}
+
+    def to_dict(self) -> dict:
+        return {
+            "variable": self.variable,
+            "start": self.start,
+            "stop": self.stop,
+            "tolerance": self.tolerance,
+            "runs": len(self.points),
+            "max_runs": self.max_runs(),
+            "boundary": self.boundary(),
+            "points": self.points,
+        }
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import io
+import os
+import sys
+import gzip
+import time
+import asyncio
+import threading
+import concurrent.futures
+from collections import deque
+from functools import lru_cache
+from pathlib import Path
+
+# How much is read from a pipe at once
+CHUNK_BYTES = 1 << 16
+
+class OutputOptions:
+    """How the stdout and stderr of each flowgraph are captured.
+    """
+    def __init__(self, max_bytes: int = 0, compress: bool = False, live: bool = False):
+        """
+        Args:
+            max_bytes (int, optional): Keep at most this many bytes of each stream: the first half and the last half of the
+                output, with a note of how much was left out between them.  0 keeps everything. Defaults to 0.
+            compress (bool, optional): Write stdout.txt.gz and stderr.txt.gz instead. Defaults to False.
+            live (bool, optional): Also print each line to the console as it arrives, prefixed with the test name.  Only
+                the lines kept in the first half are printed. Defaults to False.
+        """
+        self.max_bytes: int = max_bytes
+        self.compress: bool = compress
+        self.live: bool = live
+
+
+class BoundedOutput:
+    """Write one output stream to a file, keeping only its head and tail once it grows past a limit.  The head
+    is written as it arrives.  The tail is kept in memory, in the chunks it was read in, until close().
+    """
+    def __init__(self, path: str | Path, options: OutputOptions, prefix: str | None = None, console = None):
+        """
+        Args:
+            path (str | Path): The output file.  ".gz" is added when compressing.
+            options (OutputOptions): The limits
+            prefix (str | None, optional): Print each line to the console with this prefix. Defaults to None (do not print).
+            console (optional): Where live lines are printed. Defaults to None (sys.stdout).
+        """
+        self.path: Path = Path(f"{path}.gz") if options.compress else Path(path)
+        self.file = gzip.open(self.path, "wb") if options.compress else open(self.path, "wb")
+        self.head_bytes: int | None = options.max_bytes - options.max_bytes // 2 if options.max_bytes else None
+        self.tail_bytes: int = options.max_bytes // 2
+        self.tail: deque[bytes] = deque()
+        self.tail_size: int = 0
+        self.written: int = 0
+        self.total: int = 0
+        self.prefix: str | None = prefix if options.live else None
+        self.console = sys.stdout if console is None else console
+        self.line: bytes = b""
+        self.stats: dict = {}
+        self.closed = threading.Event()
+
+    def write(self, data: bytes):
+        self.total += len(data)
+        if self.head_bytes is not None:
+            room = self.head_bytes - self.written
+            if len(data) > room:
+                # Nothing has been dropped before this write, so this is the first one past the limit.  The head
+                # may already be full if the previous write ended exactly at the limit.
+                if self.total - len(data) == self.written:
+                    if room > 0:
+                        self.write_head(data[:room])
+                    self.flush_live()
+                    if self.prefix is not None:
+                        print(f"[{self.prefix}] ... output is over the limit.  The end is kept in {self.path.name}.", file=self.console)
+                self.keep_tail(data[max(room, 0):])
+                return
+        self.write_head(data)
+
+    def write_head(self, data: bytes):
+        self.file.write(data)
+        self.written += len(data)
+        self.print_live(data)
+
+    def keep_tail(self, data: bytes):
+        if not self.tail_bytes:
+            return
+        self.tail.append(data)
+        self.tail_size += len(data)
+        while self.tail_size - len(self.tail[0]) >= self.tail_bytes:
+            self.tail_size -= len(self.tail.popleft())
+
+    def print_live(self, data: bytes):
+        if self.prefix is None:
+            return
+        *lines, self.line = (self.line + data).split(b"\n")
+        for line in lines:
+            print(f"[{self.prefix}] {line.decode(errors='replace').rstrip()}", file=self.console)
+
+    def flush_live(self):
+        """Print the last partial line.
+        """
+        if self.line:
+            self.print_live(b"\n")
+
+    def close(self) -> dict:
+        """Write the tail and close the file.
+
+        Returns:
+            dict: The file name, the total size of the stream and how many bytes were left out of the file
+        """
+        tail = b"".join(self.tail)[-self.tail_bytes:] if self.tail_bytes else b""
+        omitted = self.total - self.written - len(tail)
+        if omitted:
+            self.file.write(f"\n... {omitted} bytes omitted ...\n".encode())
+        self.file.write(tail)
+        self.flush_live()
+        self.file.close()
+        self.stats = {"file": self.path.name, "bytes": self.total, "omitted_bytes": omitted}
+        self.closed.set()
+        return self.stats
+
+
+class CaptureLoop:
+    """An asyncio event loop in a background thread that pumps the output of every running flowgraph.  One
+    loop serves all flowgraphs, however many run at once.
+    """
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def pump(self, fd: int, output: BoundedOutput) -> concurrent.futures.Future:
+        """Copy everything read from a pipe to an output until the pipe closes.  The output is closed at the end.
+
+        Returns:
+            concurrent.futures.Future: Done when the pipe has been drained, with the output's statistics
+        """
+        return asyncio.run_coroutine_threadsafe(Pump(fd, output), self.loop)
+
+@lru_cache(maxsize=None)
+def SharedCaptureLoop() -> CaptureLoop:
+    return CaptureLoop()
+
+async def Pump(fd: int, output: BoundedOutput) -> dict:
+    loop = asyncio.get_running_loop()
+    pipe = os.fdopen(fd, "rb", buffering=0)
+    transport = None
+    try:
+        if os.name == "posix":
+            reader = asyncio.StreamReader(limit=CHUNK_BYTES)
+            transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+            while chunk := await reader.read(CHUNK_BYTES):
+                output.write(chunk)
+        else:
+            # Windows event loops cannot watch anonymous pipes, so read in a worker thread
+            while chunk := await loop.run_in_executor(None, pipe.read, CHUNK_BYTES):
+                output.write(chunk)
+    finally:
+        if transport is not None:
+            transport.close()
+        else:
+            pipe.close()
+        stats = output.close()
+    return stats
+
+
+class OutputCapture:
+    """Capture the stdout and stderr of one flowgraph through pipes, with the limits of OutputOptions.
+
+    A flowgraph started with subprocess.Popen is given the write ends of two pipes.  A flowgraph started by the
+    fork server opens two named pipes (FIFOs) in its folder instead.  Each FIFO is also held open for writing here
+    until the flowgraph exits, so it is not seen as closed before the flowgraph has opened it.
+    """
+    def __init__(self, folder: str | Path, options: OutputOptions, name: str | None = None, use_fifos: bool = False):
+        """Create the pipes and start pumping them.
+
+        Args:
+            folder (str | Path): The test's artifact folder, where stdout.txt and stderr.txt are written
+            options (OutputOptions): The limits
+            name (str | None, optional): The prefix for live output. Defaults to None (the folder name).
+            use_fifos (bool, optional): Use named pipes that another process can open. Defaults to False.
+        """
+        folder = Path(folder)
+        name = folder.name if name is None else name
+        self.targets: dict[str, int | str] = {}
+        self.write_fds: list[int] = []
+        self.fifos: list[Path] = []
+        self.outputs: dict[str, BoundedOutput] = {}
+        self.futures: dict[str, concurrent.futures.Future] = {}
+        for stream, console in (("stdout", sys.stdout), ("stderr", sys.stderr)):
+            output = BoundedOutput(folder / f"{stream}.txt", options, name, console)
+            if use_fifos:
+                fifo = folder / f".{stream}.fifo"
+                os.mkfifo(fifo)
+                self.fifos.append(fifo)
+                read_fd = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+                self.write_fds.append(os.open(fifo, os.O_WRONLY | os.O_NONBLOCK))
+                self.targets[stream] = str(fifo)
+            else:
+                read_fd, write_fd = os.pipe()
+                self.write_fds.append(write_fd)
+                self.targets[stream] = write_fd
+            self.outputs[stream] = output
+            self.futures[stream] = SharedCaptureLoop().pump(read_fd, output)
+
+    def started(self):
+        """Call once the flowgraph has been started with subprocess.Popen, to close this process's copy of the pipes.
+        """
+        if not self.fifos:
+            self.close_write_fds()
+
+    def close_write_fds(self):
+        for fd in self.write_fds:
+            os.close(fd)
+        self.write_fds = []
+
+    def finish(self, timeout_s: float | None = None) -> dict:
+        """Wait for the output to be drained after the flowgraph exits.  Processes started by the flowgraph may keep
+        the pipes open, so stop waiting after timeout_s.
+
+        Returns:
+            dict: The statistics of each stream.  See BoundedOutput.close().
+        """
+        self.close_write_fds()
+        deadline = None if timeout_s is None else time.monotonic() + timeout_s
+        stats = {}
+        for stream, future in self.futures.items():
+            try:
+                stats[stream] = future.result(None if deadline is None else max(0, deadline - time.monotonic()))
+            except concurrent.futures.TimeoutError:
+                # Stop reading.  The output is closed with what was read so far.
+                future.cancel()
+                self.outputs[stream].closed.wait(1.0)
+                stats[stream] = self.outputs[stream].stats | {"incomplete": True}
+        for fifo in self.fifos:
+            fifo.unlink(missing_ok=True)
+        return stats
+
+def OpenOutput(path: str | Path) -> io.TextIOBase:
+    """Open a captured output file for reading, whether or not it was compressed.
+
+    Args:
+        path (str | Path): The uncompressed name, such as folder / "stdout.txt"
+
+    Raises:
+        OSError: Neither file exists.
+
+    Returns:
+        io.TextIOBase: The text
+    """
+    path = Path(path)
+    if not path.exists() and Path(f"{path}.gz").exists():
+        return gzip.open(f"{path}.gz", "rt", errors="replace")
+    return open(path, "r", errors="replace")
@@ -0,0 +1,391 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import sys
+import json
+import shutil
+import argparse
+import itertools
+import tempfile
+from pathlib import Path
+
+# Add the local path here to make local includes easier
+try:
+    import generate_tests as gt
+    import grc_utilities as gru
+    import sharding
+    import artifacts
+    import compare
+except:
+    sys.path.append(str(Path(__file__).parent))
+    print(f"Note: Adding path {Path(__file__).parent} to the python path.")
+    import generate_tests as gt
+    import grc_utilities as gru
+    import sharding
+    import artifacts
+    import compare
+
+def StagingFolder(staging_dir: Path, grc_file: Path, grc_count: int) -> Path:
+    """Where the configurations of one .grc file are generated.  With several files, each gets its own
+    subfolder so flowgraphs with the same test names do not overwrite each other.
+    """
+    folder = staging_dir / grc_file.stem if grc_count > 1 else staging_dir
+    folder.mkdir(parents=True, exist_ok=True)
+    return folder
+
+def ShardDurations(args: argparse.Namespace) -> dict | None:
+    """The recorded durations used to balance the shards, if any run folders were given.
+    """
+    if not args.balance_from:
+        return None
+    return sharding.ReadDurations(args.balance_from)
+
+def GenerateOptions(args: argparse.Namespace) -> dict:
+    """The keyword arguments shared by PrepareTests() and StreamTests().
+    """
+    return {
+        "workers": args.workers,
+        "compile": args.compile,
+        "compiler": args.compiler,
+        "parameterize": args.parameterize,
+        "shard_index": args.shard_index,
+        "shard_count": args.shard_count,
+        "durations": ShardDurations(args),
+        "headless": args.headless,
+    }
+
+def History(args: argparse.Namespace) -> tuple[dict, dict | None]:
+    """Read the recorded durations for estimates: the results database first, then any run folders given.
+
+    Returns:
+        tuple[dict, dict | None]: The duration of each configuration, and the mean duration of each test if known
+    """
+    durations = {}
+    test_durations = None
+    database_path = args.artifacts_dir / args.results_db
+    if database_path.is_file():
+        database = gt.ResultsDatabase(database_path)
+        durations.update(database.durations())
+        test_durations = database.test_durations()
+        database.close()
+    if args.history:
+        durations.update(sharding.ReadDurations(args.history))
+    return durations, test_durations
+
+def FormatDuration(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.1f} s"
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}"
+
+def Plan(args: argparse.Namespace) -> int:
+    """Print the tests and modifiers of each flowgraph, and the configurations they expand to.  With recorded
+    durations, also estimate how long running them will take.  Nothing is written.
+    """
+    durations, test_durations = History(args)
+    plans = {}
+    all_configurations = []
+    for grc_file in args.grc_files:
+        plan = gt.TestPlan(gru.LoadDocument(grc_file))
+        configurations = gt.IterateTestConfigurations(plan, args.parameterize, args.headless)
+        if args.shard_count > 1:
+            configurations = sharding.SelectShard(configurations, args.shard_index, args.shard_count, ShardDurations(args))
+        configurations = [configuration for configuration, _ in configurations]
+        all_configurations += configurations
+        plans[str(grc_file)] = plan.to_dict() | {"configurations": [configuration.to_dict() for configuration in configurations]}
+
+        if args.json:
+            continue
+        print(f"{str(grc_file)}:")
+        for test_name in plan.test_names:
+            test_configurations = [configuration for configuration in configurations if configuration.test_name == test_name]
+            print(f"   {test_name}: {len(test_configurations)} configurations")
+            for block_name in plan.matrix[test_name]:
+                print(f"      {block_name} ({plan.modifiers[block_name]['type']})")
+            if args.counts_only:
+                continue
+            for configuration in test_configurations:
+                values = ", ".join(f"{variable}={value}" for variable, value in configuration.values.items())
+                print(f"      > {configuration.name}" + (f" ({values})" if values else ""))
+                if configuration.search is not None:
+                    search = configuration.search
+                    print(f"        bisect {search['variable']} from {search['start']} to {search['stop']} to within {search['tolerance']}: "
+                          f"up to {configuration.max_runs()} runs")
+        print(f"   Total: {len(configurations)} configurations")
+
+    # Estimate the run time in the order the configurations will run
+    estimate = {"configurations": len(all_configurations), "max_parallel": args.max_parallel}
+    costs = sharding.EstimateDurations(all_configurations, durations, test_durations)
+    for configuration in all_configurations:
+        if costs.get(configuration.name) is not None:
+            costs[configuration.name] *= configuration.max_runs()
+    if all_configurations and None not in costs.values():
+        estimate |= {
+            "with_history": sum(1 for configuration in all_configurations if configuration.name in durations),
+            "test_time_s": sum(costs.values()),
+            "wall_time_s": sharding.EstimateWallTime(costs.values(), args.max_parallel),
+        }
+
+    if args.json:
+        json.dump(plans | {"estimate": estimate}, sys.stdout, indent=2)
+        print()
+        return 0
+    print(f"Total: {len(all_configurations)} configurations")
+    if "wall_time_s" in estimate:
+        print(f"Estimated test time: {FormatDuration(estimate['test_time_s'])} "
+              f"({estimate['with_history']} of {len(all_configurations)} configurations have run before)")
+        print(f"Estimated wall time with {args.max_parallel} in parallel: {FormatDuration(estimate['wall_time_s'])}")
+    elif all_configurations:
+        print("No recorded durations to estimate the run time.  Use --artifacts-dir or --history to find earlier runs.")
+    return 0
+
+def Generate(args: argparse.Namespace) -> int:
+    """Save (and optionally compile) the configurations of each flowgraph to the staging directory.
+    """
+    options = GenerateOptions(args)
+    errors = {}
+    for grc_file in args.grc_files:
+        folder = StagingFolder(args.staging_dir, grc_file, len(args.grc_files))
+        configurations = list(gt.IterateTestFlowgraphs(gru.LoadDocument(grc_file), folder, errors=errors, **options))
+        print(f"Generated {len(configurations)} configurations of {str(grc_file)}")
+    return 1 if errors else 0
+
+def Run(args: argparse.Namespace) -> int:
+    """Generate the configurations of each flowgraph and run them.  Generation is streamed, so the first
+    configurations run while later ones are generated.
+    """
+    gt.TRACER.enabled = not args.no_trace
+    staging_dir = args.staging_dir
+    staging_dir_is_temp = staging_dir is None
+    if staging_dir_is_temp:
+        staging_dir = Path(tempfile.mkdtemp())
+
+    try:
+        options = GenerateOptions(args)
+        errors = {}
+        tests = itertools.chain.from_iterable(
+            gt.StreamTests(grc_file, StagingFolder(staging_dir, grc_file, len(args.grc_files)), errors=errors, **options)
+            for grc_file in args.grc_files)
+        summary = gt.RunTests(args.artifacts_dir,
+                              test_files=tests,
+                              grcc_cache=None if args.no_cache else gt.GrccCache(args.cache_dir),
+                              compiler=args.compiler,
+                              max_parallel=args.max_parallel,
+                              timeout_s=args.timeout,
+                              cpu_limit_s=args.cpu_limit,
+                              memory_limit_mb=args.memory_limit,
+                              resume=args.resume,
+                              incremental=args.incremental,
+                              results_db=None if args.no_results_db else args.results_db,
+                              runner=args.runner,
+                              output=OutputOptions(args),
+                              deduplicate=args.deduplicate,
+                              pack=args.pack,
+                              order=args.order,
+                              max_failures=args.max_failures)
+    finally:
+        if staging_dir_is_temp:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+    return 1 if summary["tests"]["failed"] or errors else 0
+
+def OutputOptions(args: argparse.Namespace) -> "gt.capture.OutputOptions | None":
+    """How the output of each flowgraph is captured, or None to write it all as is.
+    """
+    if not (args.output_limit or args.compress_output or args.live_output):
+        return None
+    return gt.capture.OutputOptions(int((args.output_limit or 0) * (1 << 20)), args.compress_output, args.live_output)
+
+def Merge(args: argparse.Namespace) -> int:
+    """Combine the run folders of several shards.
+    """
+    sharding.MergeShards(args.shard_folders, args.artifacts_dir)
+    return 0
+
+def Pack(args: argparse.Namespace) -> int:
+    """Pack finished run folders into zip archives.
+    """
+    for run_folder in args.run_folders:
+        if not run_folder.is_dir():
+            print(f"Error: {str(run_folder)} is not a folder")
+            return 1
+        artifacts.PackRun(run_folder, remove=args.remove)
+    return 0
+
+def List(args: argparse.Namespace) -> int:
+    """List the files in a packed run.
+    """
+    for name, entry in artifacts.ListArchive(args.archive).items():
+        print(f"{entry['size']:>12}  {name}")
+    return 0
+
+def Extract(args: argparse.Namespace) -> int:
+    """Extract some files from a packed run.
+    """
+    try:
+        extracted = artifacts.ExtractFromArchive(args.archive, args.paths, args.output_dir)
+    except KeyError as e:
+        print(f"Error: {e.args[0]}")
+        return 1
+    print(f"Extracted {len(extracted)} files to {str(args.output_dir)}")
+    return 0
+
+def Compare(args: argparse.Namespace) -> int:
+    """Compare two runs and list the regressions, worst first.
+    """
+    database = args.artifacts_dir / args.results_db
+    try:
+        base_run = compare.ResolveRun(args.base_run, database)
+        new_run = compare.ResolveRun(args.new_run, database)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        return 1
+    report = compare.CompareRuns(base_run, new_run, args.limit, args.duration_tolerance, args.min_duration_change)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        compare.PrintComparison(report)
+    return 1 if report["regressed"] else 0
+
+def AddGenerateArguments(parser: argparse.ArgumentParser):
+    parser.add_argument("grc_files", nargs="+", type=Path, help="The .grc files that define the tests")
+    parser.add_argument("--parameterize", action="store_true",
+                        help="Save one flowgraph for configurations that only differ in numeric sweep values")
+    parser.add_argument("--headless", action="store_true",
+                        help="Generate flowgraphs that run without a display: no_gui, with Qt sinks replaced by null sinks")
+    parser.add_argument("--shard-index", type=int, default=0, help="Only use the configurations of this shard (default: 0)")
+    parser.add_argument("--shard-count", type=int, default=1, help="Split the configurations into this many shards (default: 1)")
+    parser.add_argument("--balance-from", nargs="+", type=Path, metavar="RUN_FOLDER",
+                        help="Balance the shards with the test durations recorded in these run folders")
+
+def AddCompileArguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--workers", type=int, default=1, help="Save (and compile) the files in this many processes (default: 1)")
+    parser.add_argument("--compiler", choices=gru.COMPILERS, default="grcc", help="How flowgraphs are compiled (default: grcc)")
+
+def ArgumentParser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="nouradio-test",
+                                     description="Generate and run the tests defined in GRC flowgraphs without opening them in GNU Radio Companion.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan = commands.add_parser("plan", help="List the configurations of each flowgraph and estimate the run time, without writing any files")
+    AddGenerateArguments(plan)
+    plan.add_argument("--json", action="store_true", help="Print the plan as JSON")
+    plan.add_argument("--counts-only", action="store_true", help="Only print the number of configurations of each test, not the list")
+    plan.add_argument("--max-parallel", type=int, default=1, help="Estimate the wall time with this many flowgraphs at once (default: 1)")
+    plan.add_argument("--artifacts-dir", type=Path, default=Path("test_artifacts"),
+                      help="Estimate with the durations recorded in the results database here (default: test_artifacts)")
+    plan.add_argument("--results-db", type=Path, default=Path(gt.RESULTS_DB_NAME),
+                      help=f"The results database, relative to the artifacts directory (default: {gt.RESULTS_DB_NAME})")
+    plan.add_argument("--history", nargs="+", type=Path, metavar="RUN_FOLDER",
+                      help="Also estimate with the durations recorded in these run folders")
+    plan.set_defaults(function=Plan)
+
+    generate = commands.add_parser("generate", help="Save the configurations of each flowgraph")
+    AddGenerateArguments(generate)
+    AddCompileArguments(generate)
+    generate.add_argument("--staging-dir", type=Path, default=Path("test_staging"),
+                          help="Save the configurations here (default: test_staging)")
+    generate.add_argument("--compile", action="store_true", help="Also generate the python file of each configuration")
+    generate.set_defaults(function=Generate)
+
+    run = commands.add_parser("run", help="Generate the configurations of each flowgraph and run them")
+    AddGenerateArguments(run)
+    AddCompileArguments(run)
+    run.add_argument("--staging-dir", type=Path, default=None,
+                     help="Save the configurations here (default: a temporary folder that is removed afterwards)")
+    run.add_argument("--artifacts-dir", type=Path, default=Path("test_artifacts"),
+                     help="A new folder for this run is created here (default: test_artifacts)")
+    run.add_argument("--compile", action="store_true", help="Compile each configuration while it is generated instead of just before it runs")
+    run.add_argument("--runner", choices=gt.executor.RUNNERS, default="subprocess",
+                     help="Start each flowgraph as a new process, or fork it from a process with GNU Radio already imported (default: subprocess)")
+    run.add_argument("--max-parallel", type=int, default=1, help="Run this many flowgraphs at once (default: 1)")
+    run.add_argument("--order", choices=sharding.ORDERS, default="given",
+                     help="Run the tests in the given order, or by history: the ones that failed last time, then new and changed ones, "
+                          "each longest first.  History waits for all tests to be generated (default: given)")
+    run.add_argument("--max-failures", type=int, default=None, metavar="N", help="Stop starting tests after N failures")
+    run.add_argument("--timeout", type=float, default=None, metavar="SECONDS", help="Stop each flowgraph after this long")
+    run.add_argument("--cpu-limit", type=float, default=None, metavar="SECONDS", help="Stop each flowgraph after it uses this much CPU time")
+    run.add_argument("--memory-limit", type=float, default=None, metavar="MIB",
+                     help="Kill each flowgraph when its processes use more than this much memory (Linux only)")
+    run.add_argument("--resume", type=Path, default=None, metavar="RUN_FOLDER",
+                     help="Continue an earlier run, only running the tests that did not finish or did not pass")
+    run.add_argument("--incremental", action="store_true", help="Skip tests that are unchanged since they passed in an earlier run")
+    run.add_argument("--output-limit", type=float, default=None, metavar="MIB",
+                     help="Keep at most this much of each flowgraph's stdout and stderr: the start and the end")
+    run.add_argument("--compress-output", action="store_true", help="Write stdout.txt.gz and stderr.txt.gz")
+    run.add_argument("--live-output", action="store_true", help="Print each flowgraph's output as it runs, prefixed with its name")
+    run.add_argument("--cache-dir", type=Path, default=None, help="The grcc output cache (default: the user cache folder)")
+    run.add_argument("--no-cache", action="store_true", help="Always run grcc")
+    run.add_argument("--results-db", type=Path, default=Path(gt.RESULTS_DB_NAME),
+                     help=f"Record results in this SQLite database, relative to the artifacts directory (default: {gt.RESULTS_DB_NAME})")
+    run.add_argument("--no-results-db", action="store_true", help="Do not record results in a database")
+    run.add_argument("--deduplicate", action="store_true",
+                     help="Store files that are identical across configurations and runs once, as hard links in the artifacts directory's .blobs folder")
+    run.add_argument("--pack", action="store_true", help="Pack the run folder into a zip archive when the run is finished")
+    run.add_argument("--no-trace", action="store_true", help=f"Do not time the phases of the run or write {gt.TRACE_FILE_NAME}")
+    run.set_defaults(function=Run)
+
+    merge = commands.add_parser("merge", help="Combine the run folders of several shards")
+    merge.add_argument("shard_folders", nargs="+", type=Path, help="The run folder from each shard")
+    merge.add_argument("--artifacts-dir", type=Path, default=Path("test_artifacts"),
+                       help="The merged run folder is created here (default: test_artifacts)")
+    merge.set_defaults(function=Merge)
+
+    compare_runs = commands.add_parser("compare", help="List what got worse between two runs: new failures, stream_watch violations and slower tests")
+    compare_runs.add_argument("base_run", help="The earlier run folder, or its id in the results database")
+    compare_runs.add_argument("new_run", help="The later run folder, or its id in the results database")
+    compare_runs.add_argument("--json", action="store_true", help="Print the comparison as JSON")
+    compare_runs.add_argument("--limit", type=int, default=compare.DEFAULT_REPORT_LIMIT,
+                              help=f"List this many of the worst regressions (default: {compare.DEFAULT_REPORT_LIMIT})")
+    compare_runs.add_argument("--duration-tolerance", type=float, default=compare.DURATION_TOLERANCE, metavar="FRACTION",
+                              help=f"Only report tests that got slower by more than this fraction (default: {compare.DURATION_TOLERANCE})")
+    compare_runs.add_argument("--min-duration-change", type=float, default=compare.MIN_DURATION_CHANGE_S, metavar="SECONDS",
+                              help=f"... and by more than this many seconds (default: {compare.MIN_DURATION_CHANGE_S})")
+    compare_runs.add_argument("--artifacts-dir", type=Path, default=Path("test_artifacts"),
+                              help="Where the results database is, to find runs by id (default: test_artifacts)")
+    compare_runs.add_argument("--results-db", type=Path, default=Path(gt.RESULTS_DB_NAME),
+                              help=f"The results database, relative to the artifacts directory (default: {gt.RESULTS_DB_NAME})")
+    compare_runs.set_defaults(function=Compare)
+
+    pack = commands.add_parser("pack", help="Pack finished run folders into indexed zip archives")
+    pack.add_argument("run_folders", nargs="+", type=Path, help="The run folders.  Each one is packed into RUN_FOLDER.zip")
+    pack.add_argument("--remove", action="store_true", help="Delete each run folder once it is packed")
+    pack.set_defaults(function=Pack)
+
+    list_files = commands.add_parser("list", help="List the files in a packed run")
+    list_files.add_argument("archive", type=Path, help="The archive from the pack command")
+    list_files.set_defaults(function=List)
+
+    extract = commands.add_parser("extract", help="Extract some files from a packed run")
+    extract.add_argument("archive", type=Path, help="The archive from the pack command")
+    extract.add_argument("paths", nargs="+", help="Paths in the run folder, such as Test_1_Config_1/stdout.txt.  A folder extracts everything in it.")
+    extract.add_argument("--output-dir", type=Path, default=Path("."), help="Extract here, keeping the paths (default: the current folder)")
+    extract.set_defaults(function=Extract)
+    return parser
+
+def Main(argv: list[str] | None = None) -> int:
+    """Run the nouradio-test command.
+
+    Args:
+        argv (list[str] | None, optional): The command line arguments. Defaults to None (sys.argv).
+
+    Returns:
+        int: The exit code.  1 if any configuration failed to generate or run.
+    """
+    parser = ArgumentParser()
+    args = parser.parse_args(argv)
+    if hasattr(args, "shard_count") and not 0 <= args.shard_index < args.shard_count:
+        parser.error(f"--shard-index must be between 0 and {args.shard_count - 1}")
+    for grc_file in getattr(args, "grc_files", []):
+        if not grc_file.is_file():
+            parser.error(f"{str(grc_file)} is not a file")
+    return args.function(args)
+
+
+if __name__ == "__main__":
+    sys.exit(Main())
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import os
+import sys
+import json
+import heapq
+import itertools
+from pathlib import Path
+from typing import Iterator
+
+# Add the local path here to make local includes easier
+try:
+    import executor
+    from results_db import ResultsDatabase, StreamWatchLogs, NumericValue
+except:
+    sys.path.append(str(Path(__file__).parent))
+    print(f"Note: Adding path {Path(__file__).parent} to the python path.")
+    import executor
+    from results_db import ResultsDatabase, StreamWatchLogs, NumericValue
+
+# The file written by RunTests() for each TestConfiguration
+CONFIGURATION_FILE_NAME = "configuration.json"
+
+# How bad each kind of regression is.  Within a kind, regressions are ranked by how much worse they got.
+SEVERITY = {
+    "now_failing": 4,
+    "missing": 3,
+    "new_violations": 2,
+    "stream_watch_failures": 2,
+    "slower": 1,
+}
+
+# A test is only slower if it takes this much longer, relative and in seconds
+DURATION_TOLERANCE = 0.2
+MIN_DURATION_CHANGE_S = 0.5
+
+# The number of regressions listed in a report
+DEFAULT_REPORT_LIMIT = 50
+
+def ConfigurationKey(folder: Path) -> tuple[str, str | None, dict]:
+    """Identify a configuration by its test name and sweep values, which stay the same when other configurations
+    are added or removed, unlike its folder name.  Tests that are not a TestConfiguration use their folder name.
+
+    Returns:
+        tuple[str, str | None, dict]: The key, the test name and the sweep values
+    """
+    try:
+        with open(folder / CONFIGURATION_FILE_NAME, "r") as file:
+            configuration = json.load(file)
+    except (OSError, ValueError):
+        return folder.name, None, {}
+    values = configuration.get("values", {})
+    # "1" and "1.0" are the same sweep value
+    normalized = sorted((variable, NumericValue(value) if NumericValue(value) is not None else str(value)) for variable, value in values.items())
+    return json.dumps([configuration.get("test_name"), normalized]), configuration.get("test_name"), values
+
+def IterateTestFolders(run_folder: str | Path) -> Iterator[Path]:
+    """The test folders of a run, one at a time, in name order.
+    """
+    with os.scandir(run_folder) as entries:
+        names = sorted(entry.name for entry in entries if entry.is_dir() and not entry.name.startswith("."))
+    for name in names:
+        yield Path(run_folder) / name
+
+def ReadViolationIndices(log: Path) -> Iterator[int]:
+    """Stream the sample indices from a stream_watch failure log.  Each line is "index,value".
+    """
+    with open(log, "r") as file:
+        for line in file:
+            index = line.split(",", 1)[0].strip()
+            if index:
+                try:
+                    yield int(index)
+                except ValueError:
+                    continue
+
+def DiffSortedIndices(base: Iterator[int], new: Iterator[int]) -> tuple[int, int, int | None]:
+    """Merge two increasing streams of indices without holding either in memory.
+
+    Returns:
+        tuple[int, int, int | None]: The number of indices only in new, the number only in base, and the first index only in new
+    """
+    added = removed = 0
+    first_added = None
+    b, n = next(base, None), next(new, None)
+    while b is not None or n is not None:
+        if n is None or (b is not None and b < n):
+            removed += 1
+            b = next(base, None)
+        elif b is None or n < b:
+            added += 1
+            first_added = n if first_added is None else first_added
+            n = next(new, None)
+        else:
+            b, n = next(base, None), next(new, None)
+    return added, removed, first_added
+
+def CompareViolations(base_folder: Path, new_folder: Path) -> tuple[int, int, int | None]:
+    """Compare the sample indices logged by the stream_watch blocks of one configuration in two runs.  Logs are
+    matched by file name.  Each block logs its indices in increasing order.
+
+    Returns:
+        tuple[int, int, int | None]: The number of new violations, the number resolved, and the first new index
+    """
+    added = removed = 0
+    first_added = None
+    base_logs = StreamWatchLogs(base_folder)
+    new_logs = StreamWatchLogs(new_folder)
+    base_names = {log.relative_to(base_folder).as_posix() for log in (base_logs[0] if base_logs else [])}
+    new_names = {log.relative_to(new_folder).as_posix() for log in (new_logs[0] if new_logs else [])}
+    for name in sorted(base_names | new_names):
+        diff = DiffSortedIndices(ReadViolationIndices(base_folder / name) if name in base_names else iter(()),
+                                 ReadViolationIndices(new_folder / name) if name in new_names else iter(()))
+        added += diff[0]
+        removed += diff[1]
+        if diff[2] is not None and (first_added is None or diff[2] < first_added):
+            first_added = diff[2]
+    return added, removed, first_added
+
+def Passed(result: dict | None) -> bool:
+    return result is not None and result.get("exit_code") == 0
+
+def DataFolder(folder: Path, result: dict | None) -> Path:
+    """Where a test's outputs are.  A test skipped by an incremental run points to the run where it passed.
+    """
+    if result is not None and result.get("skipped") == "incremental" and result.get("previous"):
+        previous = Path(result["previous"])
+        if previous.is_dir():
+            return previous
+    return folder
+
+def Failures(result: dict | None) -> int:
+    return (result or {}).get("stream_watch_failures") or 0
+
+def CompareConfiguration(base_folder: Path, new_folder: Path, duration_tolerance: float = DURATION_TOLERANCE,
+                         min_duration_change_s: float = MIN_DURATION_CHANGE_S) -> tuple[list[dict], list[str]]:
+    """Compare one configuration in two runs.
+
+    Returns:
+        tuple[list[dict], list[str]]: The regressions, each with its kind and details, and the kinds of improvement
+    """
+    base = executor.ReadResult(base_folder)
+    new = executor.ReadResult(new_folder)
+    base_folder, new_folder = DataFolder(base_folder, base), DataFolder(new_folder, new)
+    if base is not None and base.get("skipped") == "incremental":
+        base = executor.ReadResult(base_folder) or base
+    if new is not None and new.get("skipped") == "incremental":
+        new = executor.ReadResult(new_folder) or new
+    regressions = []
+    improvements = []
+
+    if Passed(base) and not Passed(new):
+        detail = "did not finish" if new is None else new.get("error") or (
+            f"stopped: {new['termination']['reason']}" if "termination" in new else f"exit code {new.get('exit_code')}")
+        regressions.append({"kind": "now_failing", "magnitude": 1.0, "detail": detail})
+    elif Passed(new) and not Passed(base):
+        improvements.append("now_passing")
+
+    base_failures, new_failures = Failures(base), Failures(new)
+    if new_failures > base_failures:
+        regressions.append({"kind": "stream_watch_failures", "magnitude": float(new_failures - base_failures),
+                            "detail": f"{base_failures} -> {new_failures} stream_watch failures"})
+    elif new_failures < base_failures:
+        improvements.append("fewer_stream_watch_failures")
+
+    if base_failures or new_failures:
+        added, removed, first_added = CompareViolations(base_folder, new_folder)
+        if added:
+            regressions.append({"kind": "new_violations", "magnitude": float(added),
+                                "detail": f"{added} new violations, the first at sample {first_added}, {removed} resolved"})
+        elif removed:
+            improvements.append("resolved_violations")
+
+    base_duration = (base or {}).get("duration_s")
+    new_duration = (new or {}).get("duration_s")
+    if base_duration and new_duration:
+        change = new_duration - base_duration
+        if change > min_duration_change_s and change > duration_tolerance * base_duration:
+            regressions.append({"kind": "slower", "magnitude": new_duration / base_duration,
+                                "detail": f"{base_duration:.2f} s -> {new_duration:.2f} s"})
+        elif -change > min_duration_change_s and -change > duration_tolerance * base_duration:
+            improvements.append("faster")
+    return regressions, improvements
+
+def Severity(regressions: list[dict]) -> tuple[int, float]:
+    """Rank a configuration by its worst regression, then by how much worse it got.
+    """
+    return max((SEVERITY[regression["kind"]], regression["magnitude"]) for regression in regressions)
+
+def ResolveRun(run: str | Path, database_path: str | Path | None = None) -> Path:
+    """Find a run folder from its path, or from its id in a results database.
+
+    Raises:
+        FileNotFoundError: The run does not exist.
+
+    Returns:
+        Path: The run folder
+    """
+    if Path(run).is_dir():
+        return Path(run)
+    if str(run).isdigit() and database_path is not None and Path(database_path).is_file():
+        database = ResultsDatabase(database_path)
+        try:
+            rows = database.query("SELECT folder FROM runs WHERE id = ?", (int(run),))
+        finally:
+            database.close()
+        if rows and Path(rows[0]["folder"]).is_dir():
+            return Path(rows[0]["folder"])
+    raise FileNotFoundError(f"{run} is not a run folder or a run id in {str(database_path)}")
+
+def CompareRuns(base_run: str | Path,
+                new_run: str | Path,
+                limit: int = DEFAULT_REPORT_LIMIT,
+                duration_tolerance: float = DURATION_TOLERANCE,
+                min_duration_change_s: float = MIN_DURATION_CHANGE_S) -> dict:
+    """Compare two runs from RunTests().  Configurations are matched by their test name and sweep values, and
+    each pair is checked for a pass that became a failure, more stream_watch failures, newly violated sample
+    indices, and a longer duration.
+
+    The runs are read one configuration at a time, and only the limit worst regressions are kept, so runs of
+    any size can be compared.  Only the configuration keys of the new run are held in memory.
+
+    Args:
+        base_run (str | Path): The earlier run folder
+        new_run (str | Path): The later run folder
+        limit (int, optional): The number of regressions to list. Defaults to DEFAULT_REPORT_LIMIT.
+        duration_tolerance (float, optional): A test is slower if its duration grew by more than this fraction. Defaults to DURATION_TOLERANCE.
+        min_duration_change_s (float, optional): ... and by more than this many seconds. Defaults to MIN_DURATION_CHANGE_S.
+
+    Returns:
+        dict: The counts of each kind of regression and improvement, and the worst regressions, worst first
+    """
+    base_run, new_run = Path(base_run), Path(new_run)
+    new_index = {}
+    for folder in IterateTestFolders(new_run):
+        new_index.setdefault(ConfigurationKey(folder)[0], folder.name)
+
+    worst = [] # A min-heap of (severity, order, entry), so the least severe is replaced first
+    order = itertools.count()
+    regression_counts = {kind: 0 for kind in SEVERITY}
+    improvement_counts = {}
+    compared = regressed = 0
+    for base_folder in IterateTestFolders(base_run):
+        key, test_name, values = ConfigurationKey(base_folder)
+        new_name = new_index.pop(key, None)
+        if new_name is None:
+            regressions = [{"kind": "missing", "magnitude": 1.0, "detail": "not in the new run"}]
+            improvements = []
+        else:
+            compared += 1
+            regressions, improvements = CompareConfiguration(base_folder, new_run / new_name, duration_tolerance, min_duration_change_s)
+        for kind in improvements:
+            improvement_counts[kind] = improvement_counts.get(kind, 0) + 1
+        if not regressions:
+            continue
+
+        regressed += 1
+        for regression in regressions:
+            regression_counts[regression["kind"]] += 1
+        entry = (Severity(regressions), -next(order),
+                 {"name": new_name or base_folder.name, "test_name": test_name, "values": values, "regressions": regressions})
+        if len(worst) < limit:
+            heapq.heappush(worst, entry)
+        elif limit > 0 and entry[:2] > worst[0][:2]:
+            heapq.heapreplace(worst, entry)
+
+    return {
+        "base": str(base_run),
+        "new": str(new_run),
+        "compared": compared,
+        "added": len(new_index),
+        "regressed": regressed,
+        "regressions": regression_counts,
+        "improvements": improvement_counts,
+        "worst": [entry | {"severity": list(severity)} for severity, _, entry in sorted(worst, reverse=True)],
+    }
+
+def PrintComparison(report: dict):
+    print(f"Compared {report['compared']} configurations of {report['base']} (base) and {report['new']} (new)")
+    print(f"   {report['added']} configurations are only in the new run")
+    print(f"   regressions: {', '.join(f'{kind} {count}' for kind, count in report['regressions'].items() if count) or 'none'}")
+    print(f"   improvements: {', '.join(f'{kind} {count}' for kind, count in report['improvements'].items()) or 'none'}")
+    if report["worst"]:
+        print(f"Worst {len(report['worst'])} of {report['regressed']} regressed configurations:")
+    for entry in report["worst"]:
+        print(f" > {entry['name']}")
+        for regression in entry["regressions"]:
+            print(f"      {regression['kind']}: {regression['detail']}")
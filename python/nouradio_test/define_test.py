@@ -14,11 +14,22 @@ class define_test(gr.basic_block):
     Define a test for automated processing. Does not run, but instead defines tests for use with the
     "test_name_filter" parameter of other blocks.
     """
-    def __init__(self, test_name:str = "test",):
+    def __init__(self, test_name:str = "test", timeout_s:float = 0, cpu_limit_s:float = 0, memory_limit_mb:float = 0):
+        """Define a test
+
+        Args:
+            test_name (str, optional): The name used to select this test in other blocks' test_name_filter. Defaults to "test".
+            timeout_s (float, optional): Stop each run of this test after this many seconds.  0 uses the runner's limit. Defaults to 0.
+            cpu_limit_s (float, optional): Stop each run of this test after it uses this much CPU time.  0 uses the runner's limit. Defaults to 0.
+            memory_limit_mb (float, optional): Stop each run of this test when its processes use more than this many MiB.  0 uses the runner's limit. Defaults to 0.
+        """
         gr.basic_block.__init__(self,
             name="Test: Define Test",
             in_sig=[],
             out_sig=[])
         self.test_name:str = test_name
+        self.timeout_s:float = timeout_s
+        self.cpu_limit_s:float = cpu_limit_s
+        self.memory_limit_mb:float = memory_limit_mb
 
 
@@ -0,0 +1,432 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import os
+import sys
+import math
+import json
+import time
+import signal
+import hashlib
+import platform
+import threading
+import subprocess
+import contextlib
+from pathlib import Path
+from datetime import datetime
+from typing import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+# Add the local path here to make local includes easier
+try:
+    import capture
+    import resource_usage
+except:
+    sys.path.append(str(Path(__file__).parent))
+    print(f"Note: Adding path {Path(__file__).parent} to the python path.")
+    import capture
+    import resource_usage
+
+# The file written to each artifact folder when its flowgraph finishes
+RESULT_FILE_NAME = "result.json"
+
+# Written to an artifact folder after everything else, so its presence means the test finished
+COMPLETION_MARKER = "complete.json"
+
+# How long a stopped flowgraph has to exit after SIGTERM before it is killed
+KILL_GRACE_S = 5.0
+
+# How each flowgraph is started.  See RunFlowgraph().
+RUNNERS = ["subprocess", "forkserver"]
+
+def CpuTimeLimits(cpu_limit_s: float) -> tuple[int, int]:
+    """The soft and hard RLIMIT_CPU limits set by LimitCpuTime(), in whole seconds.
+    """
+    soft = max(1, math.ceil(cpu_limit_s))
+    return soft, soft + math.ceil(KILL_GRACE_S)
+
+def StoppedByCpuLimit(returncode: int, cpu_limit_s: float, usage: dict) -> bool:
+    """Whether the CPU time limit stopped a process.  SIGXCPU is only sent at the soft limit.  SIGKILL is
+    only counted if the process used the hard limit, since it is also sent by the watchdog, the memory
+    limit, the OOM killer or anyone else.
+
+    Args:
+        returncode (int): The exit code of the process
+        cpu_limit_s (float): The limit given to LimitCpuTime()
+        usage (dict): The resources the process used.  See resource_usage.UsageFromRusage().
+    """
+    if hasattr(signal, "SIGXCPU") and returncode == -signal.SIGXCPU:
+        return True
+    if hasattr(signal, "SIGKILL") and returncode == -signal.SIGKILL:
+        return usage.get("cpu_time_s", 0) >= CpuTimeLimits(cpu_limit_s)[1]
+    return False
+
+def LimitCpuTime(pid: int, cpu_limit_s: float) -> bool:
+    """Limit the CPU time of a process.  When the limit is reached, the OS sends it SIGXCPU, and SIGKILL
+    KILL_GRACE_S seconds of CPU time later.
+
+    Returns:
+        bool: False if CPU limits are not supported on this platform
+    """
+    if resource is None or not hasattr(resource, "prlimit"):
+        return False
+    resource.prlimit(pid, resource.RLIMIT_CPU, CpuTimeLimits(cpu_limit_s))
+    return True
+
+def SignalProcessGroup(process: subprocess.Popen, posix_signal: int):
+    """Send a signal to a process and everything it started.  On Windows, only the process itself is
+    terminated or killed.
+    """
+    if os.name == "posix":
+        try:
+            os.killpg(process.pid, posix_signal)
+        except (ProcessLookupError, PermissionError):
+            pass
+    elif posix_signal == signal.SIGTERM:
+        process.terminate()
+    else:
+        process.kill()
+
+def WaitForProcess(process: subprocess.Popen) -> dict:
+    """Wait for a process to exit and measure the resources it used.  This sets process.returncode.
+
+    Returns:
+        dict: The peak memory, CPU time and context switches, if the platform reports them.  See resource_usage.UsageFromRusage().
+    """
+    if not hasattr(os, "wait4"):
+        process.wait()
+        return {}
+    while True:
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+            break
+        except InterruptedError:
+            continue
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return resource_usage.UsageFromRusage(usage)
+
+def RunFlowgraph(test_file: str | Path,
+                 arguments: list | None = None,
+                 timeout_s: float | None = None,
+                 cpu_limit_s: float | None = None,
+                 server = None,
+                 output: capture.OutputOptions | None = None,
+                 memory_limit_mb: float | None = None) -> dict:
+    """Run a python flowgraph in its own folder, and write its stdout.txt, stderr.txt and result.json there.
+    The working directory is only set for the child process, so any number of flowgraphs can run at once.
+
+    The flowgraph runs in a new process group (session), so a watchdog can stop it and anything it started.
+    If it runs longer than timeout_s, the group is sent SIGTERM, then SIGKILL if the flowgraph is still
+    running KILL_GRACE_S later.  If it uses more than cpu_limit_s of CPU time, the OS stops it.  Either way,
+    the reason is written to timeout.txt and result.json, and the outputs it produced so far are kept.
+
+    The resources the flowgraph used are written to resources.json: the wall time, and the CPU time, peak memory
+    and context switches reported when it exits.  On Linux, the memory of the whole process tree is also sampled
+    from /proc while it runs.  If the tree uses more than memory_limit_mb, the group is killed right away, before
+    the host starts swapping, and the reason is recorded as for the other limits.  The reason a flowgraph was
+    stopped is also written to resources.json, next to the usage that led to it.
+
+    With a fork server, the flowgraph is forked from a process that has already imported GNU Radio instead
+    of starting a new interpreter.  Everything else is the same.
+
+    With output options, stdout and stderr are read through pipes instead of being written straight to their
+    files, so each file can be limited in size, compressed, or printed live.  See capture.OutputCapture.
+
+    Args:
+        test_file (str | Path): A python version of a grc file to execute
+        arguments (list | None, optional): Command line arguments for the flowgraph. Defaults to None.
+        timeout_s (float | None, optional): The wall clock limit.  None or 0 waits forever. Defaults to None.
+        cpu_limit_s (float | None, optional): The CPU time limit.  None or 0 is unlimited. Defaults to None.
+        server (forkserver.ForkServer | None, optional): Start the flowgraph with this fork server. Defaults to None (a new process).
+        output (capture.OutputOptions | None, optional): Limit, compress or print the output. Defaults to None (write it all).
+        memory_limit_mb (float | None, optional): The memory limit of the process tree in MiB.  None or 0 is unlimited. Defaults to None.
+
+    Returns:
+        dict: The result, with the exit code, the start time, end time and duration of the run, the peak
+            memory and CPU time when available, and the reason if the flowgraph was stopped
+    """
+    test_file = Path(test_file).absolute()
+    folder = test_file.parent
+    print(f"Executing {test_file.name}...")
+    start = datetime.now()
+    start_counter = time.perf_counter()
+    termination = {}
+    finished = threading.Event()
+
+    def Watchdog():
+        if finished.is_set():
+            return
+        print(f"Timeout: {test_file.name} ran longer than {timeout_s} s.  Stopping it...")
+        termination.update({"reason": "wall_time", "limit_s": timeout_s, "signal": "SIGTERM"})
+        SignalProcessGroup(process, signal.SIGTERM)
+        if not finished.wait(KILL_GRACE_S):
+            termination["signal"] = "SIGKILL"
+            SignalProcessGroup(process, signal.SIGKILL)
+
+    def MemoryExceeded(rss_bytes: int):
+        if finished.is_set() or termination:
+            return
+        print(f"Memory: {test_file.name} used {rss_bytes / (1 << 20):.1f} MiB, over its limit of {memory_limit_mb} MiB.  Killing it...")
+        termination.update({"reason": "memory", "limit_mb": memory_limit_mb, "rss_bytes": rss_bytes, "signal": "SIGKILL"})
+        SignalProcessGroup(process, signal.SIGKILL)
+
+    output_capture = None
+    with contextlib.ExitStack() as files:
+        if output is not None:
+            output_capture = capture.OutputCapture(folder, output, use_fifos=server is not None)
+            stdout, stderr = output_capture.targets["stdout"], output_capture.targets["stderr"]
+        elif server is None:
+            stdout = files.enter_context(open(folder / "stdout.txt", "w"))
+            stderr = files.enter_context(open(folder / "stderr.txt", "w"))
+        else:
+            # The child opens its output files itself
+            stdout, stderr = "stdout.txt", "stderr.txt"
+
+        try:
+            if server is None:
+                process = subprocess.Popen(["python", str(test_file.name), *(arguments or [])],
+                                           cwd=folder,
+                                           stdout=stdout,
+                                           stderr=stderr,
+                                           start_new_session=(os.name == "posix"))
+            else:
+                process = server.start(test_file, arguments, stdout, stderr)
+        except BaseException:
+            if output_capture is not None:
+                output_capture.finish(0)
+            raise
+        if output_capture is not None:
+            output_capture.started()
+
+        if cpu_limit_s and not LimitCpuTime(process.pid, cpu_limit_s):
+            print(f"Warning: CPU time limits are not supported on this platform.  Ignoring the limit for {test_file.name}.")
+        monitor = None
+        if resource_usage.IsSamplingSupported():
+            monitor = resource_usage.ResourceMonitor(process.pid, int(memory_limit_mb * (1 << 20)) if memory_limit_mb else None, MemoryExceeded)
+        elif memory_limit_mb:
+            print(f"Warning: memory limits are not supported on this platform.  Ignoring the limit for {test_file.name}.")
+        watchdog = threading.Timer(timeout_s, Watchdog) if timeout_s else None
+        if watchdog is not None:
+            watchdog.start()
+        usage = WaitForProcess(process) if server is None else server.wait(process)
+        finished.set()
+        if watchdog is not None:
+            watchdog.cancel()
+            watchdog.join()
+        tree = monitor.stop() if monitor is not None else None
+
+        if not termination and cpu_limit_s and StoppedByCpuLimit(process.returncode, cpu_limit_s, usage):
+            termination = {"reason": "cpu_time", "limit_s": cpu_limit_s, "signal": signal.Signals(-process.returncode).name}
+        if termination:
+            # Children may ignore SIGTERM, or outlive the flowgraph
+            SignalProcessGroup(process, signal.SIGKILL)
+
+    # Processes the flowgraph started may hold the pipes open after it exits
+    output_stats = output_capture.finish(KILL_GRACE_S) if output_capture is not None else None
+
+    result = {
+        "name": folder.name,
+        "exit_code": process.returncode,
+        "start": start.isoformat(),
+        "end": datetime.now().isoformat(),
+        "duration_s": time.perf_counter() - start_counter,
+        **{key: usage[key] for key in ["peak_memory_bytes", "cpu_time_s"] if key in usage},
+    }
+    if output_stats is not None:
+        result["output"] = output_stats
+    if termination:
+        result["termination"] = termination
+        limit = f"{termination['limit_mb']} MiB" if "limit_mb" in termination else f"{termination['limit_s']} s"
+        with open(folder / "timeout.txt", "w") as of:
+            of.write(f"Stopped after exceeding the {termination['reason']} limit of {limit} with {termination['signal']}\n")
+    resource_usage.WriteResources(folder, {"wall_time_s": result["duration_s"], **usage, "tree": tree, "memory_limit_mb": memory_limit_mb or None,
+                                          "termination": termination or None})
+    WriteResult(folder, result)
+    print(f"Done with {test_file.name} (exit code {process.returncode})")
+    return result
+
+def WriteResult(folder: str | Path, result: dict):
+    with open(Path(folder) / RESULT_FILE_NAME, "w") as of:
+        json.dump(result, of, indent=2)
+
+def EnvironmentFingerprint(gnuradio_version: str) -> dict:
+    """Describe the environment that runs the tests.  A passing result is only reused in an identical environment.
+
+    Args:
+        gnuradio_version (str): The GNU Radio version.  See grcc_cache.GnuRadioVersion().
+
+    Returns:
+        dict: The host, platform, python and GNU Radio versions, and NOURADIO_TEST_ENVIRONMENT if it is set
+    """
+    return {
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "gnuradio": gnuradio_version,
+        "extra": os.environ.get("NOURADIO_TEST_ENVIRONMENT", ""),
+    }
+
+def FileHash(path: str | Path) -> str:
+    """Hash the contents of a file.
+
+    Returns:
+        str: A hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        digest.update(file.read())
+    return digest.hexdigest()
+
+def ContentKey(flowgraph_hash: str, arguments: list | None, environment: dict) -> str:
+    """Hash everything that decides the outcome of a test: the flowgraph, its command line, and the environment.
+
+    Args:
+        flowgraph_hash (str): The FileHash() of the flowgraph
+        arguments (list | None): The flowgraph's command line arguments
+        environment (dict): See EnvironmentFingerprint().
+
+    Returns:
+        str: A hex digest
+    """
+    digest = hashlib.sha256()
+    digest.update(flowgraph_hash.encode())
+    digest.update(b"\0")
+    digest.update(json.dumps([arguments or [], environment], sort_keys=True).encode())
+    return digest.hexdigest()
+
+def MarkComplete(folder: str | Path, result: dict, key: str | None = None):
+    """Write the completion marker of an artifact folder.  Call this after all of the test's other files are written.
+
+    Args:
+        folder (str | Path): The artifact folder
+        result (dict): The test result.  Only the exit code, and why it was skipped if it was, are kept in the marker.
+        key (str | None, optional): The test's ContentKey(), for later incremental runs. Defaults to None.
+    """
+    folder = Path(folder)
+    temp_path = folder / f"{COMPLETION_MARKER}.tmp"
+    with open(temp_path, "w") as of:
+        json.dump({"exit_code": result.get("exit_code"), "key": key, "skipped": result.get("skipped")}, of)
+    # Rename, so a partially written marker is never read
+    os.replace(temp_path, folder / COMPLETION_MARKER)
+
+def ReadCompletion(folder: str | Path) -> dict | None:
+    """Read the completion marker of an artifact folder.
+
+    Returns:
+        dict | None: The marker contents, or None if the test did not finish
+    """
+    try:
+        with open(Path(folder) / COMPLETION_MARKER, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def ReadResult(folder: str | Path) -> dict | None:
+    try:
+        with open(Path(folder) / RESULT_FILE_NAME, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def IndexPassingTests(artifacts_root: str | Path) -> dict[str, Path]:
+    """Find the tests that passed in all earlier runs.  Tests that were skipped are left out, so a later run
+    always points to the folder where the test actually ran, with its logs and outputs.
+
+    Args:
+        artifacts_root (str | Path): The folder that contains the run folders
+
+    Returns:
+        dict[str, Path]: The artifact folder of the latest passing test for each ContentKey()
+    """
+    index = {}
+    # Oldest first, so the latest result wins
+    for marker in sorted(Path(artifacts_root).glob(f"*/*/{COMPLETION_MARKER}"), key=lambda marker: marker.stat().st_mtime):
+        completion = ReadCompletion(marker.parent)
+        if completion is None or completion.get("exit_code") != 0 or not completion.get("key"):
+            continue
+        # Markers written before "skipped" was added to them
+        skipped = completion["skipped"] if "skipped" in completion else (ReadResult(marker.parent) or {}).get("skipped")
+        if not skipped:
+            index[completion["key"]] = marker.parent
+    return index
+
+def RunConcurrently(function: Callable, items: Iterable, max_parallel: int = 1) -> Iterator[tuple[object, object, Exception | None]]:
+    """Call a function on each item with at most max_parallel calls in progress.  The items are only read
+    when a slot is free, so they can be a stream such as StreamTests().
+
+    Args:
+        function (Callable): Called with one item.  It should block until that item is finished.
+        items (Iterable): The work to do
+        max_parallel (int, optional): The maximum number of simultaneous calls.  1 runs them in order in this thread. Defaults to 1.
+
+    Yields:
+        tuple[object, object, Exception | None]: Each item with its return value, or with the exception it raised,
+            in the order they finish.
+    """
+    if max_parallel <= 1:
+        for item in items:
+            try:
+                yield item, function(item), None
+            except Exception as e:
+                yield item, None, e
+        return
+
+    def Finished(futures):
+        for future in futures:
+            item = pending.pop(future)
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
+
+    pending = {}
+    with ThreadPoolExecutor(max_workers=max_parallel) as pool:
+        for item in items:
+            pending[pool.submit(function, item)] = item
+            if len(pending) >= max_parallel:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from Finished(done)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from Finished(done)
+
+def CompletionReport(results: list[dict], wall_time_s: float) -> dict:
+    """Summarize the results of a run.  A test passes when its flowgraph exits with code 0.  Skipped tests
+    passed in an earlier run, and count as passed.  The runs of a bisect search are expected to fail on one
+    side of the boundary, so they are counted separately, and neither as passed nor as failed.
+
+    Args:
+        results (list[dict]): The result of each test.  See RunFlowgraph().
+        wall_time_s (float): The time taken by the whole run
+
+    Returns:
+        dict: The counts, times and names of the failed tests
+    """
+    failed = [result["name"] for result in results if result.get("exit_code") != 0 and "search" not in result]
+    search_runs = sum(1 for result in results if "search" in result)
+    skipped = [result["name"] for result in results if "skipped" in result]
+    timed_out = [result["name"] for result in results if "termination" in result]
+    test_time_s = sum(result.get("duration_s", 0) for result in results if "skipped" not in result)
+    return {
+        "total": len(results),
+        "passed": sum(1 for result in results if result.get("exit_code") == 0 and "search" not in result),
+        "failed": len(failed),
+        "skipped": len(skipped),
+        "timed_out": len(timed_out),
+        "search_runs": search_runs,
+        "wall_time_s": round(wall_time_s, 3),
+        "test_time_s": round(test_time_s, 3),
+        "speedup": round(test_time_s / wall_time_s, 2) if wall_time_s > 0 else None,
+        "failed_tests": failed,
+    }
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import os
+import sys
+import json
+import runpy
+import select
+import itertools
+import importlib
+import threading
+import traceback
+import subprocess
+from pathlib import Path
+
+# Add the local path here to make local includes easier
+try:
+    import resource_usage
+except:
+    sys.path.append(str(Path(__file__).parent))
+    print(f"Note: Adding path {Path(__file__).parent} to the python path.")
+    import resource_usage
+
+# Imported once by the server, so each flowgraph starts with them loaded.  Modules that are not
+# installed are skipped.
+DEFAULT_PRELOAD = [
+    "numpy",
+    "gnuradio.gr",
+    "gnuradio.blocks",
+    "gnuradio.analog",
+    "gnuradio.filter",
+    "gnuradio.fft",
+    "gnuradio.eng_arg",
+    "gnuradio.eng_notation",
+    "PyQt5.Qt",
+    "sip",
+    "gnuradio.qtgui",
+    "gnuradio.nouradio_test",
+]
+
+# How often the server checks for finished flowgraphs while it waits for requests
+REAP_INTERVAL_S = 0.01
+
+def IsSupported() -> bool:
+    return os.name == "posix" and hasattr(os, "fork") and hasattr(os, "wait4")
+
+
+class ForkedProcess:
+    """A flowgraph started by the fork server.  Like subprocess.Popen, it has a pid and, once it has
+    been waited for, a returncode.  The process leads its own session, so it and everything it starts
+    can be signalled with os.killpg().
+    """
+    def __init__(self, request_id: int):
+        self.request_id: int = request_id
+        self.pid: int | None = None
+        self.returncode: int | None = None
+        self.usage: dict = {}
+        self.error: str | None = None
+        self.started = threading.Event()
+        self.finished = threading.Event()
+
+
+class ForkServer:
+    """Start flowgraphs by forking a warm python process that has already imported GNU Radio, Qt and numpy,
+    instead of starting a new interpreter for each one.
+
+    The server is a separate, single threaded process, since forking this multithreaded process is not safe.
+    Requests are sent to its stdin and replies are read from its stdout as JSON lines.  Each forked child
+    sets its own working directory, stdout.txt and stderr.txt, then runs the flowgraph as __main__.
+    The server reaps the children, so it reports their exit code, peak memory, CPU time and context switches.
+    """
+    def __init__(self, preload: list[str] | None = None):
+        """Start the server and wait for it to import the preloaded modules.
+
+        Args:
+            preload (list[str] | None, optional): The modules to import once. Defaults to None (DEFAULT_PRELOAD).
+
+        Raises:
+            RuntimeError: The server could not start.
+        """
+        preload = DEFAULT_PRELOAD if preload is None else preload
+        self.process = subprocess.Popen(["python", str(Path(__file__).absolute()), *preload],
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE)
+        ready = self.process.stdout.readline()
+        if not ready:
+            raise RuntimeError(f"The fork server exited with code {self.process.wait()}")
+        self.preloaded: list[str] = json.loads(ready)["preloaded"]
+
+        self.lock = threading.Lock()
+        self.ids = itertools.count()
+        self.processes: dict[int, ForkedProcess] = {}
+        self.reader = threading.Thread(target=self.read_replies, daemon=True)
+        self.reader.start()
+
+    def read_replies(self):
+        for line in self.process.stdout:
+            reply = json.loads(line)
+            with self.lock:
+                process = self.processes.get(reply["id"])
+            if process is None:
+                continue
+            if "error" in reply:
+                process.error = reply["error"]
+                process.started.set()
+                process.finished.set()
+            elif "pid" in reply:
+                process.pid = reply["pid"]
+                process.started.set()
+            else:
+                process.returncode = reply["exit_code"]
+                process.usage = reply["usage"]
+                process.finished.set()
+
+        # The server exited.  Release everyone who is waiting.
+        with self.lock:
+            processes, self.processes = self.processes, {}
+        for process in processes.values():
+            process.error = process.error or "The fork server exited"
+            process.started.set()
+            process.finished.set()
+
+    def start(self, test_file: str | Path, arguments: list | None = None, stdout: str = "stdout.txt", stderr: str = "stderr.txt") -> ForkedProcess:
+        """Fork a child that runs a python flowgraph in its folder.
+
+        Args:
+            test_file (str | Path): A python version of a grc file to execute
+            arguments (list | None, optional): Command line arguments for the flowgraph. Defaults to None.
+            stdout (str, optional): The file (or named pipe) the child writes its stdout to, relative to its folder. Defaults to "stdout.txt".
+            stderr (str, optional): The file (or named pipe) for stderr. Defaults to "stderr.txt".
+
+        Raises:
+            RuntimeError: The child could not be started.
+
+        Returns:
+            ForkedProcess: The running flowgraph
+        """
+        test_file = Path(test_file).absolute()
+        with self.lock:
+            process = ForkedProcess(next(self.ids))
+            self.processes[process.request_id] = process
+            request = {"id": process.request_id,
+                       "file": str(test_file),
+                       "arguments": [str(argument) for argument in arguments or []],
+                       "cwd": str(test_file.parent),
+                       "stdout": str(stdout),
+                       "stderr": str(stderr)}
+            try:
+                self.process.stdin.write(json.dumps(request).encode() + b"\n")
+                self.process.stdin.flush()
+            except OSError as e:
+                del self.processes[process.request_id]
+                raise RuntimeError(f"The fork server is not running: {e}")
+        process.started.wait()
+        if process.error is not None:
+            raise RuntimeError(f"Could not start {test_file.name}: {process.error}")
+        return process
+
+    def wait(self, process: ForkedProcess) -> dict:
+        """Wait for a flowgraph to exit.  This sets process.returncode.
+
+        Returns:
+            dict: The peak memory, CPU time and context switches.  See executor.WaitForProcess().
+        """
+        process.finished.wait()
+        with self.lock:
+            self.processes.pop(process.request_id, None)
+        if process.error is not None:
+            raise RuntimeError(process.error)
+        return process.usage
+
+    def close(self):
+        """Stop the server once it has reaped its running children.
+        """
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.wait()
+        self.reader.join()
+
+def StartForkServer(preload: list[str] | None = None) -> ForkServer | None:
+    """Start a fork server if this platform supports it.
+
+    Returns:
+        ForkServer | None: The server, or None (with a warning) if flowgraphs must be started as new processes
+    """
+    if not IsSupported():
+        print("Warning: the fork server is only available on POSIX systems.  Starting each flowgraph as a new process.")
+        return None
+    try:
+        server = ForkServer(preload)
+    except (OSError, RuntimeError) as e:
+        print(f"Warning: could not start the fork server ({e}).  Starting each flowgraph as a new process.")
+        return None
+    print(f"Fork server ready with {', '.join(server.preloaded) or 'no modules'} preloaded")
+    return server
+
+def Preload(modules: list[str]) -> list[str]:
+    """Import modules, skipping those that fail.
+
+    Returns:
+        list[str]: The modules that were imported
+    """
+    loaded = []
+    for module in modules:
+        try:
+            importlib.import_module(module)
+            loaded.append(module)
+        except Exception as e:
+            print(f"Note: the fork server could not preload {module}: {e}", file=sys.stderr)
+    return loaded
+
+def RunChild(request: dict, private_fds: list[int]):
+    """Run a flowgraph in a forked child, as if it was started with "python file arguments" in its folder.  Never returns.
+    """
+    exit_code = 1
+    try:
+        os.setsid()
+        for fd in private_fds:
+            os.close(fd)
+        os.chdir(request["cwd"])
+        null = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(null, 0)
+        os.close(null)
+        for path, fd in ((request["stdout"], 1), (request["stderr"], 2)):
+            output = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            os.dup2(output, fd)
+            os.close(output)
+
+        sys.argv = [request["file"], *request["arguments"]]
+        sys.path[0] = request["cwd"]
+        try:
+            runpy.run_path(request["file"], run_name="__main__")
+            exit_code = 0
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                exit_code = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+        except BaseException:
+            traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(exit_code)
+
+def Serve(preload: list[str]):
+    """The server loop.  Read requests from stdin, fork a child for each one, and report when each child exits.
+    """
+    # Keep the protocol on a private copy of stdout, so nothing the preloaded modules print can corrupt it
+    replies = os.fdopen(os.dup(1), "w", buffering=1)
+    null = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(null, 1)
+    os.close(null)
+
+    def Reply(reply: dict):
+        replies.write(json.dumps(reply) + "\n")
+
+    Reply({"ready": True, "preloaded": Preload(preload)})
+
+    children = {} # pid: request id
+    buffer = b""
+    reading = True
+    while reading or children:
+        ready, _, _ = select.select([0] if reading else [], [], [], REAP_INTERVAL_S)
+        if ready:
+            data = os.read(0, 1 << 16)
+            reading = bool(data)
+            buffer += data
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                request = json.loads(line)
+                sys.stdout.flush()
+                sys.stderr.flush()
+                try:
+                    pid = os.fork()
+                except OSError as e:
+                    Reply({"id": request["id"], "error": str(e)})
+                    continue
+                if pid == 0:
+                    RunChild(request, [replies.fileno()])
+                children[pid] = request["id"]
+                Reply({"id": request["id"], "pid": pid})
+
+        # Reap every child that has exited
+        while children:
+            try:
+                pid, status, usage = os.wait4(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            request_id = children.pop(pid, None)
+            if request_id is None:
+                continue
+            Reply({"id": request_id,
+                   "exit_code": os.waitstatus_to_exitcode(status),
+                   "usage": resource_usage.UsageFromRusage(usage)})
+
+
+if __name__ == "__main__":
+    Serve(sys.argv[1:])
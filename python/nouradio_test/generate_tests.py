@@ -6,12 +6,17 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 #
 
-import re
-import copy
 import os
 import sys
+import json
+import math
+import itertools
 import subprocess
+import time
+from collections import deque
+from threading import Lock
 from pathlib import Path
+from typing import Iterable, Iterator
 import numpy as np
 import shutil
 from datetime import datetime
@@ -19,49 +24,87 @@ from datetime import datetime
 # Add the local path here to make local includes easier
 try:
     import grc_utilities as gru
+    import executor
+    import sharding
+    import forkserver
+    import capture
+    import artifacts
+    import bisect_search
+    from tracing import TRACER, Tracer, TRACE_FILE_NAME
+    from grcc_cache import GrccCache, GnuRadioVersion
+    from results_db import ResultsDatabase, RESULTS_DB_NAME, CountStreamWatchFailures
 except:
     sys.path.append(str(Path(__file__).parent))
     print(f"Note: Adding path {Path(__file__).parent} to the python path.")
     import grc_utilities as gru
-
-def ReadTestNames(grc:dict, hide_disabled:bool = True) -> list[str]:
+    import executor
+    import sharding
+    import forkserver
+    import capture
+    import artifacts
+    import bisect_search
+    from tracing import TRACER, Tracer, TRACE_FILE_NAME
+    from grcc_cache import GrccCache, GnuRadioVersion
+    from results_db import ResultsDatabase, RESULTS_DB_NAME, CountStreamWatchFailures
+
+def ReadTestNames(grc:dict | gru.GrcDocument, hide_disabled:bool = True) -> list[str]:
     """Read the test names defines in any 'define_test' blocks.
 
     Args:
-        grc (dict): A dict of the GRC file contents
+        grc (dict | GrcDocument): A dict of the GRC file contents, or its indexed document
         hide_disabled (bool): Do not return tests that are disabled
         
     Returns:
         list[str]: A list of the test names
     """
-    all_tests = gru.GetBlockProperty(grc, "id", "define_test", ['parameters', 'name'])
+    grc = gru.AsDocument(grc)
+    all_tests = grc.get_block_property("id", "define_test", ['parameters', 'name'])
     output = []
     if hide_disabled:
-        for test_block_id, test_name in (copy.deepcopy(all_tests)).items():
-            if gru.BlockIsEnabled(grc, test_block_id):
+        for test_block_id, test_name in all_tests.items():
+            if grc.block_is_enabled(test_block_id):
                 output.append(test_name)
     else:
         output = list(all_tests.values())
     return output
 
-def GetTestModifiers(grc:dict):
+def ReadTestDefinitions(grc:dict | gru.GrcDocument) -> dict[str, dict]:
+    """Read the settings of every enabled 'define_test' block.
+
+    Args:
+        grc (dict | GrcDocument): A dict of the GRC file contents, or its indexed document
+
+    Returns:
+        dict[str, dict]: The define_test params (see ReadDefineTest()) for each test name
+    """
+    grc = gru.AsDocument(grc)
+    definitions = {}
+    for block in grc.blocks_of_type("nouradio_test_define_test").values():
+        if grc.block_is_enabled(block["name"]):
+            params = ReadDefineTest(block)
+            definitions[params["name"]] = params
+    return definitions
+
+def GetTestModifiers(grc:dict | gru.GrcDocument):
     """Get all nouradio_test blocks
 
     Args:
-        grc (dict): A dict of the GRC file contents
+        grc (dict | GrcDocument): A dict of the GRC file contents, or its indexed document
 
     Returns:
         dict: The block information for each nouradio_test block
     """
-    return gru.FilterBlocks(grc, "id", "^nouradio_test")
+    return gru.AsDocument(grc).filter_blocks("id", "^nouradio_test")
 
-def ReadBlockParams(block: dict, expected_block_type: str, param_chains: list) -> dict:
+def ReadBlockParams(block: dict, expected_block_type: str, param_chains: list, defaults: dict | None = None) -> dict:
     """_summary_
 
     Args:
         block (dict): A dict of the block information from the GRC yaml
         expected_block_type (str): If the block id does not match this, exit.  It must have been called in error.
         param_chains (list): A list of lists defining the parameters to read
+        defaults (dict | None, optional): Values for parameters that may be missing, keyed by the last key of their
+            chain.  Use this for parameters added after flowgraphs were saved with an older block version. Defaults to None.
 
     Raises:
         KeyError: The call was invoked when the underlying block does not match the expected data.
@@ -76,9 +119,17 @@ def ReadBlockParams(block: dict, expected_block_type: str, param_chains: list) -
     params["name"] = block["name"]
     params["type"] = expected_block_type
     for chain in param_chains:
-        params[chain[-1]] = gru.nested_get(block, chain)
+        try:
+            params[chain[-1]] = gru.nested_get(block, chain)
+        except KeyError:
+            if defaults is None or chain[-1] not in defaults:
+                raise
+            params[chain[-1]] = defaults[chain[-1]]
     return params
 
+# The limits a define_test block can set for each run of its test
+TEST_LIMITS = ["timeout_s", "cpu_limit_s", "memory_limit_mb"]
+
 def ReadDefineTest(block: dict) -> dict:
     """Read the define_test block
 
@@ -91,8 +142,18 @@ def ReadDefineTest(block: dict) -> dict:
     EXPECTED_BLOCK_TYPE = "nouradio_test_define_test"
     params = ReadBlockParams(block, EXPECTED_BLOCK_TYPE, [
         ["parameters", "name"],
+        ["parameters", "timeout_s"],
+        ["parameters", "cpu_limit_s"],
+        ["parameters", "memory_limit_mb"],
         ["states", "state"],
-    ])
+    ], defaults={"timeout_s": 0, "cpu_limit_s": 0, "memory_limit_mb": 0})
+
+    # The limits must be plain numbers; the runner cannot evaluate flowgraph expressions
+    for limit in TEST_LIMITS:
+        params[limit] = MaybeFloat(params[limit])
+        if not isinstance(params[limit], float):
+            print(f"Warning: {limit} of test {params['name']} is not a number.  Ignoring it.")
+            params[limit] = 0.0
     return params
     
 def ReadRunScript(block: dict):
@@ -134,6 +195,14 @@ def ReadEnableDisableBlocks(block: dict):
     params["disable_blocks"] = gru.FixStrings(params["disable_blocks"].split(","))
     return params
 
+def MaybeFloat(item:str):
+    # Convert the numbers if possible
+    try:
+        return float(item)
+    except:
+        # If it is not easy to coerce to a float, don't do it.
+        return item
+
 def ReadVariableChange(block: dict):
     """Read the variable_change block
 
@@ -154,23 +223,19 @@ def ReadVariableChange(block: dict):
         ["parameters", "count"],
         ["parameters", "value"],
         ["parameters", "choices"],
+        ["parameters", "constraint"],
+        ["parameters", "tolerance"],
         ["states", "state"],
-    ])
+    ], defaults={"constraint": "", "tolerance": 1})
 
-    def MaybeFloat(item:str):
-        # Convert the numbers if possible
-        try:
-            return float(item)
-        except:
-            # If it is not easy to coerce to a float, don't do it.
-            return item
-        
     params["choices"] = gru.FixStrings(params["choices"].split(","))
+    params["constraint"] = gru.FixStrings([str(params["constraint"])])[0]
     params["start_value"] = MaybeFloat(params["start_value"])
     params["stop_value"] = MaybeFloat(params["stop_value"])
     params["step"] = MaybeFloat(params["step"])
     params["count"] = MaybeFloat(params["count"])
     params["value"] = MaybeFloat(params["value"])
+    params["tolerance"] = MaybeFloat(params["tolerance"])
 
     # Resolve the variable choices to a list of values to make processing mostly common
     possibilities = []
@@ -180,9 +245,21 @@ def ReadVariableChange(block: dict):
         case "range":
             possibilities = list(np.arange(params["start_value"], params["stop_value"], params["step"]))
         case "linspace":
-            possibilities = np.linspace(params["start_value"], params["stop_value"], params["count"])
+            possibilities = list(np.linspace(params["start_value"], params["stop_value"], int(params["count"])))
         case "choices":
             possibilities = params["choices"]
+        case "bisect":
+            # The values are chosen while the tests run.  See bisect_search.BisectSearch.
+            possibilities = [params["start_value"], params["stop_value"]]
+            params["search"] = {
+                "variable": params["variable"],
+                "start": params["start_value"],
+                "stop": params["stop_value"],
+                "tolerance": params["tolerance"],
+                "integer": all(float(value).is_integer() for value in (params["start_value"], params["stop_value"], params["tolerance"])),
+            }
+            # Check the settings now rather than while the tests run
+            bisect_search.BisectSearch(**params["search"])
 
     params["resolved_choices"] = possibilities
 
@@ -235,133 +312,526 @@ READ_NOUTEST_MAP ={
     "nouradio_test_run_tests_wrapper": ReadRunTestsWrapper,
 }
 
-def GatherTestModifiers(grc:dict, testName:str) -> list:
+class TestPlan:
+    """Everything the generator needs to know about which tests exist and which modifiers apply to them.
+    The flowgraph is read once: every test_name_filter is compiled once, each modifier block is decoded
+    once, and the test x modifier matrix is computed in one pass.  Use it to query the tests without
+    reading the GRC again.
+    """
+    def __init__(self, grc: dict | gru.GrcDocument):
+        """Read the tests and modifiers of a flowgraph.
+
+        Args:
+            grc (dict | GrcDocument): A dict of the GRC file contents, or its indexed document
+        """
+        with TRACER.span("plan"):
+            self.grc: gru.GrcDocument = gru.AsDocument(grc)
+
+            # The enabled tests, in block order, and their define_test settings
+            self.test_names: list[str] = ReadTestNames(self.grc)
+            self.definitions: dict[str, dict] = ReadTestDefinitions(self.grc)
+
+            # Get all enabled blocks with a test_name_filter
+            name_filters = gru.FixStrings(self.grc.get_block_property("id", "^nouradio_test", ["parameters", "test_name_filter"], cull_none=True))
+            states = gru.FixStrings(self.grc.get_block_property("id", "^nouradio_test", ["states", "state"], cull_none=True))
+            self.filters: dict = {}
+            self.modifiers: dict[str, dict] = {}
+            for block_name, name_filter in name_filters.items():
+                if states.get(block_name, None) == "disabled":
+                    continue
+                block = self.grc.get_block(block_name)
+                try:
+                    # Read the block params
+                    self.modifiers[block_name] = READ_NOUTEST_MAP[block["id"]](block)
+                except Exception as e:
+                    print(e)
+                    continue
+                self.filters[block_name] = gru.CompilePattern(name_filter)
+
+            # The names of the modifiers that apply to each test, in block order
+            self.matrix: dict[str, list[str]] = {
+                test_name: [block_name for block_name, pattern in self.filters.items() if pattern.search(test_name)]
+                for test_name in self.test_names
+            }
+
+    def applies(self, test_name: str, modifier_name: str) -> bool:
+        """Check if a modifier block applies to a test.
+        """
+        return modifier_name in self.matrix.get(test_name, [])
+
+    def modifiers_for(self, test_name: str) -> list[dict]:
+        """Get the decoded modifiers that apply to a test, in the form GenerateModifiedFlowgraphs() expects.
+
+        Args:
+            test_name (str): The test name.  It does not need to be defined in the flowgraph.
+
+        Returns:
+            list[dict]: The block params of each modifier
+        """
+        if test_name in self.matrix:
+            names = self.matrix[test_name]
+        else:
+            names = [block_name for block_name, pattern in self.filters.items() if pattern.search(test_name)]
+        return [self.modifiers[block_name] for block_name in names]
+
+    def tests_for(self, modifier_name: str) -> list[str]:
+        """Get the names of the tests that a modifier block applies to.
+        """
+        return [test_name for test_name, names in self.matrix.items() if modifier_name in names]
+
+    def to_dict(self) -> dict:
+        return {
+            "tests": self.test_names,
+            "modifiers": {block_name: modifier["type"] for block_name, modifier in self.modifiers.items()},
+            "matrix": self.matrix,
+        }
+
+def GatherTestModifiers(grc:dict | gru.GrcDocument | TestPlan, testName:str) -> list:
     """Read the modifier information from a GRC file for later processing.
 
     Args:
-        grc (dict): A dict of the GRC file contents
+        grc (dict | GrcDocument | TestPlan): A dict of the GRC file contents, its indexed document, or its plan
         testName (str): Check all block test_name_filter params to match this test name
 
     Returns:
         list: A list of block params from all blocks that are enabled and relevant to the test name.
     """
-    # Get all blocks with a test_name_filter
-    modifier_name_filters = gru.GetBlockProperty(grc, "id", "^nouradio_test", ["parameters", "test_name_filter"], cull_none=True)
-    modifier_name_filters = gru.FixStrings(modifier_name_filters)
+    plan = grc if isinstance(grc, TestPlan) else TestPlan(grc)
+    return plan.modifiers_for(testName)
 
-    # Then get all enabled blocks
-    modifier_states = gru.GetBlockProperty(grc, "id", "^nouradio_test", ["states", "state"], cull_none=True)
-    modifier_states = gru.FixStrings(modifier_states)
+# Names available to variable_change constraint expressions, in addition to the swept variables
+CONSTRAINT_GLOBALS = {"__builtins__": {}, "np": np, "math": math, "abs": abs, "min": min, "max": max,
+                      "round": round, "int": int, "float": float, "str": str, "len": len}
 
-    relevant_block_names = []
+def CheckConstraints(constraints: list, values: dict) -> bool:
+    """Evaluate the constraint expressions of a sweep against one combination of variable values.
 
-    # Cull all modifiers that are not configured for this test
-    for block_name, filter in modifier_name_filters.items():
-        m = re.search(filter, testName)
-        if not m:
-            continue
-
-        # Cull this modifier if the block is disabled
-        block_state = modifier_states.get(block_name, None)
-        if block_state and block_state == "disabled":
-            continue
+    Args:
+        constraints (list): A list of (expression string, compiled code) pairs
+        values (dict): The variable values of this combination, as {variable id: value}
 
-        relevant_block_names.append(block_name)
+    Raises:
+        ValueError: A constraint could not be evaluated, for example when it refers to an unknown variable.
 
-    decoded_blocks = []
-    for name in relevant_block_names:
-        block = list(gru.FilterBlocks(grc, "name", name).values())[0]
+    Returns:
+        bool: True if every constraint is satisfied
+    """
+    namespace = {variable: MaybeFloat(value) for variable, value in values.items()}
+    for expression, code in constraints:
         try:
-            # Read the block params
-            decoded_blocks.append(READ_NOUTEST_MAP[block["id"]](block))
+            if not eval(code, CONSTRAINT_GLOBALS, namespace):
+                return False
         except Exception as e:
-            print(e)
- 
-    return decoded_blocks
+            raise ValueError(f"Could not evaluate the sweep constraint '{expression}' with {namespace}: {e}") from e
+    return True
+
+def ParameterType(values: list) -> str | None:
+    """Choose the GRC parameter block type that can pass every value of a sweep on the command line.
 
-def GenerateModifiedFlowgraphs(grc:dict, modifiers:list) -> dict[str,dict]:
+    Args:
+        values (list): The values of one swept variable
+
+    Returns:
+        str | None: "intx" or "eng_float", or None if some value is not a number.
+    """
+    try:
+        [int(str(value), 0) for value in values]
+        return "intx"
+    except ValueError:
+        pass
+    try:
+        [float(str(value)) for value in values]
+        return "eng_float"
+    except ValueError:
+        return None
+
+def ParameterizeVariable(variant: gru.GrcVariant, block_name: str, parameter_type: str):
+    """Replace a variable block with a parameter block of the same name.  The generated python then
+    accepts the variable's value as a command line option (--block-name=value), and keeps the current
+    value as its default.
+
+    Args:
+        variant (GrcVariant): The flowgraph to modify
+        block_name (str): The name of a 'variable' block
+        parameter_type (str): The GRC parameter type.  See ParameterType().
+    """
+    i = variant.block_index(block_name)
+    block = variant.get(("blocks", i))
+    variant.set(("blocks", i), {
+        **block,
+        "id": "parameter",
+        "parameters": {
+            "comment": block["parameters"].get("comment", ""),
+            "hide": "none",
+            "label": block_name,
+            "short_id": "",
+            "type": parameter_type,
+            "value": str(block["parameters"]["value"]),
+        },
+    })
+
+# Qt sinks with these stream types can be replaced with a null sink
+NULL_SINK_TYPES = ["complex", "float", "int", "short", "byte"]
+
+# Qt widgets that keep their variable's value in a parameter other than "value"
+QT_WIDGET_VALUE_PARAMETERS = {
+    "qtgui_push_button": "released",
+    "qtgui_toggle_button": "released",
+    "qtgui_toggle_switch": "released",
+}
+
+# Test blocks whose exit callback closes the Qt window, unless their headless parameter is set
+HEADLESS_EXIT_BLOCKS = ["nouradio_test_stop_and_close", "nouradio_test_run_tests_wrapper"]
+
+def IsStreamPort(port) -> bool:
+    """Stream ports are numbered.  Message ports are named.
+    """
+    return str(port).isdigit()
+
+def MakeHeadless(variant: gru.GrcVariant):
+    """Change a flowgraph so it runs without a display.  It is generated as a no_gui flowgraph that runs until
+    it is stopped.  Qt sinks and screenshot blocks become null sinks, so the data still flows at full speed.
+    Qt widgets that hold a variable (ranges, choosers, entries, ...) become plain variables with their default
+    value.  Other Qt blocks are disabled.  The stop_and_close and run_tests_wrapper blocks stop the flowgraph
+    instead of closing its window.
+
+    Args:
+        variant (GrcVariant): The flowgraph to modify
+    """
+    variant.set(("options", "parameters", "generate_options"), "no_gui")
+    variant.set(("options", "parameters", "run_options"), "run")
+
+    connections = variant.get(("connections",)) or []
+    # Replaced blocks lose their message ports
+    drop_message_ports = set()
+    for i, block in enumerate(variant.get(("blocks",))):
+        name = block["name"]
+        block_id = block["id"]
+        parameters = block.get("parameters", {})
+        if gru.NormalizeState(block.get("states", {}).get("state")) == "disabled":
+            continue
+        if block_id in HEADLESS_EXIT_BLOCKS:
+            variant.set(("blocks", i, "parameters", "headless"), "True")
+            continue
+        if not block_id.startswith("qtgui_") and block_id != "nouradio_test_screenshot":
+            continue
+
+        stream_inputs = [connection for connection in connections if connection[2] == name and IsStreamPort(connection[3])]
+        stream_outputs = [connection for connection in connections if connection[0] == name and IsStreamPort(connection[1])]
+        stream_type = str(parameters.get("type", "")) or {"_c": "complex", "_f": "float"}.get(block_id[-2:], "")
+        value_parameter = QT_WIDGET_VALUE_PARAMETERS.get(block_id, "value")
+        if str(parameters.get("initPressed", "False")) == "True":
+            value_parameter = "pressed"
+
+        if stream_inputs and not stream_outputs and stream_type in NULL_SINK_TYPES:
+            variant.set(("blocks", i), {
+                **block,
+                "id": "blocks_null_sink",
+                "parameters": {
+                    "affinity": "",
+                    "alias": "",
+                    "bus_structure_sink": "[[0,],]",
+                    "comment": parameters.get("comment", ""),
+                    "num_inputs": str(max(int(connection[3]) for connection in stream_inputs) + 1),
+                    "type": stream_type,
+                    "vlen": str(parameters.get("vlen", "1")),
+                },
+            })
+            drop_message_ports.add(name)
+        elif not stream_inputs and not stream_outputs and value_parameter in parameters:
+            variant.set(("blocks", i), {
+                **block,
+                "id": "variable",
+                "parameters": {
+                    "comment": parameters.get("comment", ""),
+                    "value": str(parameters[value_parameter]),
+                },
+            })
+            drop_message_ports.add(name)
+        else:
+            if stream_inputs or stream_outputs:
+                print(f"Warning: Block {name} ({block_id}) needs a display and cannot be replaced.  Disabling it for the headless flowgraph.")
+            variant.set(("blocks", i, "states", "state"), "disabled")
+
+    if drop_message_ports:
+        variant.set(("connections",), [
+            connection for connection in connections
+            if not (connection[0] in drop_message_ports and not IsStreamPort(connection[1]))
+            and not (connection[2] in drop_message_ports and not IsStreamPort(connection[3]))
+        ])
+
+def GenerateModifiedFlowgraphs(grc:dict | gru.GrcDocument,
+                               modifiers:list,
+                               parameterize: bool = False,
+                               headless: bool = False) -> Iterator[tuple[str, gru.GrcVariant, dict, dict]]:
     """Using a set of modifiers gathered by GatherTestModifiers(), apply each modifier to the
     flowgraph and generate a set of modified copies of this flowgraph.
 
+    The copies are copy-on-write variants of the original document, so each one only stores the
+    values it changes.  Block names in the modifiers are matched exactly.
+
+    If several non-constant variable changes apply, every combination of their values is produced
+    (a Cartesian product, in block order with the last variable changing fastest).  Combinations are
+    generated one at a time.  Any variable_change "constraint" expressions are checked for each
+    combination, and combinations that fail them are skipped.
+
+    With parameterize, each swept 'variable' block whose values are all numbers is turned into a
+    parameter block, and its value is passed when the flowgraph starts instead of being written into
+    the flowgraph.  Combinations that only differ in those values then share one flowgraph object, so
+    it only needs to be saved and compiled once.
+
+    A variable_change in "bisect" mode does not add combinations.  Its variable is always turned into a
+    parameter block, and the values are passed when each run starts.  See SearchSettings().
+
     Args:
-        grc (dict): A dict of the GRC file contents
+        grc (dict | GrcDocument): A dict of the GRC file contents, or its indexed document
         modifiers (list): The output of GatherTestModifiers()
+        parameterize (bool, optional): Pass numeric sweep values on the command line. Defaults to False.
+        headless (bool, optional): Run the flowgraph without a display.  See MakeHeadless(). Defaults to False.
 
     Raises:
-        ValueError: Raised when multiple variable sweeps are present.  Only one is allowed per test.
+        ValueError: Raised when one variable is swept by multiple blocks, when a constraint cannot be evaluated, or when
+            the variable of a bisect search is not a 'variable' block.
 
-    Returns:
-        dict[str,dict]: A list of generated test names and the modified flowgraph for each.
+    Yields:
+        tuple[str, GrcVariant, dict, dict]: For each combination, a generated name modifier, the modified flowgraph,
+            the swept values as {variable: value string}, and the subset of those values that must be passed at runtime.
     """
-    outputs = {}
-    if not modifiers:
-        return {"":grc}
-    grc_copy = copy.deepcopy(grc)
+    def SetBlockProperty(variant: gru.GrcVariant, block_name: str, property_chain: list, value):
+        # Skip empty entries from the comma-separated lists, and warn about blocks that do not exist.
+        if not block_name:
+            return
+        try:
+            variant.set_block_property(block_name, property_chain, value)
+        except KeyError:
+            print(f"Warning: Block {block_name} does not exist!  Ignoring this modification.")
+
+    grc_copy = gru.GrcVariant(grc)
+    constant_values = {}
+    constraints = []
     # Process the things that take effect globally first
     for modifier in modifiers:
         match modifier["type"]:
             case "nouradio_test_enable_disable_blocks":
                 for block_name in modifier["enable_blocks"]:
-                    grc_copy = gru.SetBlockProperty(grc_copy, "name", block_name, ["states", "state"], "enabled")
+                    SetBlockProperty(grc_copy, block_name, ["states", "state"], "enabled")
                 for block_name in modifier["disable_blocks"]:
-                    grc_copy = gru.SetBlockProperty(grc_copy, "name", block_name, ["states", "state"], "disabled")
+                    SetBlockProperty(grc_copy, block_name, ["states", "state"], "disabled")
             case "nouradio_test_variable_change":
                 if modifier["mode"] == "constant":
-                    grc_copy = gru.SetBlockProperty(grc_copy, "name", modifier["variable"], ["parameters", "value"], modifier["value"])
+                    SetBlockProperty(grc_copy, modifier["variable"], ["parameters", "value"], modifier["value"])
+                    constant_values[modifier["variable"]] = modifier["value"]
+                if modifier["constraint"]:
+                    constraints.append((modifier["constraint"], compile(modifier["constraint"], modifier["name"], "eval")))
             case "nouradio_test_run_tests_wrapper":
                 # Disable the test runner portion to prevent recursion.
-                grc_copy = gru.SetBlockProperty(grc_copy, "name", modifier["name"], ["parameters", "suppress_runner"], True)
+                SetBlockProperty(grc_copy, modifier["name"], ["parameters", "suppress_runner"], True)
+
+    # Before the sweeps, so the Qt widgets that become variables can also be parameterized
+    if headless:
+        MakeHeadless(grc_copy)
+
     # Then the things that require us to fork the files
+    sweeps = {}
+    search = SearchSettings(modifiers)
     for modifier in modifiers:
-        match modifier["type"]:
-            case "nouradio_test_variable_change":
-                if len(outputs) > 1:
-                    raise ValueError("Can only split based on one variable change at a time!")
-                if modifier["mode"] != "constant":
-                    for value in modifier["resolved_choices"]:
-                        grc_copy = gru.SetBlockProperty(grc_copy, "name", modifier["variable"], ["parameters", "value"], str(value))
-                        name_modifier = f"{modifier['variable']}_{str(value).replace(' ','_')}"
-                        outputs[name_modifier] = copy.deepcopy(grc_copy)
-    # If there are no outputs, ensure at least one output by adding the original file.
-    # If outputs already exist, we only want to run the modified copies; not the original.
-    if not outputs:
-        outputs[''] = grc_copy
-
-    return outputs
-
-def GenerateTestFlowgraphs(grc: dict, output_folder: str | Path)-> list:
-    """Given a GRC file, read all tests definitions from it, then generate modified GRC files
-    for each test and, if applicable, for each variable value.
+        if modifier["type"] == "nouradio_test_variable_change" and modifier["mode"] != "constant":
+            if modifier["variable"] in sweeps or (search is not None and modifier["mode"] != "bisect" and modifier["variable"] == search["variable"]):
+                raise ValueError(f"Variable {modifier['variable']} is swept by more than one variable change block!")
+            if modifier["mode"] != "bisect":
+                sweeps[modifier["variable"]] = modifier["resolved_choices"]
+
+    # The searched value is only known when each run starts
+    if search is not None:
+        try:
+            is_variable = grc_copy.get_block_property(search["variable"], ["id"]) == "variable"
+        except KeyError:
+            is_variable = False
+        if not is_variable:
+            raise ValueError(f"Variable {search['variable']} must be a 'variable' block to be searched in bisect mode")
+        ParameterizeVariable(grc_copy, search["variable"], "intx" if search["integer"] else "eng_float")
+
+    # If there are no sweeps, produce the single modified file.
+    # If there are sweeps, we only want to run the modified copies; not the original.
+    if not sweeps:
+        yield "", grc_copy, {}, {}
+        return
+
+    # Only plain variables can become parameters.  GUI widgets and other blocks keep their values in the flowgraph.
+    runtime_variables = set()
+    if parameterize:
+        for variable, choices in sweeps.items():
+            parameter_type = ParameterType(choices)
+            try:
+                is_variable = grc_copy.get_block_property(variable, ["id"]) == "variable"
+            except KeyError:
+                is_variable = False
+            if parameter_type is not None and is_variable:
+                ParameterizeVariable(grc_copy, variable, parameter_type)
+                runtime_variables.add(variable)
+
+    # Flowgraphs for combinations that only differ in runtime values, keyed by the values written into them
+    shared_variants = {}
+    for combination in itertools.product(*sweeps.values()):
+        values = dict(zip(sweeps.keys(), combination))
+        if constraints and not CheckConstraints(constraints, constant_values | values):
+            continue
+        fixed_values = tuple((variable, str(value)) for variable, value in values.items() if variable not in runtime_variables)
+        variant = shared_variants.get(fixed_values)
+        if variant is None:
+            variant = grc_copy.derive()
+            for variable, value in fixed_values:
+                SetBlockProperty(variant, variable, ["parameters", "value"], value)
+            if runtime_variables:
+                shared_variants[fixed_values] = variant
+        name_parts = [f"{variable}_{str(value).replace(' ','_')}" for variable, value in values.items()]
+        runtime_values = {variable: str(value) for variable, value in values.items() if variable in runtime_variables}
+        yield "_".join(name_parts), variant, {variable: str(value) for variable, value in values.items()}, runtime_values
+
+def SearchSettings(modifiers: list) -> dict | None:
+    """Find the bisect search of a test, if it has one.
 
     Args:
-        grc (dict): A dict of the GRC file contents
-        output_folder (str | Path): A path in which to place the outputs.  If this is a file, its parent will be used.
-    
+        modifiers (list): The output of GatherTestModifiers()
+
+    Raises:
+        ValueError: More than one variable_change block is in bisect mode.
+
     Returns:
-        list[str]: A list of paths to the output files
+        dict | None: The arguments of bisect_search.BisectSearch, or None
     """
-    def ReplaceBadChars(in_str:str, chars:str|list, replace_with: str = "_") -> str:
-        """Replace all characters in a string with another.  The inputs and outputs can also be substrings.
+    searches = [modifier["search"] for modifier in modifiers if modifier["type"] == "nouradio_test_variable_change" and modifier["mode"] == "bisect"]
+    if len(searches) > 1:
+        raise ValueError(f"Only one variable can be searched in bisect mode, not {', '.join(search['variable'] for search in searches)}!")
+    return searches[0] if searches else None
+
+# Characters that may come from test names and sweep values, but should not be in file names
+FILE_NAME_BAD_CHARS = " \t()[]{}-!@#$%^&*+;'\"?/><,`~."
+
+def ReplaceBadChars(in_str:str, chars:str|list, replace_with: str = "_") -> str:
+    """Replace all characters in a string with another.  The inputs and outputs can also be substrings.
+    """
+    for char in chars:
+        in_str = in_str.replace(char, replace_with)
+    return in_str
+
+class TestConfiguration:
+    """One run of a test: the flowgraph to execute, the values to pass to it when it starts, and its limits.
+    Without parameterization, every configuration has its own flowgraph and no runtime values.
+
+    A configuration with a bisect search is run several times by RunTests(), once for each value the search
+    chooses.  See point().
+
+    A configuration can be used as a path to its saved .grc file.
+    """
+    def __init__(self,
+                 name: str,
+                 test_name: str,
+                 flowgraph_name: str,
+                 values: dict | None = None,
+                 runtime_values: dict | None = None,
+                 timeout_s: float = 0,
+                 cpu_limit_s: float = 0,
+                 memory_limit_mb: float = 0,
+                 search: dict | None = None):
+        """
+        Args:
+            name (str): The unique name of this configuration.  This names its artifact folder.
+            test_name (str): The name from the test's define_test block
+            flowgraph_name (str): The name (and GRC id) of the flowgraph this configuration runs.  It may be shared.
+            values (dict | None, optional): The swept variable values as {variable: value string}. Defaults to None.
+            runtime_values (dict | None, optional): The values passed on the command line, as {variable: value string}. Defaults to None.
+            timeout_s (float, optional): The wall clock limit from the define_test block.  0 uses the runner's limit. Defaults to 0.
+            cpu_limit_s (float, optional): The CPU time limit from the define_test block.  0 uses the runner's limit. Defaults to 0.
+            memory_limit_mb (float, optional): The memory limit in MiB from the define_test block.  0 uses the runner's limit. Defaults to 0.
+            search (dict | None, optional): The settings of a bisect search.  See SearchSettings(). Defaults to None.
+        """
+        self.name: str = name
+        self.test_name: str = test_name
+        self.flowgraph_name: str = flowgraph_name
+        self.flowgraph: Path | None = None # The saved .grc file
+        self.values: dict = {} if values is None else values
+        self.runtime_values: dict = {} if runtime_values is None else runtime_values
+        self.timeout_s: float = timeout_s
+        self.cpu_limit_s: float = cpu_limit_s
+        self.memory_limit_mb: float = memory_limit_mb
+        self.search: dict | None = search
+
+    def __fspath__(self) -> str:
+        return str(self.flowgraph)
+
+    def arguments(self) -> list[str]:
+        """The command line options that set the runtime values, in the form GRC uses for parameter blocks.
         """
-        for char in chars:
-            in_str = in_str.replace(char, replace_with)
-        return in_str
+        return [f"--{variable.replace('_', '-')}={value}" for variable, value in self.runtime_values.items()]
 
-    prepared_test_paths = []
-    output_folder: Path = Path(output_folder)
+    def max_runs(self) -> int:
+        """The most times this configuration runs: once, or once for each value its bisect search may try.
+        """
+        if self.search is None:
+            return 1
+        return bisect_search.MaxRuns(self.search["start"], self.search["stop"], self.search["tolerance"])
 
-    if not output_folder.is_dir():
-        print(f"Note: Output path {str(output_folder)} is not a folder.  Using its parent...")
-        output_folder = output_folder.parent
+    def point(self, value: float | int) -> "TestConfiguration":
+        """The configuration that runs one value of this configuration's bisect search.  It uses the same flowgraph.
+        """
+        variable = self.search["variable"]
+        value = bisect_search.FormatValue(value)
+        point = TestConfiguration(ReplaceBadChars(f"{self.name}_{variable}_{value}", FILE_NAME_BAD_CHARS, "_"),
+                                  self.test_name,
+                                  self.flowgraph_name,
+                                  self.values | {variable: value},
+                                  self.runtime_values | {variable: value},
+                                  self.timeout_s,
+                                  self.cpu_limit_s,
+                                  self.memory_limit_mb)
+        point.flowgraph = self.flowgraph
+        return point
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "test_name": self.test_name,
+            "flowgraph": None if self.flowgraph is None else str(self.flowgraph),
+            "values": self.values,
+            "runtime_values": self.runtime_values,
+            "arguments": self.arguments(),
+            "timeout_s": self.timeout_s,
+            "cpu_limit_s": self.cpu_limit_s,
+            "memory_limit_mb": self.memory_limit_mb,
+            "search": self.search,
+        }
+
+    def __repr__(self):
+        return f"TestConfiguration({self.name!r})"
+
+def IterateTestConfigurations(grc: dict | gru.GrcDocument | TestPlan,
+                              parameterize: bool = False,
+                              headless: bool = False) -> Iterator[tuple[TestConfiguration, gru.GrcVariant | None]]:
+    """Given a GRC file, read all tests definitions from it, then generate the modified flowgraph
+    for each test and, if applicable, for each combination of variable values.  Nothing is written.
 
-    print(f"Generating test files at {str(output_folder)}")
+    Args:
+        grc (dict | GrcDocument | TestPlan): A dict of the GRC file contents, its indexed document, or its plan
+        parameterize (bool, optional): Share one flowgraph between configurations that only differ in numeric
+            sweep values.  See GenerateModifiedFlowgraphs(). Defaults to False.
+        headless (bool, optional): Generate flowgraphs that run without a display.  See MakeHeadless(). Defaults to False.
+
+    Yields:
+        tuple[TestConfiguration, GrcVariant | None]: Each configuration, and its flowgraph the first time that flowgraph
+            is used.  Later configurations that share it get None.  The flowgraph id is already set.
+    """
+    plan = grc if isinstance(grc, TestPlan) else TestPlan(grc)
 
     # Generate modified flowgraphs for each test
-    for test_name in ReadTestNames(grc):
+    for test_name in plan.test_names:
         print(f"Configuring Test {test_name}")
-        modifiers = GatherTestModifiers(grc, test_name)
-        test_files = GenerateModifiedFlowgraphs(grc, modifiers)
-        for i, (name_modifier, grc_contents) in enumerate(test_files.items()):
+        limits = {limit: plan.definitions.get(test_name, {}).get(limit, 0) for limit in TEST_LIMITS}
+        modifiers = plan.modifiers_for(test_name)
+        search = SearchSettings(modifiers)
+        test_files = TRACER.iterate(GenerateModifiedFlowgraphs(plan.grc, modifiers, parameterize, headless), "configure", test=test_name)
+        flowgraph_names = {}
+        for i, (name_modifier, grc_contents, values, runtime_values) in enumerate(test_files):
             # Using the stringified modifier name, make a unique name for resaving this file
             better_name = f"test_{test_name}_{i}"
             if name_modifier:
@@ -369,45 +839,247 @@ def GenerateTestFlowgraphs(grc: dict, output_folder: str | Path)-> list:
                 
             # This is not exhaustive, but replace common characters that may arise from the test name
             # and modifiers with a safe character for file names like the underscore.
-            better_name = ReplaceBadChars(better_name, " \t()[]{}-!@#$%^&*+;'\"?/><,`~.", "_")
+            better_name = ReplaceBadChars(better_name, FILE_NAME_BAD_CHARS, "_")
+
+            if not runtime_values:
+                grc_contents.set_grc_id(better_name)
+                yield TestConfiguration(better_name, test_name, better_name, values, search=search, **limits), grc_contents
+                continue
+
+            # The variant object is shared by every configuration that uses the same flowgraph
+            flowgraph_name = flowgraph_names.get(id(grc_contents))
+            is_new = flowgraph_name is None
+            if is_new:
+                flowgraph_name = ReplaceBadChars(f"test_{test_name}_{len(flowgraph_names)}_parameterized", FILE_NAME_BAD_CHARS, "_")
+                flowgraph_names[id(grc_contents)] = flowgraph_name
+                grc_contents.set_grc_id(flowgraph_name)
+            yield TestConfiguration(better_name, test_name, flowgraph_name, values, runtime_values, search=search, **limits), grc_contents if is_new else None
+
+def IterateTestFlowgraphs(grc: dict | gru.GrcDocument,
+                          output_folder: str | Path,
+                          workers: int = 1,
+                          compile: bool = False,
+                          errors: dict | None = None,
+                          compiler: str = "grcc",
+                          parameterize: bool = False,
+                          shard_index: int = 0,
+                          shard_count: int = 1,
+                          durations: dict | None = None,
+                          headless: bool = False) -> Iterator[TestConfiguration]:
+    """The streaming version of GenerateTestFlowgraphs().  Each configuration is saved and yielded as soon as
+    it is generated, so the caller can start using it before the remaining configurations exist.
 
-            filename = output_folder / f"{better_name}.grc"
-            grc_contents = gru.SetGrcID(grc_contents, better_name)
-            print(f"   Saving {str(filename.absolute())}")
-            gru.Save(filename, grc_contents)
-            prepared_test_paths.append(filename)
+    Args:
+        grc (dict | GrcDocument): A dict of the GRC file contents, or its indexed document
+        output_folder (str | Path): A path in which to place the outputs.  If this is a file, its parent will be used.
+        workers (int, optional): Save (and compile) the files in this many worker processes.  See gru.SaveFlowgraphs(). Defaults to 1.
+        compile (bool, optional): Also generate the python file for each configuration with grcc. Defaults to False.
+        errors (dict | None, optional): If given, {path: error message} is added for each file that failed. Defaults to None.
+        compiler (str, optional): "grcc" or "in_process".  See gru.GetCompileFunction(). Defaults to "grcc".
+        parameterize (bool, optional): Save one flowgraph for configurations that only differ in numeric sweep values.
+            See IterateTestConfigurations(). Defaults to False.
+        shard_index (int, optional): Only generate the configurations of this shard.  See sharding.SelectShard(). Defaults to 0.
+        shard_count (int, optional): Split the configurations into this many shards. Defaults to 1 (all configurations).
+        durations (dict | None, optional): Recorded test durations, to balance the shards.  See sharding.ReadDurations(). Defaults to None.
+        headless (bool, optional): Generate flowgraphs that run without a display.  See MakeHeadless(). Defaults to False.
+
+    Yields:
+        TestConfiguration: Each configuration, in generation order.  It can be used as the path of its saved .grc file.
+    """
+    output_folder: Path = Path(output_folder)
+    errors = {} if errors is None else errors
 
-    return prepared_test_paths
+    if not output_folder.is_dir():
+        print(f"Note: Output path {str(output_folder)} is not a folder.  Using its parent...")
+        output_folder = output_folder.parent
+
+    print(f"Generating test files at {str(output_folder)}")
+
+    # The configurations whose files are being saved, in order
+    pending = deque()
+    def Outputs():
+        configurations = IterateTestConfigurations(grc, parameterize, headless)
+        if shard_count > 1:
+            configurations = sharding.SelectShard(configurations, shard_index, shard_count, durations)
+        for configuration, grc_contents in configurations:
+            configuration.flowgraph = output_folder / f"{configuration.flowgraph_name}.grc"
+            if grc_contents is not None:
+                print(f"   Saving {str(configuration.flowgraph.absolute())}")
+            pending.append(configuration)
+            yield configuration.flowgraph, grc_contents
+
+    for path, error in gru.SaveFlowgraphResults(Outputs(), workers, compile, compiler):
+        configuration = pending.popleft()
+        if error is not None:
+            errors[str(path)] = error
+        elif str(path) in errors:
+            # A shared flowgraph that failed earlier
+            continue
+        else:
+            yield configuration
+    gru.ReportErrors("generate", errors)
+
+def GenerateTestFlowgraphs(grc: dict | gru.GrcDocument,
+                           output_folder: str | Path,
+                           workers: int = 1,
+                           compile: bool = False,
+                           compiler: str = "grcc",
+                           parameterize: bool = False,
+                           shard_index: int = 0,
+                           shard_count: int = 1,
+                           durations: dict | None = None,
+                           headless: bool = False)-> list:
+    """Given a GRC file, read all tests definitions from it, then generate modified GRC files
+    for each test and, if applicable, for each variable value.
 
-def PrepareTests(grc_path: str | Path, output_path: str) -> list:
+    Args:
+        grc (dict | GrcDocument): A dict of the GRC file contents, or its indexed document
+        output_folder (str | Path): A path in which to place the outputs.  If this is a file, its parent will be used.
+        workers (int, optional): Save (and compile) the files in this many worker processes. Defaults to 1.
+        compile (bool, optional): Also generate the python file for each configuration with grcc. Defaults to False.
+        compiler (str, optional): "grcc" or "in_process".  See gru.GetCompileFunction(). Defaults to "grcc".
+        parameterize (bool, optional): Compile one flowgraph for configurations that only differ in numeric sweep
+            values, and return TestConfiguration objects.  See IterateTestFlowgraphs(). Defaults to False.
+        shard_index (int, optional): Only generate the configurations of this shard.  See sharding.SelectShard(). Defaults to 0.
+        shard_count (int, optional): Split the configurations into this many shards. Defaults to 1 (all configurations).
+        durations (dict | None, optional): Recorded test durations, to balance the shards.  See sharding.ReadDurations(). Defaults to None.
+        headless (bool, optional): Generate flowgraphs that run without a display.  See MakeHeadless(). Defaults to False.
+    
+    Returns:
+        list[TestConfiguration]: The generated configurations, which can be used as paths to the output files.
+            Files that failed are reported, not returned.
+    """
+    return list(IterateTestFlowgraphs(grc, output_folder, workers, compile, compiler=compiler, parameterize=parameterize,
+                                      shard_index=shard_index, shard_count=shard_count, durations=durations, headless=headless))
+
+def PrepareTests(grc_path: str | Path,
+                 output_path: str,
+                 workers: int = 1,
+                 compile: bool = False,
+                 compiler: str = "grcc",
+                 parameterize: bool = False,
+                 shard_index: int = 0,
+                 shard_count: int = 1,
+                 durations: dict | None = None,
+                 headless: bool = False) -> list:
     """Convenience wrapper for reading a GRC and running the test generation process
 
     Args:
         grc_path (str | Path): A path to the GRC file.
         output_path (str): A path to a folder in which to generate the GRC files.
+        workers (int, optional): Save (and compile) the files in this many worker processes. Defaults to 1.
+        compile (bool, optional): Also generate the python file for each configuration with grcc. Defaults to False.
+        compiler (str, optional): "grcc" or "in_process".  See gru.GetCompileFunction(). Defaults to "grcc".
+        parameterize (bool, optional): Compile one flowgraph for configurations that only differ in numeric sweep
+            values.  See IterateTestFlowgraphs(). Defaults to False.
+        shard_index (int, optional): Only generate the configurations of this shard.  See sharding.SelectShard(). Defaults to 0.
+        shard_count (int, optional): Split the configurations into this many shards. Defaults to 1 (all configurations).
+        durations (dict | None, optional): Recorded test durations, to balance the shards.  See sharding.ReadDurations(). Defaults to None.
+        headless (bool, optional): Generate flowgraphs that run without a display.  See MakeHeadless(). Defaults to False.
 
     Returns:
-        list[str]: A list of paths to the generated .grc files
+        list[TestConfiguration]: The generated configurations, which can be used as paths to the generated .grc files
     """
-    grc = gru.Load(grc_path)
-    test_files = GenerateTestFlowgraphs(grc, output_path)
+    grc = gru.LoadDocument(grc_path)
+    test_files = GenerateTestFlowgraphs(grc, output_path, workers, compile, compiler, parameterize, shard_index, shard_count, durations, headless)
     return test_files
 
-def RunTests(artifacts_dir: str|Path, test_files: list[str]|list[Path] = None, test_dir: str|Path = None):
+def StreamTests(grc_path: str | Path,
+                output_path: str,
+                max_ahead: int = 2,
+                workers: int = 1,
+                compile: bool = False,
+                compiler: str = "grcc",
+                parameterize: bool = False,
+                shard_index: int = 0,
+                shard_count: int = 1,
+                durations: dict | None = None,
+                headless: bool = False,
+                errors: dict | None = None) -> Iterator[TestConfiguration]:
+    """The streaming version of PrepareTests().  The test files are generated in a background thread while
+    the caller consumes them, so RunTests() can execute the first configuration while later ones are
+    still being generated.
+
+    Args:
+        grc_path (str | Path): A path to the GRC file.
+        output_path (str): A path to a folder in which to generate the GRC files.
+        max_ahead (int, optional): The number of files to generate ahead of the consumer. Defaults to 2.
+        workers (int, optional): Save (and compile) the files in this many worker processes. Defaults to 1.
+        compile (bool, optional): Also generate the python file for each configuration with grcc. Defaults to False.
+        compiler (str, optional): "grcc" or "in_process".  See gru.GetCompileFunction(). Defaults to "grcc".
+        parameterize (bool, optional): Compile one flowgraph for configurations that only differ in numeric sweep
+            values.  See IterateTestFlowgraphs(). Defaults to False.
+        shard_index (int, optional): Only generate the configurations of this shard.  See sharding.SelectShard(). Defaults to 0.
+        shard_count (int, optional): Split the configurations into this many shards. Defaults to 1 (all configurations).
+        durations (dict | None, optional): Recorded test durations, to balance the shards.  See sharding.ReadDurations(). Defaults to None.
+        headless (bool, optional): Generate flowgraphs that run without a display.  See MakeHeadless(). Defaults to False.
+        errors (dict | None, optional): If given, {path: error message} is added for each file that failed. Defaults to None.
+
+    Returns:
+        Iterator[TestConfiguration]: The generated configurations, available as soon as each file is saved
+    """
+    def Generate():
+        yield from IterateTestFlowgraphs(gru.LoadDocument(grc_path), output_path, workers, compile, compiler=compiler, parameterize=parameterize,
+                                         shard_index=shard_index, shard_count=shard_count, durations=durations, headless=headless,
+                                         errors=errors)
+    return gru.BackgroundIterator(Generate(), max_ahead)
+
+def RunTests(artifacts_dir: str|Path,
+             test_files: Iterable[str|Path|TestConfiguration] = None,
+             test_dir: str|Path = None,
+             grcc_cache: GrccCache | None = None,
+             compiler: str = "grcc",
+             max_parallel: int = 1,
+             timeout_s: float | None = None,
+             cpu_limit_s: float | None = None,
+             memory_limit_mb: float | None = None,
+             resume: str | Path | None = None,
+             incremental: bool = False,
+             results_db: str | Path | None = RESULTS_DB_NAME,
+             runner: str = "subprocess",
+             output: capture.OutputOptions | None = None,
+             deduplicate: bool = False,
+             pack: bool = False,
+             order: str = "given",
+             max_failures: int | None = None) -> dict:
     """Run a collection of tests.  Each time this is called, a new folder containing the starting timestamp
     will be created within the artifacts_dir directory.  For each test, a new folder will be created within
     this first folder.  The name of each subfolder will indicate the test name and configuration used for
     the test.
 
     For each test, the corresponding grc file will be copied into a folder matching its name.  The "grcc"
-    command will generate the python files required to run this flowgraph.  This will change the working
-    directory to this folder and execute the .py flowgraph.  During the run, any stdout, stderr, screenshots
+    command will generate the python files required to run this flowgraph.  The .py flowgraph is then
+    executed with this folder as its working directory.  During the run, any stdout, stderr, screenshots
     (from the Test: Screenshot block) and error logs (from the Test: Stream Watch block) will also be written
     to this folder, assuming they are configured to save files in the working directory.  All files needed to
     reproduce this run, assuming the same Python environment, will be in this configuration's artifact folder.
     This process will repeat for each configuration of each test.
 
-    When all tests are concluded, the working directory will be restored to its original folder.
+    A configuration with a bisect search (a variable_change block in "bisect" mode) runs the flowgraph once
+    for each value the search tries, each in its own folder, until the value where the test starts to fail
+    is found.  The values tried and the boundary are saved to a .search.json file in the run's folder.
+
+    With resume, no new folder is created.  The tests are run in an existing run's folder instead, and
+    each test that already finished and passed there is skipped.  Everything else is run again.  With
+    incremental, a test is skipped if a test with the same flowgraph, arguments and environment passed in
+    any earlier run in artifacts_dir.  Its folder then only contains a result.json that points to that run.
+
+    Up to max_parallel flowgraphs run at once.  Each one runs in its own folder, so the working directory
+    of this process never changes.  When each test finishes, its exit code and timing are saved to result.json
+    in its folder.  When all tests are concluded, a summary of the run will be printed and saved to
+    summary.json in the run's folder.  The time spent in each phase, from loading the flowgraph to
+    running each configuration, is saved to trace.json, and totals for each phase are printed.  Set
+    TRACER.enabled to False to skip this, along with the calibration run of the interpreter startup.
+
+    With order="history", the tests are read first and reordered with the results database: the ones that
+    failed last time run first, then the new and changed ones, then the rest.  Within each group the longest
+    start first, to finish sooner in parallel.  With max_failures, no more tests are started once that many
+    have failed.  The tests that are still running finish.
+
+    With deduplicate, files with the same contents in different folders, such as the flowgraph that many
+    configurations share, are hard links to one file in the .blobs folder of artifacts_dir.  With pack, the
+    finished run folder is also packed into Run_1_Timestamp.zip, from which single files can be listed and
+    extracted.  See artifacts.PackRun().
     
     Overall, the artifacts directory will be arranged as follows.
     > test_artifacts
@@ -415,62 +1087,146 @@ def RunTests(artifacts_dir: str|Path, test_files: list[str]|list[Path] = None, t
        |-->Test_1_Config_1
           |-->test_1_config_1.grc
           |-->test_1_config_1.py
-          |-->stdout.txt
-          |-->stderr.txt
+          |-->configuration.json (only for TestConfiguration tests)
+          |-->stdout.txt (or stdout.txt.gz)
+          |-->stderr.txt (or stderr.txt.gz)
+          |-->resources.json
+          |-->result.json
+          |-->timeout.txt (only if the flowgraph was stopped)
+          |-->complete.json (written last, when the test is finished)
           |-->screenshot1.png
           |-->error_log.txt
        |-->Test_1_Config_2
        |-->Test_2_Config_1
        |-->Test_2_Config_2 
+       |-->Test_3_Config_1.search.json (only for bisect searches)
+       |-->summary.json
+       |-->trace.json (open with ui.perfetto.dev)
     |-->Run_2_Timestamp
        |--> ...
+    |-->results.sqlite
+    |-->.blobs (only with deduplicate)
 
     Args:
         artifacts_dir (str | Path): A path in which to place the artifacts from each test run.
-        test_files (list[str] | list[Path], optional): A list of .grc files to run. Defaults to None.
+        test_files (Iterable[str | Path | TestConfiguration], optional): A list of .grc files or configurations to run.
+            This can also be an iterator, such as StreamTests(), in which case each test starts as soon as its file is
+            produced.  A configuration's values are saved to configuration.json and passed on the command line.
+            Defaults to None.
         test_dir (str | Path, optional): A directory containing .grc files to run. They will be copied to folders in the artifacts_dir before executing. Defaults to None.
+        grcc_cache (GrccCache | None, optional): Reuse python files generated by grcc in previous runs. Defaults to None (always run grcc).
+        compiler (str, optional): "grcc" runs grcc for each test.  "in_process" loads the GRC platform once for the whole run.
+            See gru.GetCompileFunction(). Defaults to "grcc".
+        max_parallel (int, optional): The maximum number of flowgraphs to run at once. Defaults to 1.
+        timeout_s (float | None, optional): Stop a flowgraph (and any processes it started) after this many seconds.
+            A define_test block's timeout_s overrides this for its test.  See executor.RunFlowgraph(). Defaults to None (no limit).
+        cpu_limit_s (float | None, optional): Stop a flowgraph after it uses this much CPU time.  A define_test block's
+            cpu_limit_s overrides this for its test. Defaults to None (no limit).
+        memory_limit_mb (float | None, optional): Stop a flowgraph when its processes use more than this many MiB of memory.
+            A define_test block's memory_limit_mb overrides this for its test.  The resources each flowgraph used are
+            saved to resources.json.  See executor.RunFlowgraph(). Defaults to None (no limit).
+        resume (str | Path | None, optional): Continue the run in this folder, which is inside artifacts_dir.  Only the tests
+            that did not finish or did not pass are run. Defaults to None (start a new run).
+        incremental (bool, optional): Skip tests that are unchanged since they passed in an earlier run. Defaults to False.
+        results_db (str | Path | None, optional): Record every configuration's result in this SQLite database.  A relative
+            path is inside artifacts_dir.  See results_db.ResultsDatabase.  None does not record. Defaults to RESULTS_DB_NAME.
+        runner (str, optional): "subprocess" starts a new python interpreter for each flowgraph.  "forkserver" forks each one
+            from a process that has already imported GNU Radio, Qt and numpy, which is faster for short tests.  It falls back
+            to "subprocess" where fork is not available.  See forkserver.ForkServer. Defaults to "subprocess".
+        output (capture.OutputOptions | None, optional): Limit the size of each test's stdout.txt and stderr.txt, compress them,
+            or print them live with the test name.  See capture.OutputCapture. Defaults to None (write all output as is).
+        deduplicate (bool, optional): Store identical files once, as hard links to a shared blob.  The linked files must not be
+            modified.  See artifacts.BlobStore. Defaults to False.
+        pack (bool, optional): Also pack the run folder into a zip archive when the run is finished. Defaults to False.
+        order (str, optional): "given" runs the tests in the order they are given, and can start while they are still being
+            generated.  "history" runs the ones most likely to fail first.  See sharding.HistoryOrder(). Defaults to "given".
+        max_failures (int | None, optional): Stop starting tests after this many failures.  The runs of a bisect search do
+            not count. Defaults to None (run everything).
+
+    Returns:
+        dict: The run summary that is saved to summary.json
     """
-    # Generate a new folder in the artifacts directory using the timestamp
-    now = datetime.now()
-    timestamp = now.strftime("%m_%d_%Y__%H_%M_%S")
-    artifacts_dir = Path(artifacts_dir) / timestamp
-    print(f"Test outputs at {str(artifacts_dir)}")
-    os.makedirs(str(artifacts_dir))
+    if runner not in executor.RUNNERS:
+        raise ValueError(f"Runner {runner} is not valid.  Use one of {executor.RUNNERS}!")
+    if order not in sharding.ORDERS:
+        raise ValueError(f"Order {order} is not valid.  Use one of {sharding.ORDERS}!")
+    server = None
+
+    artifacts_root = Path(artifacts_dir)
+    if resume is not None:
+        artifacts_dir = Path(resume)
+        if not artifacts_dir.is_dir():
+            raise FileNotFoundError(f"Cannot resume: {str(artifacts_dir)} is not a folder")
+        artifacts_root = artifacts_dir.parent
+        print(f"Resuming the run at {str(artifacts_dir)}")
+    else:
+        # Generate a new folder in the artifacts directory using the timestamp
+        now = datetime.now()
+        timestamp = now.strftime("%m_%d_%Y__%H_%M_%S")
+        artifacts_dir = Path(artifacts_dir) / timestamp
+        print(f"Test outputs at {str(artifacts_dir)}")
+        os.makedirs(str(artifacts_dir))
+
+    # Identify each test by its content, so later incremental runs can skip it
+    environment = executor.EnvironmentFingerprint(grcc_cache.gnuradio_version if grcc_cache is not None else GnuRadioVersion())
+    passing_tests = executor.IndexPassingTests(artifacts_root) if incremental else {}
+
+    # The cache may be shared between runs, so only report this run's share of its counters
+    cache_stats_at_start = grcc_cache.stats() if grcc_cache is not None else None
+
+    blobs = artifacts.BlobStore(artifacts_root / artifacts.BLOB_STORE_NAME) if deduplicate else None
 
     def CopyFiles(files: list, copy_to: str|Path):
         copy_to = Path(copy_to)
         print(f"Copying {len(files)} files...")
         for file in files:
             print(f" > Copying {file}")
-            shutil.copy2(str(file), str(copy_to))
+            if blobs is not None:
+                blobs.place(file, copy_to)
+            else:
+                shutil.copy2(str(file), str(copy_to))
     
-    def ExecuteAndRecord(test_file: str|Path):
+    def ExecuteAndRecord(test_file: str|Path, arguments: list | None = None, limits: dict | None = None) -> dict:
         """Run the Python flowgraph and store its outputs
 
         Args:
             test_file (str | Path): A python version of a grc file to execute
+            arguments (list | None, optional): Command line arguments for the flowgraph. Defaults to None.
+            limits (dict | None, optional): The test's own timeout_s, cpu_limit_s and memory_limit_mb.  Zero values use the run's limits. Defaults to None.
+
+        Raises:
+            RuntimeError: The python file could not be generated.
+
+        Returns:
+            dict: The result of the run.  See executor.RunFlowgraph().
         """
         test_file = Path(test_file).absolute()
 
-        with gru.ChDirContext(test_file.parent, False):
-            # Generate the python versions of these files before executing
-            gru.GeneratePythonFiles(test_file.parent)
-            
-            # Execute the flowgraph and store the results
-            print(f"Executing {test_file.name}...", end='')
-            with open("stdout.txt", "w") as of:
-                with open("stderr.txt", "w") as ef:
-                    subprocess.run(["python", str(test_file.name)],
-                                    stdout=of,
-                                    stderr=ef)
-        print("Done")
-
-    def PrepareTestArtifactDir(test: str|Path):
+        # Generate the python versions of these files before executing, unless they
+        # were already compiled during generation
+        if not test_file.exists():
+            gru.GeneratePythonFiles(test_file.parent, cache=grcc_cache, compiler=compiler)
+            if not test_file.exists():
+                raise RuntimeError(f"Could not generate {test_file.name}")
+
+        # Execute the flowgraph and store the results
+        limits = limits or {}
+        with TRACER.span("execute", "run", test=test_file.parent.name):
+            return executor.RunFlowgraph(test_file,
+                                         arguments,
+                                         timeout_s=limits.get("timeout_s") or timeout_s,
+                                         cpu_limit_s=limits.get("cpu_limit_s") or cpu_limit_s,
+                                         memory_limit_mb=limits.get("memory_limit_mb") or memory_limit_mb,
+                                         server=server,
+                                         output=output)
+
+    def PrepareTestArtifactDir(test: str|Path, name: str | None = None):
         """Create a new subfolder in this run's folder for a particular test configuration.
         Copy the grc file to that directory.
 
         Args:
             test (str | Path): The path to a particular test grc file
+            name (str | None, optional): The folder name. Defaults to None (the file name).
 
         Returns:
             Path: The path to the .grc file in its new folder
@@ -478,25 +1234,183 @@ def RunTests(artifacts_dir: str|Path, test_files: list[str]|list[Path] = None, t
         test = Path(test)
         
         # Make the directory (and/or clear it)
-        new_artifacts_dir = artifacts_dir  / test.stem
+        new_artifacts_dir = artifacts_dir  / (test.stem if name is None else name)
         os.makedirs(str(new_artifacts_dir))
 
         related_files = [test]
+        if test.with_suffix(".py").exists():
+            # Compiled during generation
+            related_files.append(test.with_suffix(".py"))
         CopyFiles(related_files, new_artifacts_dir)
 
         return new_artifacts_dir / test.with_suffix(".py").name
 
-    def Go(test: str|Path):
+    # Parallel tests may share a parameterized flowgraph, which must only be compiled once
+    compile_locks = {}
+    compile_locks_lock = Lock()
+
+    def CompileOnce(flowgraph: Path):
+        with compile_locks_lock:
+            lock = compile_locks.setdefault(str(flowgraph), Lock())
+        with lock:
+            if not flowgraph.with_suffix(".py").exists():
+                gru.GeneratePythonFiles(flowgraph, cache=grcc_cache, compiler=compiler)
+
+    def Go(test: str|Path|TestConfiguration, search_name: str | None = None) -> dict:
         """Prepare a new artifacts folder for a particular test configuration.
         Copy the generated grc file to this folder and generate the python equivalent files.
         Execute the python files and record stdout and stdin, as well as any run artifacts,
         in the folder.
 
         Args:
-            test (str | Path): A path to a particular grc file
+            test (str | Path | TestConfiguration): A path to a particular grc file, or a configuration
+            search_name (str | None, optional): The bisect search this run is part of. Defaults to None.
+
+        Returns:
+            dict: The result of the run
+        """
+        folder = artifacts_dir / TestName(test)
+        arguments = test.arguments() if isinstance(test, TestConfiguration) else []
+        flowgraph_hash = executor.FileHash(test)
+        key = executor.ContentKey(flowgraph_hash, arguments, environment)
+
+        if resume is not None and folder.exists():
+            completion = executor.ReadCompletion(folder)
+            if completion is not None and completion["exit_code"] == 0:
+                print(f"Skipping {folder.name}: it already passed in this run")
+                return (executor.ReadResult(folder) or {"name": folder.name, "exit_code": 0}) | {"skipped": "resume"}
+            # Did not finish, or failed.  Start it over.
+            shutil.rmtree(folder)
+
+        if key in passing_tests:
+            print(f"Skipping {folder.name}: unchanged since it passed in {str(passing_tests[key])}")
+            os.makedirs(str(folder))
+            result = {"name": folder.name, "exit_code": 0, "skipped": "incremental", "previous": str(passing_tests[key]),
+                      "flowgraph_hash": flowgraph_hash, "content_key": key,
+                      "stream_watch_failures": (executor.ReadResult(passing_tests[key]) or {}).get("stream_watch_failures")}
+            executor.WriteResult(folder, result)
+            executor.MarkComplete(folder, result, key)
+            return result
+
+        if not isinstance(test, TestConfiguration):
+            with TRACER.span("prepare", "run", test=folder.name):
+                artifact_test_path = PrepareTestArtifactDir(test)
+            result = ExecuteAndRecord(artifact_test_path)
+        else:
+            # The flowgraph may be shared by many configurations, so compile it once where it was generated
+            flowgraph = Path(test.flowgraph)
+            CompileOnce(flowgraph)
+            with TRACER.span("prepare", "run", test=folder.name):
+                artifact_test_path = PrepareTestArtifactDir(flowgraph, test.name)
+                with open(artifact_test_path.parent / "configuration.json", "w") as of:
+                    json.dump(test.to_dict(), of, indent=2)
+            result = ExecuteAndRecord(artifact_test_path, arguments, {limit: getattr(test, limit) for limit in TEST_LIMITS})
+
+        # Add what is only known after the run
+        with TRACER.span("record", "run", test=folder.name):
+            result["flowgraph_hash"] = flowgraph_hash
+            result["content_key"] = key
+            if search_name is not None:
+                result["search"] = search_name
+            try:
+                result["stream_watch_failures"] = CountStreamWatchFailures(folder)
+            except Exception as e:
+                print(f"Warning: could not count the stream watch failures of {folder.name}: {e}")
+            if blobs is not None:
+                # Logs and screenshots that match another configuration's
+                blobs.deduplicate(folder)
+            executor.WriteResult(folder, result)
+            executor.MarkComplete(folder, result, key)
+        return result
+
+    def TestName(test: str|Path|TestConfiguration) -> str:
+        return test.name if isinstance(test, TestConfiguration) else Path(test).stem
+
+    def ErrorResult(test: str|Path|TestConfiguration, error: Exception, search_name: str | None = None) -> dict:
+        print(f"Error: test {TestName(test)} could not run: {error}")
+        result = {"name": TestName(test), "exit_code": None, "error": str(error)}
+        if search_name is not None:
+            result["search"] = search_name
+        if (artifacts_dir / result["name"]).is_dir():
+            executor.WriteResult(artifacts_dir / result["name"], result)
+        return result
+
+    def RunSearch(test: TestConfiguration) -> dict:
+        """Run a configuration with a bisect search.  Each value is run as its own configuration, one after
+        another, since the outcome of each run chooses the next value.  The values that were run and the
+        boundary that was found are saved to <name>.search.json in the run folder.
+
+        Returns:
+            dict: The search, with the (configuration, result) pair of each value in "points"
+        """
+        search = bisect_search.BisectSearch(**test.search)
+        points = []
+        while (value := search.next_value()) is not None:
+            point = test.point(value)
+            try:
+                result = Go(point, test.name)
+            except Exception as e:
+                result = ErrorResult(point, e, test.name)
+            points.append((point, result))
+            search.report(value, bisect_search.Passed(result), point.name)
+        record = search.to_dict() | {"name": test.name, "test_name": test.test_name, "values": test.values}
+        with open(artifacts_dir / f"{test.name}{bisect_search.SEARCH_FILE_SUFFIX}", "w") as of:
+            json.dump(record, of, indent=2)
+        boundary = record["boundary"]
+        print(f"Search {test.name}: " + (f"{search.variable} passes at {boundary['passing']} and fails at {boundary['failing']}" if boundary
+                                         else f"it {'passes' if search.outcomes.get(search.start) else 'fails'} at both ends") + f" ({len(points)} runs)")
+        return {"name": test.name, "search": record, "points": points}
+
+    def GoOrSearch(test: str|Path|TestConfiguration) -> dict:
+        if isinstance(test, TestConfiguration) and test.search is not None:
+            return RunSearch(test)
+        return Go(test)
+
+    def OrderByHistory(tests: list) -> list:
+        """Reorder the tests with the results of earlier runs.  See sharding.HistoryOrder().
+        """
+        names = [TestName(test) for test in tests]
+        durations = database.durations()
+        configurations = [test for test in tests if isinstance(test, TestConfiguration)]
+        costs = {name: durations.get(name) for name in names}
+        costs |= sharding.EstimateDurations(configurations, durations, database.test_durations())
+        content_keys = {}
+        for test in tests:
+            if isinstance(test, TestConfiguration):
+                costs[test.name] = None if costs[test.name] is None else costs[test.name] * test.max_runs()
+                if test.search is not None:
+                    # Searched values are only known while it runs
+                    continue
+            arguments = test.arguments() if isinstance(test, TestConfiguration) else []
+            content_keys[TestName(test)] = executor.ContentKey(executor.FileHash(test), arguments, environment)
+
+        latest = database.latest_results()
+        ordered = [tests[i] for i in sharding.HistoryOrder(names, latest, content_keys, costs)]
+        priorities = [sharding.HistoryPriority(name, latest, content_keys.get(name)) for name in names]
+        print(f"Running {len(tests)} tests by history: {priorities.count(sharding.PRIORITY_FAILED)} failed last time, "
+              f"{priorities.count(sharding.PRIORITY_CHANGED)} are new or changed, {priorities.count(sharding.PRIORITY_UNCHANGED)} are unchanged")
+        return ordered
+
+    def Scheduled(tests: Iterable) -> Iterator:
+        """The tests to start, until max_failures tests have failed.
         """
-        artifact_test_path = PrepareTestArtifactDir(test)
-        ExecuteAndRecord(artifact_test_path)
+        for test in tests:
+            if max_failures is not None and failures >= max_failures:
+                stopped_early.append(TestName(test))
+                print(f"Stopping the run after {failures} failures.  The tests that were not started yet are skipped.")
+                return
+            yield test
+
+    def Record(test: str|Path|TestConfiguration, result: dict):
+        nonlocal failures
+        if result.get("exit_code") != 0 and "search" not in result:
+            failures += 1
+        results.append(result)
+        if database is not None:
+            if isinstance(test, TestConfiguration):
+                database.record(run_id, result, test.test_name, test.values)
+            else:
+                database.record(run_id, result)
 
     # If the user specified a directory instead of a list of files, add those
     # to the list here.  Prefer using test_files instead of test_dir to avoid
@@ -504,12 +1418,9 @@ def RunTests(artifacts_dir: str|Path, test_files: list[str]|list[Path] = None, t
     if test_dir is not None:
         test_dir = Path(test_dir)
 
-        # If the user did not supply a list of files, initialize it here.
-        # Otherwise, copy it to minimize the risk of modifying the input.
-        if test_files is None:
-            test_files = []
-        else:
-            test_files = copy.deepcopy(test_files)
+        # Chain the directory's files after any supplied files.  This avoids modifying
+        # the input and keeps iterators lazy.
+        dir_files = []
 
         # Add all python files in this directory to the list of tests.
         # This may fail because many of them may not be flowgraphs, or
@@ -518,24 +1429,96 @@ def RunTests(artifacts_dir: str|Path, test_files: list[str]|list[Path] = None, t
         for test in test_dir.glob("*.py"):
             try:
                 gru.Load(test)
-                test_files.append(test)
+                dir_files.append(test)
             except:
                 # Probably not a generated python file from a GRC.  Don't add it.
                 pass
+        test_files = itertools.chain(test_files or [], dir_files)
 
-    # Now run all of the tests
-    for test in test_files:
-        Go(test)
+    # Time a bare interpreter start with GNU Radio imported, to separate that cost from the flowgraphs in the trace
+    if TRACER.enabled:
+        with TRACER.span("interpreter startup", "run", calibration=True):
+            try:
+                subprocess.run([sys.executable, "-c", "from gnuradio import gr"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            except OSError as e:
+                print(f"Warning: could not time the interpreter startup: {e}")
+
+    database = None
+    if results_db is not None:
+        database = ResultsDatabase(artifacts_root / results_db)
+        run_id = database.start_run(artifacts_dir, datetime.now().isoformat(), environment)
+
+    results = []
+    searches = {}
+    failures = 0
+    stopped_early = [] # The first test that was not started, if max_failures was reached
+    start = time.perf_counter()
+    summary = None
+    try:
+        if runner == "forkserver":
+            with TRACER.span("fork server startup", "run"):
+                server = forkserver.StartForkServer()
+
+        if order == "history":
+            if database is None:
+                print("Warning: ordering by history needs the results database.  Running the tests in the given order.")
+            else:
+                with TRACER.span("order", "run"):
+                    test_files = OrderByHistory(list(test_files or []))
+
+        # Now run all of the tests.  If test_files is a stream, each test starts as
+        # soon as its file has been generated and a slot is free.
+        start = time.perf_counter()
+        for test, result, error in executor.RunConcurrently(GoOrSearch, Scheduled(test_files or []), max_parallel):
+            if error is not None:
+                result = ErrorResult(test, error)
+            if "points" in result:
+                for point, point_result in result["points"]:
+                    Record(point, point_result)
+                searches[result["name"]] = {key: result["search"][key] for key in ["variable", "boundary", "runs"]}
+                continue
+            Record(test, result)
+
+        # Summarize the run
+        summary = {"tests": executor.CompletionReport(results, time.perf_counter() - start)}
+        if searches:
+            summary["searches"] = searches
+        if stopped_early:
+            summary["stopped_early"] = {"max_failures": max_failures, "first_not_started": stopped_early[0]}
+        if grcc_cache is not None:
+            summary["grcc_cache"] = {k: v - cache_stats_at_start[k] for k, v in grcc_cache.stats().items()}
+        if blobs is not None:
+            summary["deduplication"] = blobs.stats()
+        print("Run summary:")
+        for name, value in summary.items():
+            print(f"   {name}: {value}")
+        with open(artifacts_dir / "summary.json", "w") as of:
+            json.dump(summary, of, indent=2)
+    finally:
+        # Also clean up when the tests could not be generated or ordered, or the run was interrupted
+        if server is not None:
+            server.close()
+        if summary is None:
+            summary = {"tests": executor.CompletionReport(results, time.perf_counter() - start), "interrupted": True}
+
+        # Write the events recorded since the last run, including test generation
+        if TRACER.enabled:
+            events = TRACER.drain()
+            TRACER.write(artifacts_dir / TRACE_FILE_NAME, events)
+            Tracer.print_summary(events)
+        if database is not None:
+            database.finish_run(run_id, datetime.now().isoformat(), summary)
+            database.close()
+    if blobs is not None:
+        # Forget the files of runs that have been deleted since
+        blobs.prune()
+    if pack:
+        artifacts.PackRun(artifacts_dir)
+    return summary
 
 
 if __name__ == "__main__":
-    """A harness for basic testing
+    """The same as the nouradio-test command.  See cli.py.
     """
-    file_name = Path(r"my_test_file.grc")
-    output_path = Path(r"my_output_path")
-    
-    if not output_path.exists():
-        os.mkdir(output_path)
-
-    tests = PrepareTests(file_name, output_path)
-    RunTests(file_name, output_path, test_files=tests)
\ No newline at end of file
+    import cli
+    sys.exit(cli.Main())
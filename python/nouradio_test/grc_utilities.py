@@ -8,15 +8,28 @@
 
 import yaml
 import re
+import sys
 import subprocess
 from pathlib import Path
-from copy import deepcopy
 import os
 from contextlib import contextmanager
 from queue import Queue, Full
 from threading import Thread
+from functools import lru_cache
+from collections import deque
+from bisect import insort
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterable, Iterator
 import time
 
+# Add the local path here to make local includes easier
+try:
+    from tracing import TRACER
+except:
+    sys.path.append(str(Path(__file__).parent))
+    print(f"Note: Adding path {Path(__file__).parent} to the python path.")
+    from tracing import TRACER
+
 @contextmanager
 def ChDirContext(dir: Path | str, create_okay: bool = False, quiet: bool = False):
     """Temporarily enter a directory.  When exiting the context, return to the original working directory.
@@ -162,6 +175,66 @@ class WriteLater:
         self.running = False
 
 
+class BackgroundIterator:
+    """Consume an iterable in a separate thread, keeping up to max_ahead items ready.  This lets a slow
+    producer (such as test generation) overlap with a slow consumer (such as test execution).  Any
+    exception raised by the producer is raised again in the consumer.
+    """
+    _DONE = object()
+
+    def __init__(self, iterable, max_ahead: int = 2):
+        """Start producing items now.
+
+        Args:
+            iterable (Iterable): The items to produce.  It will be iterated in the background thread.
+            max_ahead (int, optional): The number of items to produce before waiting for the consumer. Defaults to 2.
+        """
+        self.queue = Queue(maxsize=max(1, max_ahead))
+        self.should_run: bool = True # Used to stop the thread if the consumer stops early
+        self.thread: Thread = Thread(target=self.run, args=(iter(iterable),), daemon=True)
+        self.thread.start()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item, error = self.queue.get()
+        if item is self._DONE:
+            # Leave the marker in place so later calls also stop
+            self.queue.put((item, error))
+            if error is not None:
+                raise error
+            raise StopIteration
+        return item
+
+    def put(self, entry) -> bool:
+        while self.should_run:
+            try:
+                self.queue.put(entry, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def run(self, iterator):
+        """Produce the items.  Do not call this manually; it is started by __init__.
+        """
+        try:
+            for item in iterator:
+                if not self.put((item, None)):
+                    return
+        except BaseException as e:
+            self.put((self._DONE, e))
+            return
+        self.put((self._DONE, None))
+
+    def close(self):
+        """Stop producing items.  The item being produced, if any, is finished first.
+        """
+        self.should_run = False
+        self.thread.join()
+
+
 def FilterBlocks(grc:dict, field:str, pattern:str,):
     """_summary_
 
@@ -180,6 +253,363 @@ def FilterBlocks(grc:dict, field:str, pattern:str,):
                 output[i] = block
     return output
 
+@lru_cache(maxsize=1024)
+def CompilePattern(pattern: str) -> re.Pattern:
+    """Compile a regex pattern once and reuse it for every later filter with the same pattern.
+
+    Args:
+        pattern (str): A regex pattern
+
+    Returns:
+        re.Pattern: The compiled pattern
+    """
+    return re.compile(pattern)
+
+def NormalizeState(state) -> str:
+    """Some blocks store their state as a bool, and some store it as a string.  Unify that here.
+
+    Args:
+        state (bool | str): The "states" -> "state" value of a block
+
+    Returns:
+        str: "enabled", "disabled", or the original string (for example, "bypassed")
+    """
+    if state is True or state == "enabled" or state == "true":
+        return "enabled"
+    if state is False or state is None or state == "disabled" or state == "false":
+        return "disabled"
+    return str(state)
+
+
+class GrcDocument:
+    """An indexed view of a loaded .grc file.  The yaml contents are kept as-is in self.grc, so it can
+    be saved at any time, but blocks are also indexed by name, by id (the block type) and by state.
+    Exact lookups by name or id do not scan the block list, and regex lookups on the name or id only
+    scan the distinct keys of the index.
+
+    All edits must go through this class (or be followed by reindex()) to keep the indexes correct.
+    """
+    # Changes to any of these property chains move a block between indexes
+    INDEXED_CHAINS = (("name",), ("id",), ("states", "state"))
+
+    def __init__(self, grc: dict):
+        """Wrap and index a GRC dict.
+
+        Args:
+            grc (dict): A dictionary of the GRC file, as returned by Load()
+        """
+        self.grc: dict = grc
+        self.reindex()
+
+    @property
+    def blocks(self) -> list:
+        return self.grc.setdefault("blocks", [])
+
+    def reindex(self):
+        """Rebuild all indexes from the underlying GRC dict.
+        """
+        self.by_name: dict[str, int] = {}
+        self.by_id: dict[str, list[int]] = {}
+        self.by_state: dict[str, set[int]] = {}
+        for i, block in enumerate(self.blocks):
+            self._index_block(i, block)
+
+    def _index_block(self, i: int, block: dict):
+        if "name" in block:
+            self.by_name[block["name"]] = i
+        if "id" in block:
+            # Keep each list in block order, as reindex() builds it
+            insort(self.by_id.setdefault(block["id"], []), i)
+        state = NormalizeState(block.get("states", {}).get("state", None))
+        self.by_state.setdefault(state, set()).add(i)
+
+    def _unindex_block(self, i: int, block: dict):
+        if self.by_name.get(block.get("name", None), None) == i:
+            del self.by_name[block["name"]]
+        if "id" in block:
+            self.by_id[block["id"]].remove(i)
+        state = NormalizeState(block.get("states", {}).get("state", None))
+        self.by_state[state].discard(i)
+
+    def get_block(self, name: str) -> dict | None:
+        """Find a block by its exact name (the unique "id" shown in GRC).
+
+        Args:
+            name (str): The block name
+
+        Returns:
+            dict | None: The block, or None if no block has this name.
+        """
+        i = self.by_name.get(name, None)
+        return None if i is None else self.blocks[i]
+
+    def blocks_of_type(self, block_id: str) -> dict[int, dict]:
+        """Get all blocks with an exact block id, such as "variable" or "nouradio_test_define_test".
+
+        Returns:
+            dict[int, dict]: The matching blocks, keyed by their index in the block list.
+        """
+        return {i: self.blocks[i] for i in sorted(self.by_id.get(block_id, []))}
+
+    def blocks_in_state(self, state: str | bool) -> dict[int, dict]:
+        """Get all blocks in a particular state.
+
+        Args:
+            state (str | bool): The state to look for.  Booleans and "true"/"false" strings are accepted.
+
+        Returns:
+            dict[int, dict]: The matching blocks, keyed by their index in the block list.
+        """
+        return {i: self.blocks[i] for i in sorted(self.by_state.get(NormalizeState(state), []))}
+
+    def filter_blocks(self, field: str, pattern: str, exact: bool = False) -> dict[int, dict]:
+        """The indexed equivalent of FilterBlocks().
+
+        Args:
+            field (str): A particular field to examine (as a dict key).  "name" and "id" use the indexes.
+            pattern (str): Regex to apply to the field value, or the exact value if exact is True.
+            exact (bool, optional): Match the value exactly instead of with re.search. Defaults to False.
+
+        Returns:
+            dict[int, dict]: The matching blocks, keyed by their index in the block list.
+        """
+        if field == "name":
+            if exact:
+                i = self.by_name.get(pattern, None)
+                return {} if i is None else {i: self.blocks[i]}
+            regex = CompilePattern(pattern)
+            indices = [i for name, i in self.by_name.items() if regex.search(name)]
+        elif field == "id":
+            if exact:
+                return self.blocks_of_type(pattern)
+            regex = CompilePattern(pattern)
+            indices = [i for block_id, found in self.by_id.items() if regex.search(block_id) for i in found]
+        else:
+            # Not indexed; fall back to a scan
+            regex = CompilePattern(pattern)
+            indices = [i for i, block in enumerate(self.blocks)
+                       if field in block and (block[field] == pattern if exact else regex.search(block[field]))]
+        return {i: self.blocks[i] for i in sorted(indices)}
+
+    def get_block_property(self, filter_type: str, filter: str, property_chain: list, cull_none: bool = False, exact: bool = False) -> dict:
+        """The indexed equivalent of GetBlockProperty().
+
+        Args:
+            filter_type (str): A basic filter for the name or id of the blocks.  Use "name" or "id"
+            filter (str): A regex pattern (or exact value) to filter the blocks according to the field in filter_type.
+            property_chain (list): A list of nested keys to traverse and extract the value.
+            cull_none (bool, optional): If True, do not pass along values containing "None". Defaults to False.
+            exact (bool, optional): Match the filter exactly instead of as a regex. Defaults to False.
+
+        Returns:
+            dict: A dict of {block_name:value} for each block.
+        """
+        output = {}
+        for block in self.filter_blocks(filter_type, filter, exact).values():
+            value = None
+            try:
+                value = block
+                for key in property_chain:
+                    value = value[key]
+            except (KeyError, TypeError):
+                value = None
+                print(f"The requested property {property_chain[-1]} in block {block['name']} does not exist!")
+            if value is not None or not cull_none:
+                if property_chain[-1] == "state" and isinstance(value, bool):
+                    value = NormalizeState(value)
+                output[block["name"]] = value
+        return output
+
+    def set_block_property(self, filter_type: str, filter: str, property_chain: list, value, exact: bool = False) -> int:
+        """The in-place, indexed counterpart of SetBlockProperty().  Unlike SetBlockProperty(), this
+        does not copy the document.
+
+        Args:
+            filter_type (str): A basic filter for the name or id of the blocks.  Use "name" or "id"
+            filter (str): A regex pattern (or exact value) to filter the blocks according to the field in filter_type.
+            property_chain (list): A list of nested keys to traverse and set the value.
+            value (Any): A new value.  Must be yaml serializable.
+            exact (bool, optional): Match the filter exactly instead of as a regex. Defaults to False.
+
+        Returns:
+            int: The number of blocks modified
+        """
+        touches_index = tuple(property_chain) in self.INDEXED_CHAINS
+        matches = self.filter_blocks(filter_type, filter, exact)
+        for i, block in matches.items():
+            if touches_index:
+                self._unindex_block(i, block)
+            nested_set(block, property_chain, value)
+            if touches_index:
+                self._index_block(i, block)
+        return len(matches)
+
+    def block_is_enabled(self, block_name: str) -> bool:
+        """The indexed equivalent of BlockIsEnabled().
+
+        Args:
+            block_name (str): The block "name" property, which is the unique "id" shown in GRC
+
+        Returns:
+            bool: True if the block is enabled, False otherwise
+        """
+        i = self.by_name.get(block_name, None)
+        return i is not None and i in self.by_state.get("enabled", ())
+
+    def get_grc_id(self) -> str:
+        return GetGrcID(self.grc)
+
+    def set_grc_id(self, id: str):
+        """Change the name of the flowgraph in place.  See SetGrcID() for a copying version.
+        """
+        nested_set(self.grc, ["options", "parameters", "id"], id)
+
+
+def AsDocument(grc: dict | GrcDocument) -> GrcDocument:
+    """Accept either a GRC dict or a GrcDocument, and return a GrcDocument.  Dicts are wrapped, not copied.
+    """
+    return grc if isinstance(grc, GrcDocument) else GrcDocument(grc)
+
+def CopyOnWriteSet(root: dict, path: tuple | list, value, copied: set | None = None):
+    """Set a nested value in a shallow copy of a document, copying only the containers along the path.
+    Containers that are not on the path stay shared with the original.
+
+    Args:
+        root (dict): A (shallow) copy of the document.  Its id must already be in copied.
+        path (tuple | list): A list of nested keys (dict keys or list indices) to set.
+        value (Any): The new value.
+        copied (set | None, optional): The ids of the containers that already belong to this copy.  Updated in
+            place, so pass the same set when making several changes to one copy.  Defaults to None (only root).
+    """
+    if copied is None:
+        copied = {id(root)}
+    container = root
+    for key in path[:-1]:
+        child = container[key] if isinstance(container, list) else container.get(key, None)
+        if child is None:
+            child = {}
+        elif id(child) not in copied:
+            child = list(child) if isinstance(child, list) else dict(child)
+        else:
+            container = child
+            continue
+        container[key] = child
+        copied.add(id(child))
+        container = child
+    container[path[-1]] = value
+
+
+class GrcVariant:
+    """A copy-on-write version of a flowgraph.  A variant stores a shared base GrcDocument and a small
+    overlay of {path: value} changes.  The base is never modified, so any number of variants (and the
+    variants derived from them) can share it.  The full document only exists when materialize() is
+    called, typically by Save(), and even then the unchanged blocks are shared with the base.
+
+    Blocks are addressed by their name in the base document.
+    """
+    def __init__(self, base: dict | GrcDocument, overlay: dict | None = None):
+        """Make a variant of a flowgraph.
+
+        Args:
+            base (dict | GrcDocument): The flowgraph to modify.  It must not be changed while variants exist.
+            overlay (dict | None, optional): Changes as {path tuple: value}. Defaults to None (no changes).
+        """
+        self.base: GrcDocument = AsDocument(base)
+        self.overlay: dict[tuple, object] = {} if overlay is None else dict(overlay)
+
+    def derive(self) -> "GrcVariant":
+        """Make a new variant with the same changes as this one.  Only the overlay is copied.
+        """
+        return GrcVariant(self.base, self.overlay)
+
+    def set(self, path: tuple | list, value):
+        """Change a value in the flowgraph.
+
+        Args:
+            path (tuple | list): A list of nested keys from the document root, such as ("blocks", 3, "parameters", "value")
+            value (Any): A new value.  Must be yaml serializable, and must not be modified afterwards.
+        """
+        path = tuple(path)
+        # Changes below this path are replaced by the new value.  Re-inserting keeps the
+        # overlay in the order the changes were made.
+        for key in [k for k in self.overlay if k[:len(path)] == path]:
+            del self.overlay[key]
+        self.overlay[path] = value
+
+    def get(self, path: tuple | list):
+        """Read a value from the flowgraph, including any changes in this variant.
+
+        Raises:
+            KeyError: The path does not exist.
+        """
+        path = tuple(path)
+        value = self.base.grc
+        start = 0
+        for k in range(len(path), 0, -1):
+            if path[:k] in self.overlay:
+                value = self.overlay[path[:k]]
+                start = k
+                break
+        try:
+            for key in path[start:]:
+                value = value[key]
+        except (IndexError, TypeError) as e:
+            raise KeyError(path) from e
+
+        below = [(k[len(path):], v) for k, v in self.overlay.items() if len(k) > len(path) and k[:len(path)] == path]
+        if below:
+            value = list(value) if isinstance(value, list) else dict(value)
+            copied = {id(value)}
+            for sub_path, sub_value in below:
+                CopyOnWriteSet(value, sub_path, sub_value, copied)
+        return value
+
+    def block_index(self, name: str) -> int:
+        i = self.base.by_name.get(name, None)
+        if i is None:
+            raise KeyError(f"Block {name} does not exist!")
+        return i
+
+    def set_block_property(self, name: str, property_chain: list, value):
+        """Change a property of a block.
+
+        Args:
+            name (str): The exact block name
+            property_chain (list): A list of nested keys in the block to set.
+            value (Any): A new value.  Must be yaml serializable.
+        """
+        self.set(("blocks", self.block_index(name), *property_chain), value)
+
+    def get_block_property(self, name: str, property_chain: list):
+        return self.get(("blocks", self.block_index(name), *property_chain))
+
+    def block_is_enabled(self, name: str) -> bool:
+        try:
+            state = self.get_block_property(name, ["states", "state"])
+        except KeyError:
+            return False
+        return NormalizeState(state) == "enabled"
+
+    def get_grc_id(self) -> str:
+        return self.get(("options", "parameters", "id"))
+
+    def set_grc_id(self, id: str):
+        self.set(("options", "parameters", "id"), id)
+
+    def materialize(self) -> dict:
+        """Build the full GRC dict for this variant.  Unchanged parts are shared with the base document,
+        so treat the output as read-only.
+
+        Returns:
+            dict: The grc contents, ready to Save()
+        """
+        root = dict(self.base.grc)
+        copied = {id(root)}
+        for path, value in self.overlay.items():
+            CopyOnWriteSet(root, path, value, copied)
+        return root
+
+
 # https://stackoverflow.com/a/13688108, Bakuriu
 def nested_set(dic:dict, keys, value):
     for key in keys[:-1]:
@@ -230,13 +660,14 @@ def SetBlockProperty(grc:dict, filter_type: str, filter:str, property_chain: lis
         value (Any): A new value.  Must be yaml serializable.
 
     Returns:
-        dict: A modified copy of the grc dict with the new properties.
+        dict: A modified copy of the grc dict with the new properties.  Only the modified blocks are
+            copied; the rest are shared with the input.
     """
-    grc_copy = deepcopy(grc)
-    for i, block in FilterBlocks(grc, filter_type, filter).items():
-        nested_set(block, property_chain, value)
-        grc_copy["blocks"][i] = block
-    return grc_copy    
+    grc_copy = dict(grc)
+    copied = {id(grc_copy)}
+    for i in FilterBlocks(grc, filter_type, filter):
+        CopyOnWriteSet(grc_copy, ["blocks", i, *property_chain], value, copied)
+    return grc_copy
 
 def BlockIsEnabled(grc: dict, block_name: str) -> bool:
     """A shortcut to determine if a block is enabled
@@ -257,33 +688,236 @@ def BlockIsEnabled(grc: dict, block_name: str) -> bool:
         enabled = False
     return enabled
 
-def GeneratePythonFiles(folder_or_file: str | Path = "") -> list:
+def CompileFlowgraph(file: str | Path, output_dir: str | Path | None = None) -> str:
+    """Call grcc to convert one .grc file to a python file.
+
+    Args:
+        file (str | Path): The .grc file to compile
+        output_dir (str | Path | None, optional): Where to put the python file. Defaults to None (next to the .grc file).
+
+    Raises:
+        RuntimeError: grcc failed.  The message contains the end of its output.
+
+    Returns:
+        str: The path of the generated python file.  grcc names it after the flowgraph id, which
+            matches the file name for generated tests.
+    """
+    file = Path(file).absolute()
+    output_dir = file.parent if output_dir is None else Path(output_dir).absolute()
+    print(f"Generating .py for {file}")
+    result = subprocess.run(["grcc", str(file), "-o", str(output_dir)],
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT,
+                            text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"grcc exited with code {result.returncode}: {result.stdout[-2000:]}")
+    return str(output_dir / file.with_suffix(".py").name)
+
+COMPILERS = ["grcc", "in_process"]
+
+def GetCompileFunction(compiler: str = "grcc"):
+    """Choose how flowgraphs are compiled.
+
+    Args:
+        compiler (str, optional): "grcc" runs one grcc process per file.  "in_process" loads the GRC platform once
+            in this process (see batch_compiler.BatchCompiler) and falls back to grcc if that is not possible. Defaults to "grcc".
+
+    Raises:
+        ValueError: Unknown compiler
+
+    Returns:
+        Callable: A function with the same arguments and return value as CompileFlowgraph()
+    """
+    if compiler not in COMPILERS:
+        raise ValueError(f"Compiler {compiler} is not valid.  Use one of {COMPILERS}!")
+    if compiler == "in_process":
+        in_process = InProcessCompileFunction()
+        if in_process is not None:
+            return in_process
+    return CompileFlowgraph
+
+@lru_cache(maxsize=None)
+def InProcessCompileFunction():
+    """Load this process's batch compiler once.  If it cannot be loaded, warn once and return None.
+    """
+    try:
+        try:
+            from batch_compiler import SharedBatchCompiler
+        except ImportError:
+            sys.path.append(str(Path(__file__).parent))
+            from batch_compiler import SharedBatchCompiler
+        return SharedBatchCompiler().compile
+    except Exception as e:
+        # GNU Radio is not installed, or its platform or block library could not be loaded
+        print(f"Warning: Cannot compile in process ({e}).  Falling back to grcc.")
+        return None
+
+def ReportErrors(action: str, errors: dict):
+    """Print a summary of the files that failed in a batch operation.
+
+    Args:
+        action (str): A description of the operation, such as "compile"
+        errors (dict): {file: error message} for each failed file
+    """
+    if errors:
+        print(f"Could not {action} {len(errors)} file(s):")
+        for file, error in errors.items():
+            print(f" > {file}: {error}")
+
+def CompileFlowgraphs(files: Iterable[str | Path], workers: int = 1, output_dir: str | Path | None = None, cache = None, compiler: str = "grcc") -> tuple[list[str], dict[str, str]]:
+    """Call grcc for many .grc files.  Since each grcc call is its own process, a thread pool is
+    enough to keep up to "workers" compilations running at once.  A failed file does not stop the others.
+    The in-process compiler runs one file at a time, so workers has no effect with it.
+
+    Args:
+        files (Iterable[str | Path]): The .grc files to compile
+        workers (int, optional): The maximum number of simultaneous grcc processes. Defaults to 1.
+        output_dir (str | Path | None, optional): Where to put the python files. Defaults to None (next to each .grc file).
+        cache (GrccCache, optional): Reuse previously generated python files from this cache. Defaults to None.
+        compiler (str, optional): "grcc" or "in_process".  See GetCompileFunction(). Defaults to "grcc".
+
+    Returns:
+        tuple[list[str], dict[str, str]]: The generated python files in the order of the inputs, and
+            {file: error message} for each file that failed.
+    """
+    compile_function = GetCompileFunction(compiler)
+    def compile_one(file, output_dir):
+        with TRACER.span("compile", file=Path(file).name, cached=cache is not None):
+            if cache is None:
+                return compile_function(file, output_dir)
+            return cache.compile(file, output_dir, compile_function)
+    files_generated = []
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [(file, pool.submit(compile_one, file, output_dir)) for file in files]
+        for file, future in futures:
+            try:
+                files_generated.append(future.result())
+            except Exception as e:
+                errors[str(file)] = str(e)
+    ReportErrors("compile", errors)
+    return files_generated, errors
+
+def GeneratePythonFiles(folder_or_file: str | Path = "", workers: int = 1, cache = None, compiler: str = "grcc") -> list:
     """Call grcc to convert .grc files to python files.
 
     Args:
         folder_or_file (str | Path, optional): The specific file or folder to process. Defaults to "" (the working directory).
+        workers (int, optional): The maximum number of simultaneous grcc processes. Defaults to 1.
+        cache (GrccCache, optional): Reuse previously generated python files from this cache. Defaults to None.
+        compiler (str, optional): "grcc" or "in_process".  See GetCompileFunction(). Defaults to "grcc".
 
     Returns:
-        list: A list of the python files generated by this function.
+        list: A list of the python files generated by this function.  Files that failed are reported, not returned.
     """
-    files_generated = []
-   
     folder_or_file: Path = Path(folder_or_file)
     if folder_or_file.is_file():
-        file = folder_or_file
-        print(f"Generating .py for {file}")
-        subprocess.call(["grcc", str(file)])
-        files_generated.append(str(file.with_suffix(".py")))
+        files = [folder_or_file]
     else:
-        folder = folder_or_file
-        with ChDirContext(folder, True):
-            for file in folder.glob("*.grc"):
-                print(f"Generating .py for {file}")
-                subprocess.call(["grcc", str(file)])
-                files_generated.append(str(file.with_suffix(".py")))
-    
+        files = sorted(folder_or_file.glob("*.grc"))
+
+    files_generated, _ = CompileFlowgraphs(files, workers, cache=cache, compiler=compiler)
     return files_generated
 
+def SaveAndCompile(path: Path, grc: dict | GrcDocument | GrcVariant, compile: bool = False, compiler: str = "grcc") -> Path:
+    """Save a flowgraph and optionally compile it next to the .grc file.  This is the unit of work for SaveFlowgraphs().
+    With compiler="in_process", each worker process loads the GRC platform once and reuses it.
+    """
+    Save(path, grc)
+    if compile:
+        with TRACER.span("compile", file=path.name):
+            GetCompileFunction(compiler)(path)
+    return path
+
+def StartTracedWorker():
+    """Forget the events a forked worker process inherited from its parent, so they are not sent back twice.
+    """
+    TRACER.drain()
+
+def SaveAndCompileTraced(path: Path, grc: dict, compile: bool = False, compiler: str = "grcc") -> list[dict]:
+    """SaveAndCompile() for a worker process.  The worker's trace events are returned to the parent.
+    """
+    SaveAndCompile(path, grc, compile, compiler)
+    return TRACER.drain()
+
+def SaveFlowgraphResults(items: Iterable[tuple[Path | str, dict | GrcDocument | GrcVariant | None]],
+                         workers: int = 1,
+                         compile: bool = False,
+                         compiler: str = "grcc") -> Iterator[tuple[Path, str | None]]:
+    """Save (and optionally compile) many flowgraphs.  When workers > 1, a process pool serializes the
+    yaml, which is pure Python and otherwise limited to one core by the GIL.  Up to 2 * workers
+    flowgraphs are in progress at once, so the items can be a stream.
+
+    The output paths are the ones given, and the results are yielded in the order of the inputs regardless
+    of which worker finishes first.  Failures do not stop the batch.
+
+    Args:
+        items (Iterable[tuple[Path | str, dict | GrcDocument | GrcVariant | None]]): (path, flowgraph) pairs to save.
+            A flowgraph of None means nothing is saved, but the path is still yielded in order.
+        workers (int, optional): The number of worker processes.  1 saves in this process. Defaults to 1.
+        compile (bool, optional): Also run grcc on each saved file. Defaults to False.
+        compiler (str, optional): "grcc" or "in_process".  See GetCompileFunction(). Defaults to "grcc".
+
+    Yields:
+        tuple[Path, str | None]: Each path, and an error message if it failed
+    """
+    def Collect(path, get_result):
+        try:
+            get_result()
+            return Path(path), None
+        except Exception as e:
+            print(f"Error: could not save {path}: {e}")
+            return Path(path), str(e)
+
+    if workers <= 1:
+        for path, grc in items:
+            if grc is None:
+                yield Path(path), None
+            else:
+                yield Collect(path, lambda: SaveAndCompile(Path(path), grc, compile, compiler))
+        return
+
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=StartTracedWorker) as pool:
+        for path, grc in items:
+            # Only send plain dicts to the workers.  A variant would pickle its whole base document anyway.
+            if isinstance(grc, GrcVariant):
+                grc = grc.materialize()
+            elif isinstance(grc, GrcDocument):
+                grc = grc.grc
+            future = None if grc is None else pool.submit(SaveAndCompileTraced, Path(path), grc, compile, compiler)
+            pending.append((path, future))
+            while len(pending) >= 2 * workers:
+                path, future = pending.popleft()
+                yield (Path(path), None) if future is None else Collect(path, lambda: TRACER.extend(future.result()))
+        while pending:
+            path, future = pending.popleft()
+            yield (Path(path), None) if future is None else Collect(path, lambda: TRACER.extend(future.result()))
+
+def SaveFlowgraphs(items: Iterable[tuple[Path | str, dict | GrcDocument | GrcVariant]],
+                   workers: int = 1,
+                   compile: bool = False,
+                   errors: dict | None = None,
+                   compiler: str = "grcc") -> Iterator[Path]:
+    """Save (and optionally compile) many flowgraphs, skipping the ones that fail.  See SaveFlowgraphResults().
+
+    Args:
+        items (Iterable[tuple[Path | str, dict | GrcDocument | GrcVariant]]): (path, flowgraph) pairs to save
+        workers (int, optional): The number of worker processes.  1 saves in this process. Defaults to 1.
+        compile (bool, optional): Also run grcc on each saved file. Defaults to False.
+        errors (dict | None, optional): If given, {path: error message} is added for each failed file. Defaults to None.
+        compiler (str, optional): "grcc" or "in_process".  See GetCompileFunction(). Defaults to "grcc".
+
+    Yields:
+        Path: Each successfully saved (and compiled) file
+    """
+    errors = {} if errors is None else errors
+    for path, error in SaveFlowgraphResults(items, workers, compile, compiler):
+        if error is None:
+            yield path
+        else:
+            errors[str(path)] = error
+
 def Load(path: Path|str) -> dict:
     """Read a .grc file for readable by the other functions in grc_utilities
 
@@ -296,22 +930,39 @@ def Load(path: Path|str) -> dict:
     if isinstance(path, str):
         path = Path(path)
     grc = None
-    with path.open("r") as file:
-        grc = yaml.load(file, Loader=yaml.Loader)
+    with TRACER.span("load", file=path.name):
+        with path.open("r") as file:
+            grc = yaml.load(file, Loader=yaml.Loader)
     return grc
     
-def Save(path: Path|str, grc: dict):
+def LoadDocument(path: Path|str) -> GrcDocument:
+    """Read a .grc file and index it.
+
+    Args:
+        path (Path | str): The path to the .grc file
+
+    Returns:
+        GrcDocument: The indexed .grc contents.
+    """
+    return GrcDocument(Load(path))
+
+def Save(path: Path|str, grc: dict | GrcDocument | GrcVariant):
     """Save the grc contents to a new file.  This can overwrite an existing file.
 
     Args:
         path (Path | str): The path to which to save.
-        grc (dict): The grc contents to save
+        grc (dict | GrcDocument | GrcVariant): The grc contents to save
     """
     if isinstance(path, str):
         path = Path(path)
+    if isinstance(grc, GrcVariant):
+        grc = grc.materialize()
+    elif isinstance(grc, GrcDocument):
+        grc = grc.grc
     path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w") as file:
-        yaml.dump(grc, file, Dumper=yaml.Dumper)
+    with TRACER.span("save", file=path.name):
+        with path.open("w") as file:
+            yaml.dump(grc, file, Dumper=yaml.Dumper)
 
 def FixStrings(iterable: list | dict, convert_numeric:bool = False):
     """Strip excess whitespace and quotes, and optionally convert numeric values to floats.
@@ -352,8 +1003,8 @@ def SetGrcID(grc: dict, id: str) -> dict:
         id (str): The new id
 
     Returns:
-        dict: The modified grc contents
+        dict: The modified grc contents.  Only the options are copied; the blocks are shared with the input.
     """
-    grc_copy = deepcopy(grc)
-    nested_set(grc_copy, ["options", "parameters", "id"], id)
+    grc_copy = dict(grc)
+    CopyOnWriteSet(grc_copy, ["options", "parameters", "id"], id)
     return grc_copy
\ No newline at end of file
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import os
+import sys
+import json
+import yaml
+import shutil
+import hashlib
+import tempfile
+import subprocess
+from pathlib import Path
+from threading import Lock
+
+# Add the local path here to make local includes easier
+try:
+    import grc_utilities as gru
+except:
+    sys.path.append(str(Path(__file__).parent))
+    print(f"Note: Adding path {Path(__file__).parent} to the python path.")
+    import grc_utilities as gru
+
+# The C loader is much faster when it is available
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+def DefaultCacheDir() -> Path:
+    """The cache location, which can be set with the NOURADIO_TEST_CACHE_DIR environment variable.
+    """
+    if "NOURADIO_TEST_CACHE_DIR" in os.environ:
+        return Path(os.environ["NOURADIO_TEST_CACHE_DIR"])
+    return Path.home() / ".cache" / "nouradio_test" / "grcc"
+
+def GnuRadioVersion() -> str:
+    """Get the installed GNU Radio version.  The generated python depends on it, so it is part of each cache key.
+
+    Returns:
+        str: The version string, or "unknown" if GNU Radio cannot be found.
+    """
+    try:
+        from gnuradio import gr
+        return gr.version()
+    except ImportError:
+        pass
+    try:
+        return subprocess.check_output(["gnuradio-config-info", "--version"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class GrccCache:
+    """A persistent, content-addressed cache of grcc output.  Each entry is keyed by a hash of the
+    normalized .grc contents and the GNU Radio version, so a configuration that was compiled in any
+    previous run is copied (or hard linked) from the cache instead of calling grcc again.
+
+    The cache is limited in size.  When it grows beyond max_size_bytes, the least recently used entries
+    are removed.  Usage is tracked with the file modification times, which are updated on each hit.
+    """
+    def __init__(self, cache_dir: str | Path | None = None, max_size_bytes: int = 1 << 30, link: bool = True, gnuradio_version: str | None = None):
+        """Open (or create) a cache.
+
+        Args:
+            cache_dir (str | Path | None, optional): The cache location. Defaults to None (DefaultCacheDir()).
+            max_size_bytes (int, optional): Evict entries when the cache is larger than this. Defaults to 1 GiB.
+            link (bool, optional): Hard link cached files into place when possible instead of copying them. Defaults to True.
+            gnuradio_version (str | None, optional): Override the version used in the keys. Defaults to None (GnuRadioVersion()).
+        """
+        self.cache_dir: Path = DefaultCacheDir() if cache_dir is None else Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes: int = max_size_bytes
+        self.link: bool = link
+        self.gnuradio_version: str = GnuRadioVersion() if gnuradio_version is None else gnuradio_version
+
+        self.lock = Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.size_bytes: int | None = None # Measured the first time an entry is stored
+
+    def key(self, grc_file: str | Path) -> str:
+        """Hash the normalized contents of a .grc file with the GNU Radio version.  Formatting and key
+        order in the file do not change the key.
+
+        Args:
+            grc_file (str | Path): The .grc file
+
+        Returns:
+            str: A hex digest
+        """
+        with Path(grc_file).open("r") as file:
+            contents = yaml.load(file, Loader=YAML_LOADER)
+        normalized = json.dumps(contents, sort_keys=True, separators=(",", ":"), default=str)
+        digest = hashlib.sha256()
+        digest.update(self.gnuradio_version.encode())
+        digest.update(b"\0")
+        digest.update(normalized.encode())
+        return digest.hexdigest()
+
+    def entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.py"
+
+    def place(self, source: Path, destination: Path):
+        """Put a cached file at its destination.
+        """
+        if destination.exists():
+            destination.unlink()
+        if self.link:
+            try:
+                os.link(source, destination)
+                return
+            except OSError:
+                # Different file systems, or links are not supported.  Fall back to a copy.
+                pass
+        shutil.copyfile(source, destination)
+
+    def compile(self, grc_file: str | Path, output_dir: str | Path | None = None, compile_function = None) -> str:
+        """A drop-in replacement for gru.CompileFlowgraph() that uses the cache.
+
+        Args:
+            grc_file (str | Path): The .grc file to compile
+            output_dir (str | Path | None, optional): Where to put the python file. Defaults to None (next to the .grc file).
+            compile_function (Callable, optional): Compile with this on a cache miss.  See gru.GetCompileFunction().
+                Defaults to None (gru.CompileFlowgraph).
+
+        Raises:
+            RuntimeError: grcc failed.
+
+        Returns:
+            str: The path of the python file.
+        """
+        grc_file = Path(grc_file).absolute()
+        output_dir = grc_file.parent if output_dir is None else Path(output_dir).absolute()
+        destination = output_dir / grc_file.with_suffix(".py").name
+        key = self.key(grc_file)
+        entry = self.entry_path(key)
+
+        if entry.exists():
+            try:
+                # Mark the entry as recently used
+                os.utime(entry)
+                self.place(entry, destination)
+                with self.lock:
+                    self.hits += 1
+                print(f"Using cached .py for {grc_file}")
+                return str(destination)
+            except FileNotFoundError:
+                # Evicted by another process in the meantime
+                pass
+
+        with self.lock:
+            self.misses += 1
+        compile_function = gru.CompileFlowgraph if compile_function is None else compile_function
+        generated = compile_function(grc_file, output_dir)
+        self.store(entry, Path(generated))
+        return generated
+
+    def store(self, entry: Path, generated: Path):
+        """Add a newly generated file to the cache, then evict old entries if needed.
+        """
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary name and rename, so other processes never see a partial entry
+        handle, temp_path = tempfile.mkstemp(dir=entry.parent, suffix=".tmp")
+        os.close(handle)
+        shutil.copyfile(generated, temp_path)
+        os.replace(temp_path, entry)
+
+        with self.lock:
+            if self.size_bytes is None:
+                self.size_bytes = sum(f.stat().st_size for f in self.cache_dir.glob("*/*.py"))
+            else:
+                self.size_bytes += entry.stat().st_size
+            if self.size_bytes > self.max_size_bytes:
+                self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in max_size_bytes.  Call with the lock held.
+        """
+        entries = []
+        for f in self.cache_dir.glob("*/*.py"):
+            try:
+                stat = f.stat()
+                entries.append((stat.st_mtime, stat.st_size, f))
+            except FileNotFoundError:
+                pass
+        entries.sort()
+        self.size_bytes = sum(size for _, size, _ in entries)
+        for _, size, f in entries:
+            if self.size_bytes <= self.max_size_bytes:
+                break
+            try:
+                f.unlink()
+            except FileNotFoundError:
+                pass
+            self.size_bytes -= size
+
+    def stats(self) -> dict:
+        """The hit and miss counts for this session.
+        """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import sys
+import unittest
+import tempfile
+from pathlib import Path
+
+# Add the local path here to make local includes easier
+try:
+    import artifacts
+except:
+    sys.path.append(str(Path(__file__).parent))
+    print(f"Note: Adding path {Path(__file__).parent} to the python path.")
+    import artifacts
+
+
+class qa_artifacts(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.store = artifacts.BlobStore(self.root / artifacts.BLOB_STORE_NAME)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_001_rewrite_staged_file(self):
+        staged = self.root / "staging" / "flowgraph.py"
+        staged.parent.mkdir()
+        staged.write_text("first")
+        runs = [self.root / "run_1", self.root / "run_2"]
+        for run in runs:
+            run.mkdir()
+            self.store.place(staged, run)
+        blob = self.store.add(runs[0] / staged.name)
+
+        # The staging folder is rewritten for the next test, as Save() and grcc do
+        with staged.open("w") as file:
+            file.write("second")
+
+        self.assertEqual(blob.read_text(), "first")
+        for run in runs:
+            self.assertEqual((run / staged.name).read_text(), "first")
+        self.assertEqual(self.store.stats()["linked_files"], 2)
+
+    def test_002_deduplicate(self):
+        folder = self.root / "run_1"
+        (folder / "a").mkdir(parents=True)
+        (folder / "a" / "stdout.txt").write_text("same")
+        (folder / "stdout.txt").write_text("same")
+        (folder / "other.txt").write_text("other")
+        (folder / "result.json").write_text("same")
+        original = folder / "stdout.txt"
+        kept_open = original.open("r")
+
+        self.assertEqual(self.store.deduplicate(folder), 3)
+        self.assertEqual((folder / "a" / "stdout.txt").stat().st_ino, (folder / "stdout.txt").stat().st_ino)
+        self.assertEqual((folder / "result.json").stat().st_nlink, 1)
+        # The files are replaced by copies in the store, not moved into it
+        self.assertEqual(kept_open.read(), "same")
+        kept_open.close()
+
+    def test_003_prune(self):
+        source = self.root / "source.txt"
+        source.write_text("contents")
+        self.store.add(source)
+        self.assertEqual(self.store.prune(), 1)
+        self.assertEqual(list(self.store.store_dir.glob("*/*")), [])
+
+    def test_004_pack_and_extract(self):
+        run = self.root / "run_1"
+        for name in ["Test_1_Config_1", "Test_1_Config_2"]:
+            (run / name).mkdir(parents=True)
+            (run / name / "stdout.txt").write_text("same output")
+            (run / name / "result.json").write_text(f'{{"name": "{name}"}}')
+
+        archive = artifacts.PackRun(run, remove=True)
+        self.assertFalse(run.exists())
+        files = artifacts.ListArchive(archive)
+        self.assertEqual(len(files), 4)
+        self.assertEqual(files["Test_1_Config_2/stdout.txt"]["member"], "Test_1_Config_1/stdout.txt")
+
+        output = self.root / "extracted"
+        extracted = artifacts.ExtractFromArchive(archive, ["Test_1_Config_2/"], output)
+        self.assertEqual(sorted(path.name for path in extracted), ["result.json", "stdout.txt"])
+        self.assertEqual((output / "Test_1_Config_2" / "stdout.txt").read_text(), "same output")
+        self.assertEqual((output / "Test_1_Config_2" / "result.json").read_text(), '{"name": "Test_1_Config_2"}')
+        with self.assertRaises(KeyError):
+            artifacts.ExtractFromArchive(archive, ["Test_2_Config_1"], output)
+
+
+if __name__ == '__main__':
+    unittest.main()
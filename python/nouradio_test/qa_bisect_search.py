@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import sys
+import unittest
+from pathlib import Path
+
+# Add the local path here to make local includes easier
+try:
+    import bisect_search
+except:
+    sys.path.append(str(Path(__file__).parent))
+    print(f"Note: Adding path {Path(__file__).parent} to the python path.")
+    import bisect_search
+
+
+def Search(search: bisect_search.BisectSearch, threshold: float) -> bisect_search.BisectSearch:
+    """Run a search against a test that passes at or above the threshold.
+    """
+    while (value := search.next_value()) is not None:
+        search.report(value, value >= threshold)
+    return search
+
+
+class qa_bisect_search(unittest.TestCase):
+
+    def test_001_max_runs(self):
+        self.assertEqual(bisect_search.MaxRuns(0, 10, 20), 2)
+        self.assertEqual(bisect_search.MaxRuns(64000, 1000, 1000), 8)
+        self.assertEqual(bisect_search.MaxRuns(0, 1, 0.001), 12)
+
+    def test_002_finds_boundary(self):
+        search = Search(bisect_search.BisectSearch("samp_rate", 64000, 1000, 1000, integer=True), 20000)
+        boundary = search.boundary()
+        self.assertEqual(boundary, {"passing": 20687, "failing": 19702, "width": 985})
+        self.assertLessEqual(len(search.points), search.max_runs())
+        self.assertEqual(search.to_dict()["runs"], len(search.points))
+
+    def test_003_float_boundary(self):
+        search = Search(bisect_search.BisectSearch("snr", -10, 10, 0.1), 3.3)
+        boundary = search.boundary()
+        self.assertLessEqual(boundary["width"], 0.1)
+        self.assertGreaterEqual(boundary["passing"], 3.3)
+        self.assertLess(boundary["failing"], 3.3)
+        self.assertLessEqual(len(search.points), search.max_runs())
+
+    def test_004_same_outcome_at_both_ends(self):
+        passing = Search(bisect_search.BisectSearch("snr", 0, 10, 1), -5)
+        failing = Search(bisect_search.BisectSearch("snr", 0, 10, 1), 50)
+        for search in [passing, failing]:
+            self.assertEqual([point["value"] for point in search.points], [0.0, 10.0])
+            self.assertIsNone(search.boundary())
+
+    def test_005_terminates_on_adjacent_integers(self):
+        # The tolerance is smaller than the step between whole numbers
+        search = Search(bisect_search.BisectSearch("count", 0, 10, 0.25, integer=True), 7)
+        self.assertEqual(search.boundary(), {"passing": 7, "failing": 6, "width": 1})
+        self.assertLessEqual(len(search.points), search.max_runs())
+        self.assertEqual(len({point["value"] for point in search.points}), len(search.points))
+
+    def test_006_terminates_on_flaky_tests(self):
+        # Outcomes that do not follow a threshold still stop within max_runs()
+        search = bisect_search.BisectSearch("snr", 0, 1000, 0.001)
+        outcomes = iter([True, False] + [True, False, False, True] * 100)
+        while (value := search.next_value()) is not None:
+            search.report(value, next(outcomes))
+        self.assertLessEqual(len(search.points), search.max_runs())
+
+    def test_007_tolerance(self):
+        with self.assertRaises(ValueError):
+            bisect_search.BisectSearch("snr", 0, 10, 0)
+
+    def test_008_passed(self):
+        self.assertTrue(bisect_search.Passed({"exit_code": 0}))
+        self.assertFalse(bisect_search.Passed({"exit_code": 0, "stream_watch_failures": 3}))
+        self.assertFalse(bisect_search.Passed({"exit_code": 1}))
+        self.assertFalse(bisect_search.Passed(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
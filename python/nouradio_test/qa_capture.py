@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import io
+import sys
+import unittest
+import tempfile
+from pathlib import Path
+
+# Add the local path here to make local includes easier
+try:
+    import capture
+except:
+    sys.path.append(str(Path(__file__).parent))
+    print(f"Note: Adding path {Path(__file__).parent} to the python path.")
+    import capture
+
+
+class qa_capture(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        # Numbered lines, so any part that is kept or dropped can be recognized
+        self.data = b"".join(f"line {i:04d}\n".encode() for i in range(100))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, options: capture.OutputOptions, chunk_bytes: int, name: str = "stdout.txt") -> tuple[dict, str]:
+        console = io.StringIO()
+        output = capture.BoundedOutput(self.root / name, options, "Test_1", console)
+        for i in range(0, len(self.data), chunk_bytes):
+            output.write(self.data[i:i + chunk_bytes])
+        return output.close(), console.getvalue()
+
+    def test_001_keeps_head_and_tail(self):
+        # 1000 bytes with a limit of 100.  The head is filled exactly by the fifth chunk, and by part of a chunk.
+        for chunk_bytes in [10, 7, 1000]:
+            with self.subTest(chunk_bytes=chunk_bytes):
+                stats, console = self.write(capture.OutputOptions(max_bytes=100, live=True), chunk_bytes)
+                self.assertEqual(stats, {"file": "stdout.txt", "bytes": 1000, "omitted_bytes": 900})
+                contents = (self.root / "stdout.txt").read_bytes()
+                self.assertEqual(contents, self.data[:50] + b"\n... 900 bytes omitted ...\n" + self.data[-50:])
+                self.assertNotIn(b"line 0050", contents)
+
+                # Only the head is printed, followed by a single note that the output is over the limit
+                lines = console.splitlines()
+                self.assertEqual(lines[:5], [f"[Test_1] line {i:04d}" for i in range(5)])
+                self.assertEqual(sum("output is over the limit" in line for line in lines), 1)
+                self.assertIn("over the limit", lines[-1])
+                self.assertNotIn("line 0099", console)
+
+    def test_002_under_the_limit(self):
+        stats, console = self.write(capture.OutputOptions(max_bytes=1000), 64)
+        self.assertEqual(stats, {"file": "stdout.txt", "bytes": 1000, "omitted_bytes": 0})
+        self.assertEqual((self.root / "stdout.txt").read_bytes(), self.data)
+        self.assertEqual(console, "")
+
+    def test_003_compressed(self):
+        stats, _ = self.write(capture.OutputOptions(max_bytes=100, compress=True), 10)
+        self.assertEqual(stats["file"], "stdout.txt.gz")
+        self.assertFalse((self.root / "stdout.txt").exists())
+        with capture.OpenOutput(self.root / "stdout.txt") as file:
+            self.assertEqual(file.read(), (self.data[:50] + b"\n... 900 bytes omitted ...\n" + self.data[-50:]).decode())
+
+
+if __name__ == '__main__':
+    unittest.main()
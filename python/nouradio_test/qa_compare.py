@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import sys
+import json
+import unittest
+import tempfile
+from pathlib import Path
+
+# Add the local path here to make local includes easier
+try:
+    import executor
+    import compare
+except:
+    sys.path.append(str(Path(__file__).parent))
+    print(f"Note: Adding path {Path(__file__).parent} to the python path.")
+    import executor
+    import compare
+
+
+class qa_compare(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def add_test(self, run: str, name: str, test_name: str, values: dict, **result) -> Path:
+        folder = self.root / run / name
+        folder.mkdir(parents=True)
+        with open(folder / compare.CONFIGURATION_FILE_NAME, "w") as of:
+            json.dump({"name": name, "test_name": test_name, "values": values}, of)
+        with open(folder / executor.RESULT_FILE_NAME, "w") as of:
+            json.dump({"name": name} | result, of)
+        return folder
+
+    def test_001_diff_sorted_indices(self):
+        self.assertEqual(compare.DiffSortedIndices(iter([1, 3, 5, 7]), iter([3, 4, 5, 8, 9])), (3, 2, 4))
+        self.assertEqual(compare.DiffSortedIndices(iter([]), iter([2, 6])), (2, 0, 2))
+        self.assertEqual(compare.DiffSortedIndices(iter([2, 6]), iter([])), (0, 2, None))
+        self.assertEqual(compare.DiffSortedIndices(iter([1, 2, 3]), iter([1, 2, 3])), (0, 0, None))
+        self.assertEqual(compare.DiffSortedIndices(iter([]), iter([])), (0, 0, None))
+
+    def test_002_diff_is_streamed(self):
+        # Odd multiples of 3 are added, and even numbers that are not multiples of 3 are removed
+        base = iter(range(0, 1000000, 2))
+        new = iter(range(0, 1000000, 3))
+        added, removed, first_added = compare.DiffSortedIndices(base, new)
+        self.assertEqual((added, removed, first_added), (166667, 333333, 3))
+
+    def test_003_read_violation_indices(self):
+        log = self.root / "violations.csv"
+        log.write_text("3,0.5\n\n7,1.5\nnot a number,2\n12\n")
+        self.assertEqual(list(compare.ReadViolationIndices(log)), [3, 7, 12])
+
+    def test_004_configuration_key(self):
+        first = self.add_test("run_1", "Test_1_Config_1", "Test 1", {"snr": "1", "mode": "fast"})
+        second = self.add_test("run_2", "Test_1_Config_7", "Test 1", {"mode": "fast", "snr": "1.0"})
+        self.assertEqual(compare.ConfigurationKey(first)[0], compare.ConfigurationKey(second)[0])
+        other = self.root / "run_3" / "flowgraph"
+        other.mkdir(parents=True)
+        self.assertEqual(compare.ConfigurationKey(other), ("flowgraph", None, {}))
+
+    def test_005_compare_runs(self):
+        self.add_test("base", "Test_1_Config_1", "Test 1", {"snr": "1"}, exit_code=0, duration_s=1.0)
+        self.add_test("base", "Test_1_Config_2", "Test 1", {"snr": "2"}, exit_code=0, duration_s=1.0)
+        self.add_test("base", "Test_1_Config_3", "Test 1", {"snr": "3"}, exit_code=0, duration_s=1.0)
+        self.add_test("base", "Test_1_Config_4", "Test 1", {"snr": "4"}, exit_code=1, duration_s=1.0)
+        # The configurations are numbered differently in the new run
+        self.add_test("new", "Test_1_Config_1", "Test 1", {"snr": "2"}, exit_code=0, duration_s=5.0)
+        self.add_test("new", "Test_1_Config_2", "Test 1", {"snr": "3"}, exit_code=0, duration_s=1.1)
+        self.add_test("new", "Test_1_Config_3", "Test 1", {"snr": "4"}, exit_code=0, duration_s=1.0)
+        self.add_test("new", "Test_1_Config_4", "Test 1", {"snr": "5"}, exit_code=0, duration_s=1.0)
+
+        report = compare.CompareRuns(self.root / "base", self.root / "new")
+        self.assertEqual(report["compared"], 3)
+        self.assertEqual(report["added"], 1)
+        self.assertEqual(report["regressed"], 2)
+        self.assertEqual(report["improvements"], {"now_passing": 1})
+        self.assertEqual([(entry["name"], entry["regressions"][0]["kind"]) for entry in report["worst"]],
+                         [("Test_1_Config_1", "missing"), ("Test_1_Config_1", "slower")])
+        self.assertEqual(report["worst"][0]["values"], {"snr": "1"})
+
+        report = compare.CompareRuns(self.root / "base", self.root / "new", limit=1)
+        self.assertEqual(report["regressed"], 2)
+        self.assertEqual([entry["regressions"][0]["kind"] for entry in report["worst"]], ["missing"])
+
+    def test_006_now_failing(self):
+        base = self.add_test("base", "Test_1_Config_1", "Test 1", {}, exit_code=0, duration_s=1.0)
+        new = self.add_test("new", "Test_1_Config_1", "Test 1", {}, exit_code=-15, termination={"reason": "timeout"})
+        regressions, improvements = compare.CompareConfiguration(base, new)
+        self.assertEqual(regressions, [{"kind": "now_failing", "magnitude": 1.0, "detail": "stopped: timeout"}])
+        self.assertEqual(improvements, [])
+
+    def test_007_resolve_run(self):
+        (self.root / "run_1").mkdir()
+        self.assertEqual(compare.ResolveRun(self.root / "run_1"), self.root / "run_1")
+        with self.assertRaises(FileNotFoundError):
+            compare.ResolveRun("7", self.root / "missing.sqlite")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import sys
+import json
+import signal
+import unittest
+import tempfile
+from pathlib import Path
+
+# Add the local path here to make local includes easier
+try:
+    import executor
+    import resource_usage
+except:
+    sys.path.append(str(Path(__file__).parent))
+    print(f"Note: Adding path {Path(__file__).parent} to the python path.")
+    import executor
+    import resource_usage
+
+POSIX = hasattr(signal, "SIGXCPU") and hasattr(signal, "SIGKILL")
+
+
+class qa_executor(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def run_flowgraph(self, source: str, **limits) -> dict:
+        folder = self.root / "Test_1_Config_1"
+        folder.mkdir()
+        test_file = folder / "flowgraph.py"
+        test_file.write_text(source)
+        return executor.RunFlowgraph(test_file, **limits)
+
+    def test_001_cpu_time_limits(self):
+        self.assertEqual(executor.CpuTimeLimits(0.2), (1, 1 + int(executor.KILL_GRACE_S)))
+        self.assertEqual(executor.CpuTimeLimits(2.5), (3, 3 + int(executor.KILL_GRACE_S)))
+
+    @unittest.skipUnless(POSIX, "needs SIGXCPU")
+    def test_002_stopped_by_cpu_limit(self):
+        hard = executor.CpuTimeLimits(2)[1]
+        self.assertTrue(executor.StoppedByCpuLimit(-signal.SIGXCPU, 2, {}))
+        self.assertTrue(executor.StoppedByCpuLimit(-signal.SIGKILL, 2, {"cpu_time_s": hard}))
+        # Killed before it used the hard limit, so by something else
+        self.assertFalse(executor.StoppedByCpuLimit(-signal.SIGKILL, 2, {"cpu_time_s": hard - 0.5}))
+        self.assertFalse(executor.StoppedByCpuLimit(-signal.SIGKILL, 2, {}))
+        self.assertFalse(executor.StoppedByCpuLimit(-signal.SIGTERM, 2, {"cpu_time_s": hard}))
+        self.assertFalse(executor.StoppedByCpuLimit(0, 2, {"cpu_time_s": hard}))
+
+    @unittest.skipUnless(POSIX, "needs SIGKILL")
+    def test_003_sigkill_is_not_a_cpu_limit(self):
+        result = self.run_flowgraph("import os, signal\nos.kill(os.getpid(), signal.SIGKILL)\n", cpu_limit_s=30)
+        self.assertEqual(result["exit_code"], -signal.SIGKILL)
+        self.assertNotIn("termination", result)
+
+    @unittest.skipUnless(POSIX and sys.platform.startswith("linux"), "needs RLIMIT_CPU")
+    def test_004_cpu_limit(self):
+        result = self.run_flowgraph("while True:\n    pass\n", cpu_limit_s=1, timeout_s=30)
+        self.assertEqual(result["termination"]["reason"], "cpu_time")
+        self.assertEqual(result["termination"]["signal"], "SIGXCPU")
+
+    def test_005_completion_report(self):
+        results = [
+            {"name": "Test_1_Config_1", "exit_code": 0, "duration_s": 1.0},
+            {"name": "Test_1_Config_2", "exit_code": 1, "duration_s": 2.0},
+            {"name": "Test_2_Config_1", "exit_code": 0, "skipped": "incremental"},
+            {"name": "Test_3_Config_1_snr_0", "exit_code": 1, "duration_s": 1.0, "search": "Test_3_Config_1"},
+            {"name": "Test_3_Config_1_snr_10", "exit_code": 0, "duration_s": 1.0, "search": "Test_3_Config_1"},
+        ]
+        report = executor.CompletionReport(results, 2.0)
+        self.assertEqual(report["total"], 5)
+        self.assertEqual(report["passed"], 2)
+        self.assertEqual(report["failed"], 1)
+        self.assertEqual(report["search_runs"], 2)
+        self.assertEqual(report["skipped"], 1)
+        self.assertEqual(report["failed_tests"], ["Test_1_Config_2"])
+
+    @unittest.skipUnless(POSIX and resource_usage.IsSamplingSupported(), "needs /proc")
+    def test_006_memory_limit(self):
+        # Hold 200 MiB, well past the limit, for longer than the test should take
+        result = self.run_flowgraph("import time\nblock = b'x' * (200 << 20)\ntime.sleep(30)\n", timeout_s=60, memory_limit_mb=50)
+        self.assertEqual(result["exit_code"], -signal.SIGKILL)
+        self.assertLess(result["duration_s"], 30)
+        termination = result["termination"]
+        self.assertEqual(termination["reason"], "memory")
+        self.assertEqual(termination["limit_mb"], 50)
+        self.assertEqual(termination["signal"], "SIGKILL")
+        self.assertGreater(termination["rss_bytes"], 50 << 20)
+
+        folder = self.root / "Test_1_Config_1"
+        self.assertEqual(executor.ReadResult(folder)["termination"], termination)
+        with open(folder / resource_usage.RESOURCES_FILE_NAME) as file:
+            resources = json.load(file)
+        self.assertEqual(resources["memory_limit_mb"], 50)
+        self.assertEqual(resources["termination"], termination)
+        self.assertGreater(resources["tree"]["peak_rss_bytes"], 50 << 20)
+        self.assertIn("memory limit of 50 MiB", (folder / "timeout.txt").read_text())
+
+
+if __name__ == '__main__':
+    unittest.main()
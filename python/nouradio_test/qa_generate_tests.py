@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import sys
+import copy
+import json
+import time
+import unittest
+import tempfile
+from pathlib import Path
+import yaml
+
+# Add the local path here to make local includes easier
+try:
+    import generate_tests as gt
+    import executor
+    import grc_utilities as gru
+    from results_db import ResultsDatabase
+    from tracing import TRACER
+except:
+    sys.path.append(str(Path(__file__).parent))
+    print(f"Note: Adding path {Path(__file__).parent} to the python path.")
+    import generate_tests as gt
+    import executor
+    import grc_utilities as gru
+    from results_db import ResultsDatabase
+    from tracing import TRACER
+
+EXAMPLE_GRC = Path(__file__).parent.parent.parent / "examples" / "all_test_blocks.grc"
+
+
+class qa_generate_tests(unittest.TestCase):
+
+    def setUp(self):
+        with open(EXAMPLE_GRC, "r") as file:
+            self.grc = yaml.safe_load(file)
+        # The example sweeps stop_time_s over 1, 2, 3 and 4
+        self.sweep = next(block for block in self.grc["blocks"] if block["id"] == "nouradio_test_variable_change")
+
+    def add_variable_change(self, name: str, **parameters):
+        block = copy.deepcopy(self.sweep)
+        block["name"] = name
+        block["parameters"].update(parameters)
+        self.grc["blocks"].append(block)
+
+    def configurations(self, **options) -> list:
+        return list(gt.IterateTestConfigurations(self.grc, **options))
+
+    def test_001_check_constraints(self):
+        constraints = [(expression, compile(expression, "qa", "eval")) for expression in ["a < b", "abs(a - b) >= 2"]]
+        self.assertTrue(gt.CheckConstraints(constraints, {"a": "1", "b": "3.0"}))
+        self.assertFalse(gt.CheckConstraints(constraints, {"a": "1", "b": "2"}))
+        self.assertFalse(gt.CheckConstraints(constraints, {"a": "5", "b": "1"}))
+        with self.assertRaises(ValueError):
+            gt.CheckConstraints(constraints, {"a": "1"})
+        with self.assertRaises(ValueError):
+            # No builtins besides the listed ones
+            gt.CheckConstraints([("open('x')", compile("open('x')", "qa", "eval"))], {})
+
+    def test_002_sweep(self):
+        configurations = self.configurations()
+        self.assertEqual([configuration.values for configuration, _ in configurations],
+                         [{"stop_time_s": f"{value}.0"} for value in range(1, 5)])
+        self.assertTrue(all(flowgraph is not None for _, flowgraph in configurations))
+
+    def test_003_product_with_constraint(self):
+        self.add_variable_change("vc_samp_rate", mode="choices", variable="samp_rate", choices="32000,48000",
+                                 constraint="samp_rate / stop_time_s > 15000")
+        configurations = self.configurations()
+        self.assertEqual([(configuration.values["stop_time_s"], configuration.values["samp_rate"]) for configuration, _ in configurations],
+                         [("1.0", "32000"), ("1.0", "48000"), ("2.0", "32000"), ("2.0", "48000"), ("3.0", "48000")])
+        self.assertEqual(len({configuration.name for configuration, _ in configurations}), 5)
+        flowgraph = configurations[-1][1]
+        self.assertEqual(flowgraph.get_block_property("samp_rate", ["parameters", "value"]), "48000")
+        self.assertEqual(flowgraph.get_block_property("stop_time_s", ["parameters", "value"]), "3.0")
+
+    def test_004_unknown_constraint_variable(self):
+        self.add_variable_change("vc_samp_rate", mode="choices", variable="samp_rate", choices="32000", constraint="snr > 3")
+        with self.assertRaises(ValueError):
+            self.configurations()
+
+    def test_005_swept_twice(self):
+        self.add_variable_change("vc_again", mode="choices", choices="5,6")
+        with self.assertRaises(ValueError):
+            self.configurations()
+
+    def test_006_parameterize(self):
+        configurations = self.configurations(parameterize=True)
+        self.assertEqual(len({configuration.flowgraph_name for configuration, _ in configurations}), 1)
+        self.assertEqual([flowgraph is not None for _, flowgraph in configurations], [True, False, False, False])
+        self.assertEqual([configuration.runtime_values for configuration, _ in configurations],
+                         [{"stop_time_s": f"{value}.0"} for value in range(1, 5)])
+
+    def test_007_bisect(self):
+        self.add_variable_change("vc_bisect", mode="bisect", variable="samp_rate", start_value="64000", stop_value="1000", tolerance="1000")
+        configurations = self.configurations()
+        self.assertEqual(len(configurations), 4)
+        configuration = configurations[0][0]
+        self.assertEqual(configuration.search["variable"], "samp_rate")
+        self.assertTrue(configuration.search["integer"])
+        self.assertEqual(configuration.max_runs(), 8)
+        point = configuration.point(20687)
+        self.assertEqual(point.runtime_values["samp_rate"], "20687")
+        self.assertEqual(point.flowgraph_name, configuration.flowgraph_name)
+
+    def test_008_two_searches(self):
+        self.add_variable_change("vc_bisect", mode="bisect", variable="samp_rate", start_value="64000", stop_value="1000", tolerance="1000")
+        self.add_variable_change("vc_bisect_2", mode="bisect", variable="stop_time_s", start_value="1", stop_value="10", tolerance="1")
+        with self.assertRaisesRegex(ValueError, "Only one variable"):
+            self.configurations()
+
+    def test_009_incremental_points_to_the_run(self):
+        enabled = TRACER.enabled
+        TRACER.enabled = False
+        try:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                root = Path(temp_dir)
+                test_file = root / "flowgraph.py"
+                test_file.write_text("print('passed')\n")
+                for run in range(3):
+                    if run:
+                        # Run folders are named by the second they start
+                        time.sleep(1.05)
+                    gt.RunTests(root / "artifacts", test_files=[test_file], incremental=True, results_db=None)
+
+                folders = sorted((root / "artifacts").glob("*/flowgraph"))
+                self.assertEqual(len(folders), 3)
+                results = [executor.ReadResult(folder) for folder in folders]
+                self.assertNotIn("skipped", results[0])
+                self.assertTrue((folders[0] / "stdout.txt").is_file())
+                # Every later run points to the one that ran, not to the run that skipped it before
+                for result in results[1:]:
+                    self.assertEqual(result["skipped"], "incremental")
+                    self.assertEqual(Path(result["previous"]), folders[0])
+                self.assertEqual(executor.IndexPassingTests(root / "artifacts"), {results[0]["content_key"]: folders[0]})
+        finally:
+            TRACER.enabled = enabled
+
+    def test_010_run_is_finished_when_generation_fails(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            test_file = root / "flowgraph.py"
+            test_file.write_text("print('passed')\n")
+            def Tests():
+                yield test_file
+                raise RuntimeError("could not generate the next test")
+
+            with self.assertRaises(RuntimeError):
+                gt.RunTests(root / "artifacts", test_files=Tests())
+            database = ResultsDatabase(root / "artifacts" / gt.RESULTS_DB_NAME)
+            try:
+                runs = database.runs()
+            finally:
+                database.close()
+            self.assertEqual(len(runs), 1)
+            self.assertIsNotNone(runs[0]["finished"])
+            summary = json.loads(runs[0]["summary"])
+            self.assertTrue(summary["interrupted"])
+            self.assertEqual(summary["tests"]["passed"], 1)
+
+    def test_011_variants_do_not_change_the_base(self):
+        document = gru.GrcDocument(self.grc)
+        original = copy.deepcopy(self.grc)
+        indexes = copy.deepcopy((document.by_name, document.by_id, document.by_state))
+
+        first = gru.GrcVariant(document).derive()
+        second = first.derive()
+        first.set_block_property("samp_rate", ["parameters", "value"], "48000")
+        second.set_block_property("samp_rate", ["parameters", "value"], "96000")
+        second.set_block_property("analog_sig_source_x_0", ["states", "state"], "disabled")
+
+        self.assertEqual(first.get_block_property("samp_rate", ["parameters", "value"]), "48000")
+        self.assertEqual(second.get_block_property("samp_rate", ["parameters", "value"]), "96000")
+        self.assertTrue(first.block_is_enabled("analog_sig_source_x_0"))
+        self.assertFalse(second.block_is_enabled("analog_sig_source_x_0"))
+
+        first_grc = first.materialize()
+        second_grc = second.materialize()
+        i = document.by_name["samp_rate"]
+        self.assertEqual(first_grc["blocks"][i]["parameters"]["value"], "48000")
+        self.assertEqual(second_grc["blocks"][i]["parameters"]["value"], "96000")
+        self.assertEqual(second_grc["blocks"][document.by_name["analog_sig_source_x_0"]]["states"]["state"], "disabled")
+
+        self.assertEqual(self.grc, original)
+        self.assertEqual((document.by_name, document.by_id, document.by_state), indexes)
+        self.assertEqual(document.get_block_property("name", "samp_rate", ["parameters", "value"], exact=True),
+                         {"samp_rate": original["blocks"][i]["parameters"]["value"]})
+        self.assertTrue(document.block_is_enabled("analog_sig_source_x_0"))
+
+
+if __name__ == '__main__':
+    unittest.main()
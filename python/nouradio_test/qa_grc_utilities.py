@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import sys
+import unittest
+import tempfile
+from pathlib import Path
+
+# Add the local path here to make local includes easier
+try:
+    import grc_utilities as gru
+    from tracing import TRACER
+except:
+    sys.path.append(str(Path(__file__).parent))
+    print(f"Note: Adding path {Path(__file__).parent} to the python path.")
+    import grc_utilities as gru
+    from tracing import TRACER
+
+EXAMPLE_GRC = Path(__file__).parent.parent.parent / "examples" / "all_test_blocks.grc"
+
+
+class qa_grc_utilities(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        TRACER.drain()
+
+    def tearDown(self):
+        TRACER.drain()
+        self.temp_dir.cleanup()
+
+    def test_001_worker_events_are_not_duplicated(self):
+        document = gru.LoadDocument(EXAMPLE_GRC)
+        with TRACER.span("plan"):
+            pass
+        items = [(self.root / f"flowgraph_{i}.grc", document.grc) for i in range(3)]
+        results = list(gru.SaveFlowgraphResults(items, workers=2))
+        self.assertEqual([error for _, error in results], [None] * 3)
+
+        events = TRACER.drain()
+        names = [event["name"] for event in events]
+        self.assertEqual(names.count("load"), 1)
+        self.assertEqual(names.count("plan"), 1)
+        self.assertEqual(names.count("save"), 3)
+        keys = [(event["name"], event["pid"], event["tid"], event["ts"]) for event in events]
+        self.assertEqual(len(keys), len(set(keys)))
+
+    def test_002_set_block_property_reindexes(self):
+        document = gru.LoadDocument(EXAMPLE_GRC)
+        i = document.by_name["samp_rate"]
+        j = document.by_name["analog_sig_source_x_0"]
+        variables = sorted(document.blocks_of_type("variable"))
+
+        # Renaming a block moves it in the name index
+        self.assertEqual(document.set_block_property("name", "samp_rate", ["name"], "sample_rate", exact=True), 1)
+        self.assertIsNone(document.get_block("samp_rate"))
+        self.assertIs(document.get_block("sample_rate"), document.blocks[i])
+        self.assertEqual(document.filter_blocks("name", "samp_rate", exact=True), {})
+        self.assertEqual(list(document.filter_blocks("name", "^sample_").keys()), [i])
+        self.assertEqual(document.get_block_property("name", "sample_rate", ["parameters", "value"], exact=True),
+                         {"sample_rate": document.blocks[i]["parameters"]["value"]})
+        self.assertEqual(sorted(document.blocks_of_type("variable")), variables)
+
+        # Disabling a block moves it in the state index
+        self.assertTrue(document.block_is_enabled("analog_sig_source_x_0"))
+        self.assertEqual(document.set_block_property("name", "analog_sig_source_x_0", ["states", "state"], "disabled", exact=True), 1)
+        self.assertFalse(document.block_is_enabled("analog_sig_source_x_0"))
+        self.assertIn(j, document.blocks_in_state("disabled"))
+        self.assertNotIn(j, document.blocks_in_state(True))
+        self.assertEqual(document.get_block_property("name", "analog_sig_source_x_0", ["states", "state"], exact=True),
+                         {"analog_sig_source_x_0": "disabled"})
+
+        # The incremental indexes match a full rebuild
+        indexes = (document.by_name, document.by_id, {state: found for state, found in document.by_state.items() if found})
+        document.reindex()
+        self.assertEqual((document.by_name, document.by_id, document.by_state), indexes)
+
+
+if __name__ == '__main__':
+    unittest.main()
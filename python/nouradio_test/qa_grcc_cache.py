@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import os
+import sys
+import unittest
+import tempfile
+from pathlib import Path
+
+# Add the local path here to make local includes easier
+try:
+    from grcc_cache import GrccCache
+except:
+    sys.path.append(str(Path(__file__).parent))
+    print(f"Note: Adding path {Path(__file__).parent} to the python path.")
+    from grcc_cache import GrccCache
+
+# Every fake compile writes this many bytes
+ENTRY_SIZE = 100
+
+
+class qa_grcc_cache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.compiled = []
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_grc(self, name: str, contents: str) -> Path:
+        path = self.root / "flowgraphs" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(contents)
+        return path
+
+    def compile_function(self, grc_file: Path, output_dir: Path) -> str:
+        """Stand in for grcc, and record each call.
+        """
+        self.compiled.append(grc_file.name)
+        generated = Path(output_dir) / grc_file.with_suffix(".py").name
+        generated.write_text("#" * (ENTRY_SIZE - 1) + "\n")
+        return str(generated)
+
+    def compile(self, cache: GrccCache, grc_file: Path) -> Path:
+        output_dir = self.root / "output"
+        output_dir.mkdir(exist_ok=True)
+        return Path(cache.compile(grc_file, output_dir, self.compile_function))
+
+    def test_001_key_normalization(self):
+        cache = GrccCache(self.root / "cache", gnuradio_version="3.10.0")
+        first = self.write_grc("first.grc", "options:\n  parameters:\n    id: test\nblocks:\n- name: samp_rate\n  id: variable\n")
+        # The same contents with the keys in a different order and different formatting
+        second = self.write_grc("second.grc", "blocks: [{id: variable, name: samp_rate}]\noptions: {parameters: {id: test}}\n")
+        changed = self.write_grc("changed.grc", "blocks: [{id: variable, name: stop_time_s}]\noptions: {parameters: {id: test}}\n")
+        self.assertEqual(cache.key(first), cache.key(second))
+        self.assertNotEqual(cache.key(first), cache.key(changed))
+        self.assertNotEqual(cache.key(first), GrccCache(self.root / "cache", gnuradio_version="3.10.1").key(first))
+
+        self.compile(cache, first)
+        generated = self.compile(cache, second)
+        self.assertEqual(self.compiled, ["first.grc"])
+        self.assertEqual(generated.name, "second.py")
+        self.assertEqual(generated.stat().st_size, ENTRY_SIZE)
+
+    def test_002_stats(self):
+        cache = GrccCache(self.root / "cache", gnuradio_version="3.10.0")
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 0})
+        first = self.write_grc("first.grc", "blocks: [{name: a}]\n")
+        second = self.write_grc("second.grc", "blocks: [{name: b}]\n")
+        for grc_file in [first, second, first, first, second]:
+            self.compile(cache, grc_file)
+        self.assertEqual(cache.stats(), {"hits": 3, "misses": 2})
+        self.assertEqual(self.compiled, ["first.grc", "second.grc"])
+
+        # A new session over the same directory starts with its own counts, and hits on the stored entries
+        reopened = GrccCache(self.root / "cache", gnuradio_version="3.10.0")
+        self.compile(reopened, second)
+        self.assertEqual(reopened.stats(), {"hits": 1, "misses": 0})
+
+    def test_003_evicts_least_recently_used(self):
+        cache = GrccCache(self.root / "cache", max_size_bytes=2 * ENTRY_SIZE + ENTRY_SIZE // 2, link=False, gnuradio_version="3.10.0")
+        grc_files = {name: self.write_grc(f"{name}.grc", f"blocks: [{{name: {name}}}]\n") for name in ["a", "b", "c"]}
+        entries = {name: cache.entry_path(cache.key(grc_file)) for name, grc_file in grc_files.items()}
+
+        self.compile(cache, grc_files["a"])
+        self.compile(cache, grc_files["b"])
+        self.assertTrue(entries["a"].exists() and entries["b"].exists())
+        # Make "a" the oldest entry, then use it so that "b" is the least recently used
+        os.utime(entries["a"], (1000, 1000))
+        os.utime(entries["b"], (2000, 2000))
+        self.compile(cache, grc_files["a"])
+        self.assertGreater(entries["a"].stat().st_mtime, 2000)
+
+        # Storing a third entry goes over the limit
+        self.compile(cache, grc_files["c"])
+        self.assertTrue(entries["a"].exists())
+        self.assertFalse(entries["b"].exists())
+        self.assertTrue(entries["c"].exists())
+        self.assertEqual(cache.size_bytes, 2 * ENTRY_SIZE)
+
+        # The evicted entry is compiled again
+        self.compile(cache, grc_files["b"])
+        self.assertEqual(self.compiled, ["a.grc", "b.grc", "c.grc", "b.grc"])
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 4})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import sys
+import sqlite3
+import unittest
+import tempfile
+from pathlib import Path
+
+# Add the local path here to make local includes easier
+try:
+    import results_db
+except:
+    sys.path.append(str(Path(__file__).parent))
+    print(f"Note: Adding path {Path(__file__).parent} to the python path.")
+    import results_db
+
+
+class qa_results_db(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / results_db.RESULTS_DB_NAME
+        self.database = results_db.ResultsDatabase(self.path)
+
+    def tearDown(self):
+        self.database.close()
+        self.temp_dir.cleanup()
+
+    def test_001_record_and_query(self):
+        run_id = self.database.start_run("run_1", "2024-01-01T00:00:00")
+        self.assertEqual(self.database.start_run("run_1", "2024-01-01T00:00:00"), run_id)
+        self.database.record(run_id, {"name": "Test_1_Config_1", "exit_code": 1, "duration_s": 1.0}, "Test 1", {"snr": "1.0"})
+        # Resuming replaces the earlier row
+        self.database.record(run_id, {"name": "Test_1_Config_1", "exit_code": 0, "duration_s": 2.0}, "Test 1", {"snr": "1.0"})
+        self.database.record(run_id, {"name": "Test_1_Config_2", "exit_code": 0, "duration_s": 4.0}, "Test 1", {"snr": "2"})
+
+        rows = self.database.configurations(run_id=run_id)
+        self.assertEqual([(row["name"], row["exit_code"]) for row in rows], [("Test_1_Config_1", 0), ("Test_1_Config_2", 0)])
+        self.assertEqual([row["name"] for row in self.database.configurations(variable="snr", value=1)], ["Test_1_Config_1"])
+        self.assertEqual(self.database.durations(), {"Test_1_Config_1": 2.0, "Test_1_Config_2": 4.0})
+        self.assertEqual(self.database.test_durations(), {"Test 1": 3.0})
+        self.assertEqual(self.database.latest_run_id(), run_id)
+
+    def test_002_latest_results_leave_out_searches(self):
+        first = self.database.start_run("run_1", "2024-01-01T00:00:00")
+        second = self.database.start_run("run_2", "2024-01-02T00:00:00")
+        self.database.record(first, {"name": "Test_1_Config_1", "exit_code": 0, "content_key": "a"})
+        self.database.record(second, {"name": "Test_1_Config_1", "exit_code": 1, "content_key": "a", "search": "Test_1_Config_1"})
+        self.database.record(second, {"name": "Test_1_Config_1_snr_5", "exit_code": 1, "search": "Test_1_Config_1"})
+
+        latest = self.database.latest_results()
+        self.assertEqual(list(latest), ["Test_1_Config_1"])
+        self.assertEqual(latest["Test_1_Config_1"]["exit_code"], 0)
+        rows = self.database.configurations(run_id=second)
+        self.assertEqual({row["search"] for row in rows}, {"Test_1_Config_1"})
+
+    def test_003_migrate(self):
+        # A database from before the search column was added
+        old_path = Path(self.temp_dir.name) / "old.sqlite"
+        connection = sqlite3.connect(old_path)
+        connection.executescript(results_db.SCHEMA.replace("    search TEXT,\n", ""))
+        connection.execute("INSERT INTO runs (folder) VALUES ('run_1')")
+        connection.execute("INSERT INTO configurations (run_id, name, exit_code) VALUES (1, 'Test_1_Config_1', 0)")
+        connection.commit()
+        connection.close()
+
+        database = results_db.ResultsDatabase(old_path)
+        try:
+            self.assertEqual(database.latest_results()["Test_1_Config_1"]["exit_code"], 0)
+            database.record(1, {"name": "Test_1_Config_2", "exit_code": 1, "search": "Test_1_Config_2"})
+            self.assertEqual(list(database.latest_results()), ["Test_1_Config_1"])
+        finally:
+            database.close()
+        # Opening it again does not add the column twice
+        results_db.ResultsDatabase(old_path).close()
+
+    def test_004_numeric_value(self):
+        self.assertEqual(results_db.NumericValue("1e3"), 1000.0)
+        self.assertIsNone(results_db.NumericValue("fast"))
+        self.assertIsNone(results_db.NumericValue(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import sys
+import json
+import unittest
+import tempfile
+from pathlib import Path
+
+# Add the local path here to make local includes easier
+try:
+    import executor
+    import sharding
+    from bisect_search import SEARCH_FILE_SUFFIX
+except:
+    sys.path.append(str(Path(__file__).parent))
+    print(f"Note: Adding path {Path(__file__).parent} to the python path.")
+    import executor
+    import sharding
+    from bisect_search import SEARCH_FILE_SUFFIX
+
+NAMES = [f"Test_{test}_Config_{config}" for test in range(1, 6) for config in range(1, 9)]
+
+
+class qa_sharding(unittest.TestCase):
+
+    def test_001_hash_shard_is_stable(self):
+        shards = {name: sharding.HashShard(name, 4) for name in NAMES}
+        self.assertTrue(all(0 <= shard < 4 for shard in shards.values()))
+        # The same on every call, and independent of the other names
+        self.assertEqual(shards, {name: sharding.HashShard(name, 4) for name in reversed(NAMES)})
+        self.assertEqual(sharding.HashShard("Test_1_Config_1", 4), shards["Test_1_Config_1"])
+        self.assertEqual(len(set(shards.values())), 4)
+
+    def test_002_balance_shards(self):
+        durations = {name: float(i % 7 + 1) for i, name in enumerate(NAMES)}
+        assignment = sharding.BalanceShards(NAMES, 3, durations)
+        self.assertEqual(sorted(assignment), sorted(NAMES))
+        # The input order does not change the split
+        self.assertEqual(assignment, sharding.BalanceShards(reversed(NAMES), 3, durations))
+
+        loads = [0.0] * 3
+        for name, shard in assignment.items():
+            loads[shard] += durations[name]
+        self.assertLessEqual(max(loads) - min(loads), max(durations.values()))
+
+    def test_003_balance_shards_without_history(self):
+        durations = {"Test_1_Config_1": 10.0, "Test_1_Config_2": 2.0, "Test_1_Config_3": 4.0}
+        names = list(durations) + ["Test_2_Config_1"]
+        assignment = sharding.BalanceShards(names, 2, durations)
+        # The longest runs alone, and the rest (the new one assumed to take the median) share the other shard
+        self.assertEqual(sum(shard == assignment["Test_1_Config_1"] for shard in assignment.values()), 1)
+
+    def test_004_select_shard(self):
+        class Configuration:
+            def __init__(self, name):
+                self.name = name
+                self.flowgraph_name = "shared"
+        configurations = [(Configuration(name), {"id": "shared"} if i == 0 else None) for i, name in enumerate(NAMES)]
+        shards = [list(sharding.SelectShard(configurations, index, 3)) for index in range(3)]
+        self.assertEqual(sorted(configuration.name for shard in shards for configuration, _ in shard), sorted(NAMES))
+        # Each shard saves the shared flowgraph with its first configuration
+        for shard in shards:
+            self.assertIsNotNone(shard[0][1])
+            self.assertTrue(all(flowgraph is None for _, flowgraph in shard[1:]))
+        with self.assertRaises(ValueError):
+            list(sharding.SelectShard(configurations, 3, 3))
+
+    def test_005_estimate_wall_time(self):
+        self.assertEqual(sharding.EstimateWallTime([3.0, 2.0, 2.0, 1.0], 2), 4.0)
+        self.assertEqual(sharding.EstimateWallTime([3.0, 2.0], 0), 5.0)
+
+    def test_006_history_order(self):
+        names = ["unchanged", "failed", "changed", "new", "long"]
+        latest = {
+            "unchanged": {"exit_code": 0, "content_key": "a"},
+            "failed": {"exit_code": 1, "content_key": "b"},
+            "changed": {"exit_code": 0, "content_key": "old"},
+            "long": {"exit_code": 0, "content_key": "e"},
+        }
+        content_keys = {"unchanged": "a", "failed": "b", "changed": "c", "new": "d", "long": "e"}
+        costs = {"unchanged": 1.0, "failed": 1.0, "changed": 1.0, "new": 2.0, "long": 5.0}
+        order = sharding.HistoryOrder(names, latest, content_keys, costs)
+        self.assertEqual([names[i] for i in order], ["failed", "new", "changed", "long", "unchanged"])
+
+    def test_007_merge_shards(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            shards = [root / "shard_0", root / "shard_1"]
+            for i, shard in enumerate(shards):
+                test_folder = shard / f"Test_{i}_Config_1"
+                test_folder.mkdir(parents=True)
+                with open(test_folder / executor.RESULT_FILE_NAME, "w") as of:
+                    json.dump({"name": test_folder.name, "exit_code": 0, "duration_s": 1.0}, of)
+                summary = {"tests": {"wall_time_s": 1.0 + i}}
+                if i == 1:
+                    (shard / f"Test_1_Config_2{SEARCH_FILE_SUFFIX}").write_text('{"variable": "snr"}')
+                    summary["searches"] = {"Test_1_Config_2": {"variable": "snr", "boundary": None, "runs": 2}}
+                with open(shard / "summary.json", "w") as of:
+                    json.dump(summary, of)
+
+            merged = sharding.MergeShards(shards, root / "merged")
+            self.assertEqual(sorted(path.name for path in merged.iterdir()),
+                             ["Test_0_Config_1", "Test_1_Config_1", f"Test_1_Config_2{SEARCH_FILE_SUFFIX}", "summary.json"])
+            with open(merged / "summary.json", "r") as file:
+                summary = json.load(file)
+            self.assertEqual(summary["tests"]["total"], 2)
+            self.assertEqual(summary["tests"]["wall_time_s"], 2.0)
+            self.assertEqual(list(summary["searches"]), ["Test_1_Config_2"])
+            self.assertEqual(sharding.ReadDurations([merged]), {"Test_0_Config_1": 1.0, "Test_1_Config_1": 1.0})
+
+            with self.assertRaises(ValueError):
+                sharding.MergeShards([shards[0], shards[0]], root / "merged_twice")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import os
+import sys
+import json
+import threading
+from pathlib import Path
+from typing import Callable
+
+# Written next to stdout.txt for each flowgraph that runs
+RESOURCES_FILE_NAME = "resources.json"
+
+# How often the process tree of a running flowgraph is measured
+SAMPLE_INTERVAL_S = 0.2
+
+def UsageFromRusage(usage) -> dict:
+    """Read the resources a process used from os.wait4().  They include its children that it waited for.
+
+    Returns:
+        dict: The peak memory (resident set size) of the largest process in bytes, the user and system CPU time in seconds,
+            and the number of voluntary and involuntary context switches
+    """
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_memory_bytes = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    return {
+        "peak_memory_bytes": peak_memory_bytes,
+        "cpu_time_s": usage.ru_utime + usage.ru_stime,
+        "user_cpu_s": usage.ru_utime,
+        "system_cpu_s": usage.ru_stime,
+        "voluntary_context_switches": usage.ru_nvcsw,
+        "involuntary_context_switches": usage.ru_nivcsw,
+    }
+
+def IsSamplingSupported() -> bool:
+    return sys.platform.startswith("linux") and os.path.isdir("/proc/self")
+
+def SampleSession(session_id: int) -> tuple[int, int, float]:
+    """Measure every process in a session from /proc.  A flowgraph leads its own session, so this includes
+    every process it started, even those that outlived their parent.
+
+    Returns:
+        tuple[int, int, float]: The total resident memory in bytes, the number of processes, and their total CPU time in seconds
+    """
+    page_bytes = os.sysconf("SC_PAGE_SIZE")
+    ticks_per_s = os.sysconf("SC_CLK_TCK")
+    rss_bytes = processes = 0
+    cpu_time_s = 0.0
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/stat", "rb") as file:
+                stat = file.read()
+        except OSError:
+            # It exited while we were looking
+            continue
+        # The command name is in parentheses and may contain spaces, so split after it
+        fields = stat[stat.rfind(b")") + 2:].split()
+        if int(fields[3]) != session_id:
+            continue
+        processes += 1
+        rss_bytes += int(fields[21]) * page_bytes
+        cpu_time_s += (int(fields[11]) + int(fields[12])) / ticks_per_s
+    return rss_bytes, processes, cpu_time_s
+
+
+class ResourceMonitor:
+    """Sample the memory of a flowgraph's process tree while it runs, and report when it exceeds a limit.
+
+    os.wait4() only reports the largest single process and the children that were waited for.  Sampling
+    /proc also counts processes that run at the same time, or that were never waited for.
+    """
+    def __init__(self, session_id: int, memory_limit_bytes: int | None = None, on_limit: Callable[[int], None] | None = None,
+                 interval_s: float = SAMPLE_INTERVAL_S):
+        """Start sampling.
+
+        Args:
+            session_id (int): The session of the flowgraph.  It is the flowgraph's pid, since it leads its own session.
+            memory_limit_bytes (int | None, optional): Call on_limit once when the tree uses more than this. Defaults to None (no limit).
+            on_limit (Callable[[int], None] | None, optional): Called from the sampling thread with the memory used. Defaults to None.
+            interval_s (float, optional): The time between samples. Defaults to SAMPLE_INTERVAL_S.
+        """
+        self.session_id: int = session_id
+        self.memory_limit_bytes: int | None = memory_limit_bytes
+        self.on_limit = on_limit
+        self.interval_s: float = interval_s
+        self.peak_rss_bytes: int = 0
+        self.peak_processes: int = 0
+        self.cpu_time_s: float = 0.0
+        self.samples: int = 0
+        self.exceeded: bool = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            self.sample()
+            if self.stopped.wait(self.interval_s):
+                return
+
+    def sample(self):
+        rss_bytes, processes, cpu_time_s = SampleSession(self.session_id)
+        if not processes:
+            return
+        self.samples += 1
+        self.peak_rss_bytes = max(self.peak_rss_bytes, rss_bytes)
+        self.peak_processes = max(self.peak_processes, processes)
+        self.cpu_time_s = max(self.cpu_time_s, cpu_time_s)
+        if self.memory_limit_bytes and rss_bytes > self.memory_limit_bytes and not self.exceeded:
+            self.exceeded = True
+            if self.on_limit is not None:
+                self.on_limit(rss_bytes)
+
+    def stop(self) -> dict:
+        """Stop sampling.
+
+        Returns:
+            dict: The peak memory and process count of the tree, and its CPU time at the last sample
+        """
+        self.stopped.set()
+        self.thread.join()
+        return {
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "peak_processes": self.peak_processes,
+            "sampled_cpu_time_s": self.cpu_time_s,
+            "samples": self.samples,
+            "interval_s": self.interval_s,
+        }
+
+def WriteResources(folder: str | Path, resources: dict):
+    with open(Path(folder) / RESOURCES_FILE_NAME, "w") as of:
+        json.dump(resources, of, indent=2)
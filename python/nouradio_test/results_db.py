@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import re
+import sys
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+# Add the local path here to make local includes easier
+try:
+    import grc_utilities as gru
+    import capture
+except:
+    sys.path.append(str(Path(__file__).parent))
+    print(f"Note: Adding path {Path(__file__).parent} to the python path.")
+    import grc_utilities as gru
+    import capture
+
+# The default database location, relative to the artifacts directory
+RESULTS_DB_NAME = "results.sqlite"
+
+# How long a writer waits for another process to finish its transaction
+BUSY_TIMEOUT_MS = 30000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    folder TEXT NOT NULL UNIQUE,
+    started TEXT,
+    finished TEXT,
+    environment TEXT,
+    summary TEXT
+);
+CREATE TABLE IF NOT EXISTS configurations (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    test_name TEXT,
+    flowgraph_hash TEXT,
+    content_key TEXT,
+    exit_code INTEGER,
+    started TEXT,
+    ended TEXT,
+    duration_s REAL,
+    peak_memory_bytes INTEGER,
+    cpu_time_s REAL,
+    stream_watch_failures INTEGER,
+    termination TEXT,
+    skipped TEXT,
+    error TEXT,
+    search TEXT,
+    UNIQUE (run_id, name)
+);
+CREATE INDEX IF NOT EXISTS configurations_by_test ON configurations (test_name, run_id);
+CREATE INDEX IF NOT EXISTS configurations_by_name ON configurations (name, run_id);
+CREATE INDEX IF NOT EXISTS configurations_by_key ON configurations (content_key);
+CREATE TABLE IF NOT EXISTS sweep_values (
+    configuration_id INTEGER NOT NULL REFERENCES configurations(id) ON DELETE CASCADE,
+    variable TEXT NOT NULL,
+    value TEXT,
+    numeric_value REAL,
+    PRIMARY KEY (configuration_id, variable)
+);
+CREATE INDEX IF NOT EXISTS sweep_values_by_value ON sweep_values (variable, numeric_value, value);
+"""
+
+# Columns added since the first version of SCHEMA, which CREATE TABLE IF NOT EXISTS does not add to an existing database
+MIGRATIONS = {
+    "configurations": {"search": "TEXT"},
+}
+
+# stream_watch prints this when it has no file to write to
+STREAM_WATCH_CONSOLE_PATTERN = re.compile(r"^Signal failed (\d+) times between", re.MULTILINE)
+
+def StreamWatchLogs(folder: str | Path, grc_file: str | Path | None = None) -> tuple[list[Path], bool] | None:
+    """Find the failure logs of the Test: Stream Watch blocks in one test run.  Each line of a log is the
+    index and value of one failed sample.
+
+    Args:
+        folder (str | Path): The test's artifact folder
+        grc_file (str | Path | None, optional): The flowgraph that ran.  Defaults to None (the .grc file in the folder).
+
+    Returns:
+        tuple[list[Path], bool] | None: The logs that were written, and whether any block printed its failures to stdout
+            instead.  None if the flowgraph has no enabled stream_watch blocks.
+    """
+    folder = Path(folder)
+    if grc_file is None:
+        grc_files = sorted(folder.glob("*.grc"))
+        if not grc_files:
+            return None
+        grc_file = grc_files[0]
+    grc = gru.LoadDocument(grc_file)
+    blocks = [block for block in grc.blocks_of_type("nouradio_test_stream_watch").values() if grc.block_is_enabled(block["name"])]
+    if not blocks:
+        return None
+
+    logs = []
+    console = False
+    for block in blocks:
+        save_to = gru.FixStrings([str(block["parameters"].get("save_to", ""))])[0]
+        if not save_to:
+            console = True
+            continue
+        # WriteLater adds a number to the name if the file already exists
+        path = folder / save_to
+        for log in sorted(path.parent.glob(f"{path.stem}*{path.suffix}")):
+            if log == path or re.fullmatch(rf"{re.escape(path.stem)}_\d+", log.stem):
+                logs.append(log)
+    return logs, console
+
+def CountStreamWatchFailures(folder: str | Path, grc_file: str | Path | None = None) -> int | None:
+    """Count the samples that failed the Test: Stream Watch blocks in one test run.  Blocks that save to a
+    file write one line per failure.  Blocks without a file print a count to stdout.txt.
+
+    Args:
+        folder (str | Path): The test's artifact folder
+        grc_file (str | Path | None, optional): The flowgraph that ran.  Defaults to None (the .grc file in the folder).
+
+    Returns:
+        int | None: The total number of failures, or None if the flowgraph has no enabled stream_watch blocks
+    """
+    folder = Path(folder)
+    found = StreamWatchLogs(folder, grc_file)
+    if found is None:
+        return None
+    logs, console = found
+
+    failures = 0
+    for log in logs:
+        with open(log, "r") as file:
+            failures += sum(1 for line in file if line.strip())
+    if console:
+        try:
+            with capture.OpenOutput(folder / "stdout.txt") as file:
+                failures += sum(int(count) for count in STREAM_WATCH_CONSOLE_PATTERN.findall(file.read()))
+        except OSError:
+            pass
+    return failures
+
+def NumericValue(value) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ResultsDatabase:
+    """A SQLite store with one row per test configuration run, so results can be queried across runs.
+
+    The database is in WAL mode, so readers do not block the writer, and each writer waits up to
+    BUSY_TIMEOUT_MS for others.  Several processes (for example shards on one host) can record into the
+    same file.  Each thread gets its own connection.
+    """
+    def __init__(self, path: str | Path):
+        """Open (or create) a results database.
+
+        Args:
+            path (str | Path): The database file
+        """
+        self.path: Path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.local = threading.local()
+        self.connection().executescript(SCHEMA)
+        self.migrate()
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute("PRAGMA foreign_keys = ON")
+            self.local.connection = connection
+        return connection
+
+    def migrate(self):
+        """Add the columns in MIGRATIONS to a database created by an earlier version.
+        """
+        def Missing(connection: sqlite3.Connection) -> list[tuple[str, str, str]]:
+            missing = []
+            for table, columns in MIGRATIONS.items():
+                existing = {row["name"] for row in connection.execute(f"PRAGMA table_info({table})")}
+                missing += [(table, column, column_type) for column, column_type in columns.items() if column not in existing]
+            return missing
+
+        if not Missing(self.connection()):
+            return
+        with self.transaction() as connection:
+            # Another process may have migrated it while this one waited for the lock
+            for table, column, column_type in Missing(connection):
+                connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+    @contextmanager
+    def transaction(self):
+        """A write transaction.  The write lock is taken at the start, so it cannot fail halfway through
+        because another process is writing.
+        """
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+    def start_run(self, folder: str | Path, started: str, environment: dict | None = None) -> int:
+        """Add a run, or find it again when a run is resumed.
+
+        Args:
+            folder (str | Path): The run folder
+            started (str): The start time in ISO format
+            environment (dict | None, optional): The environment fingerprint. Defaults to None.
+
+        Returns:
+            int: The run id
+        """
+        folder = str(Path(folder).absolute())
+        with self.transaction() as connection:
+            connection.execute("INSERT OR IGNORE INTO runs (folder, started, environment) VALUES (?, ?, ?)",
+                               (folder, started, json.dumps(environment)))
+            return connection.execute("SELECT id FROM runs WHERE folder = ?", (folder,)).fetchone()["id"]
+
+    def finish_run(self, run_id: int, finished: str, summary: dict):
+        with self.transaction() as connection:
+            connection.execute("UPDATE runs SET finished = ?, summary = ? WHERE id = ?", (finished, json.dumps(summary), run_id))
+
+    def record(self, run_id: int, result: dict, test_name: str | None = None, values: dict | None = None) -> int:
+        """Add the result of one configuration.  A configuration that is run again in the same run (when
+        resuming) replaces the earlier row.
+
+        Args:
+            run_id (int): The id from start_run()
+            result (dict): The test result.  See executor.RunFlowgraph().
+            test_name (str | None, optional): The name from the define_test block. Defaults to None.
+            values (dict | None, optional): The swept variable values. Defaults to None.
+
+        Returns:
+            int: The configuration id
+        """
+        termination = result.get("termination")
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM configurations WHERE run_id = ? AND name = ?", (run_id, result["name"]))
+            cursor = connection.execute(
+                """INSERT INTO configurations (run_id, name, test_name, flowgraph_hash, content_key, exit_code, started, ended,
+                    duration_s, peak_memory_bytes, cpu_time_s, stream_watch_failures, termination, skipped, error, search)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (run_id, result["name"], test_name, result.get("flowgraph_hash"), result.get("content_key"), result.get("exit_code"),
+                 result.get("start"), result.get("end"), result.get("duration_s"), result.get("peak_memory_bytes"),
+                 result.get("cpu_time_s"), result.get("stream_watch_failures"), None if termination is None else json.dumps(termination),
+                 result.get("skipped"), result.get("error"), result.get("search")))
+            configuration_id = cursor.lastrowid
+            connection.executemany("INSERT INTO sweep_values (configuration_id, variable, value, numeric_value) VALUES (?, ?, ?, ?)",
+                                   [(configuration_id, variable, str(value), NumericValue(value)) for variable, value in (values or {}).items()])
+        return configuration_id
+
+    def query(self, sql: str, parameters: tuple | dict = ()) -> list[dict]:
+        """Run any read query.
+
+        Returns:
+            list[dict]: The rows
+        """
+        return [dict(row) for row in self.connection().execute(sql, parameters)]
+
+    def runs(self) -> list[dict]:
+        return self.query("SELECT * FROM runs ORDER BY id")
+
+    def latest_run_id(self) -> int | None:
+        rows = self.query("SELECT MAX(id) AS id FROM runs")
+        return rows[0]["id"] if rows else None
+
+    def configurations(self, run_id: int | None = None, test_name: str | None = None, variable: str | None = None, value=None) -> list[dict]:
+        """Find configuration results.  Every filter is optional.
+
+        Args:
+            run_id (int | None, optional): Only this run. Defaults to None.
+            test_name (str | None, optional): Only this test. Defaults to None.
+            variable (str | None, optional): Only configurations that swept this variable. Defaults to None.
+            value (optional): With variable, only configurations where it had this value.  Numbers are compared
+                numerically. Defaults to None.
+
+        Returns:
+            list[dict]: The configuration rows, with their run folder
+        """
+        sql = "SELECT configurations.*, runs.folder AS run_folder FROM configurations JOIN runs ON runs.id = configurations.run_id"
+        conditions = []
+        parameters = []
+        if variable is not None:
+            sql += " JOIN sweep_values ON sweep_values.configuration_id = configurations.id"
+            conditions.append("sweep_values.variable = ?")
+            parameters.append(variable)
+            if value is not None:
+                if NumericValue(value) is not None:
+                    conditions.append("sweep_values.numeric_value = ?")
+                    parameters.append(NumericValue(value))
+                else:
+                    conditions.append("sweep_values.value = ?")
+                    parameters.append(str(value))
+        if run_id is not None:
+            conditions.append("configurations.run_id = ?")
+            parameters.append(run_id)
+        if test_name is not None:
+            conditions.append("configurations.test_name = ?")
+            parameters.append(test_name)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY configurations.run_id, configurations.name"
+        return self.query(sql, tuple(parameters))
+
+    def durations(self) -> dict[str, float]:
+        """The duration of the latest run of each configuration that ran to completion, for estimates and balancing.
+
+        Returns:
+            dict[str, float]: The duration of each configuration in seconds
+        """
+        rows = self.query("""SELECT name, duration_s FROM configurations
+            WHERE id IN (SELECT MAX(id) FROM configurations WHERE skipped IS NULL AND duration_s IS NOT NULL GROUP BY name)""")
+        return {row["name"]: row["duration_s"] for row in rows}
+
+    def latest_results(self) -> dict[str, dict]:
+        """The latest result of each configuration, for ordering the next run.  The runs of bisect searches are
+        left out, since they are expected to fail on one side of the boundary.
+
+        Returns:
+            dict[str, dict]: The exit code, content key and duration of each configuration's latest row
+        """
+        rows = self.query("""SELECT name, exit_code, content_key, duration_s FROM configurations
+            WHERE id IN (SELECT MAX(id) FROM configurations WHERE search IS NULL GROUP BY name)""")
+        return {row["name"]: row for row in rows}
+
+    def test_durations(self) -> dict[str, float]:
+        """The mean duration of the configurations of each test, over all runs.
+
+        Returns:
+            dict[str, float]: The mean duration of each test in seconds
+        """
+        rows = self.query("""SELECT test_name, AVG(duration_s) AS duration_s FROM configurations
+            WHERE test_name IS NOT NULL AND skipped IS NULL AND duration_s IS NOT NULL GROUP BY test_name""")
+        return {row["test_name"]: row["duration_s"] for row in rows}
+
+    def sweep_values(self, configuration_id: int) -> dict:
+        return {row["variable"]: row["value"] for row in self.query("SELECT variable, value FROM sweep_values WHERE configuration_id = ?", (configuration_id,))}
@@ -75,8 +75,9 @@ class run_tests(gr.sync_block):
         """Start executing the tests.  This will replace the normal execution of the flowgraph.
         """
         print("Starting to run tests!")
-        tests = gt.PrepareTests(self.grc_file, self.staging_dir)
-        gt.RunTests(self.artifacts_dir, test_files = tests)
+        # Stream the generated tests so the first configuration runs while the rest are generated
+        tests = gt.StreamTests(self.grc_file, self.staging_dir)
+        gt.RunTests(self.artifacts_dir, test_files = tests, grcc_cache = gt.GrccCache())
         print("Tests Done.  Exiting...")
 
         # Now stop executing.  Use the provided external callback if able.
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import sys
+import json
+import heapq
+import shutil
+import hashlib
+import statistics
+from pathlib import Path
+from datetime import datetime
+from typing import Iterable, Iterator
+
+# Add the local path here to make local includes easier
+try:
+    import executor
+    from bisect_search import SEARCH_FILE_SUFFIX
+except:
+    sys.path.append(str(Path(__file__).parent))
+    print(f"Note: Adding path {Path(__file__).parent} to the python path.")
+    import executor
+    from bisect_search import SEARCH_FILE_SUFFIX
+
+def HashShard(name: str, shard_count: int) -> int:
+    """Choose a shard from the configuration name alone.  Every host gets the same answer, and adding or
+    removing other configurations does not move this one.
+
+    Args:
+        name (str): The configuration name
+        shard_count (int): The number of shards
+
+    Returns:
+        int: The shard index, from 0 to shard_count - 1
+    """
+    digest = hashlib.sha256(name.encode()).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+def BalanceShards(names: Iterable[str], shard_count: int, durations: dict[str, float]) -> dict[str, int]:
+    """Split the configurations so each shard takes about the same time.  The longest configurations are
+    placed first, each on the shard with the least work so far (longest processing time first).
+    Configurations without a recorded duration are assumed to take the median time.
+
+    The result only depends on the names and durations, so every host with the same history computes
+    the same split.
+
+    Args:
+        names (Iterable[str]): The configuration names
+        shard_count (int): The number of shards
+        durations (dict[str, float]): The recorded duration of each configuration in seconds.  See ReadDurations().
+
+    Returns:
+        dict[str, int]: The shard index of each configuration
+    """
+    names = sorted(set(names))
+    default_s = statistics.median(durations.values()) if durations else 1.0
+    costs = sorted(((durations.get(name, default_s), name) for name in names), key=lambda cost: (-cost[0], cost[1]))
+
+    loads = [(0.0, shard) for shard in range(shard_count)]
+    assignment = {}
+    for cost, name in costs:
+        load, shard = heapq.heappop(loads)
+        assignment[name] = shard
+        heapq.heappush(loads, (load + cost, shard))
+    return assignment
+
+def SelectShard(configurations: Iterable[tuple], shard_index: int, shard_count: int, durations: dict[str, float] | None = None) -> Iterator[tuple]:
+    """Keep the configurations of one shard from the output of generate_tests.IterateTestConfigurations().
+
+    Without durations, each configuration is placed with HashShard() and the input is streamed.  With
+    durations, all configurations are read first and placed with BalanceShards().
+
+    A parameterized flowgraph may be shared by configurations in different shards.  It is only attached
+    to the first configuration that uses it, so it is moved to the first one kept in this shard.
+
+    Args:
+        configurations (Iterable[tuple]): (TestConfiguration, flowgraph or None) pairs
+        shard_index (int): The shard to keep, from 0 to shard_count - 1
+        shard_count (int): The number of shards
+        durations (dict[str, float] | None, optional): Recorded durations for balancing. Defaults to None.
+
+    Raises:
+        ValueError: The shard index is out of range.
+
+    Yields:
+        tuple: The (TestConfiguration, flowgraph or None) pairs in this shard
+    """
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Shard index {shard_index} is not between 0 and {shard_count - 1}")
+
+    if durations:
+        configurations = list(configurations)
+        assignment = BalanceShards([configuration.name for configuration, _ in configurations], shard_count, durations)
+        InShard = lambda name: assignment[name] == shard_index
+    else:
+        InShard = lambda name: HashShard(name, shard_count) == shard_index
+
+    # Shared flowgraphs whose first user is in another shard
+    unsaved = {}
+    for configuration, flowgraph in configurations:
+        if not InShard(configuration.name):
+            if flowgraph is not None:
+                unsaved[configuration.flowgraph_name] = flowgraph
+            continue
+        if flowgraph is None:
+            flowgraph = unsaved.pop(configuration.flowgraph_name, None)
+        yield configuration, flowgraph
+
+def EstimateDurations(configurations: Iterable, durations: dict[str, float], test_durations: dict[str, float] | None = None) -> dict[str, float | None]:
+    """Guess how long each configuration will take from earlier runs.  A configuration that ran before uses its own
+    duration.  Otherwise the mean duration of its test is used, then the median of all durations.
+
+    Args:
+        configurations (Iterable): TestConfiguration objects
+        durations (dict[str, float]): The recorded duration of each configuration in seconds.  See ReadDurations().
+        test_durations (dict[str, float] | None, optional): The mean duration of each test. Defaults to None (computed from durations
+            for the configurations given).
+
+    Returns:
+        dict[str, float | None]: The estimated duration of each configuration, or None if there is no history at all
+    """
+    configurations = list(configurations)
+    if test_durations is None:
+        by_test = {}
+        for configuration in configurations:
+            if configuration.name in durations:
+                by_test.setdefault(configuration.test_name, []).append(durations[configuration.name])
+        test_durations = {test_name: statistics.mean(values) for test_name, values in by_test.items()}
+    default_s = statistics.median(durations.values()) if durations else None
+
+    estimates = {}
+    for configuration in configurations:
+        if configuration.name in durations:
+            estimates[configuration.name] = durations[configuration.name]
+        else:
+            estimates[configuration.name] = test_durations.get(configuration.test_name, default_s)
+    return estimates
+
+def EstimateWallTime(costs: Iterable[float], max_parallel: int = 1) -> float:
+    """Estimate the wall time of running tests with RunTests().  Each test starts, in order, as soon as one of
+    max_parallel slots is free.
+
+    Args:
+        costs (Iterable[float]): The duration of each test in seconds, in the order they run
+        max_parallel (int, optional): The number of tests that run at once. Defaults to 1.
+
+    Returns:
+        float: The time until the last test finishes, in seconds
+    """
+    slots = [0.0] * max(1, max_parallel)
+    for cost in costs:
+        heapq.heappush(slots, heapq.heappop(slots) + cost)
+    return max(slots)
+
+# How RunTests() orders the tests.  See HistoryOrder().
+ORDERS = ["given", "history"]
+
+# The history priorities, most urgent first
+PRIORITY_FAILED = 0
+PRIORITY_CHANGED = 1
+PRIORITY_UNCHANGED = 2
+
+def HistoryPriority(name: str, latest: dict[str, dict], content_key: str | None) -> int:
+    """How urgently a configuration should run: first if it failed last time, then if it is new or anything
+    that decides its outcome changed since then, then everything else.
+
+    Args:
+        name (str): The configuration name
+        latest (dict[str, dict]): The latest recorded result of each configuration.  See ResultsDatabase.latest_results().
+        content_key (str | None): The configuration's executor.ContentKey(), or None if it has none
+
+    Returns:
+        int: PRIORITY_FAILED, PRIORITY_CHANGED or PRIORITY_UNCHANGED
+    """
+    previous = latest.get(name)
+    if previous is None:
+        return PRIORITY_CHANGED
+    if previous.get("exit_code") != 0:
+        return PRIORITY_FAILED
+    if content_key is None or previous.get("content_key") != content_key:
+        return PRIORITY_CHANGED
+    return PRIORITY_UNCHANGED
+
+def HistoryOrder(names: list[str], latest: dict[str, dict], content_keys: dict[str, str | None], costs: dict[str, float | None]) -> list[int]:
+    """Order a run so the configurations most likely to fail start first.  Within each priority (see
+    HistoryPriority()), the longest start first, which keeps the last parallel slot from finishing long after
+    the others (longest processing time first).  Configurations without an estimate are assumed to take the
+    median time.  Ties keep their given order.
+
+    Args:
+        names (list[str]): The configuration names, in the given order
+        latest (dict[str, dict]): The latest recorded result of each configuration
+        content_keys (dict[str, str | None]): The current content key of each configuration
+        costs (dict[str, float | None]): The estimated duration of each configuration.  See EstimateDurations().
+
+    Returns:
+        list[int]: The positions in names, in the order to run them
+    """
+    known = [cost for cost in costs.values() if cost is not None]
+    default_s = statistics.median(known) if known else 0.0
+    def Key(i: int) -> tuple[int, float]:
+        cost = costs.get(names[i])
+        return HistoryPriority(names[i], latest, content_keys.get(names[i])), -(default_s if cost is None else cost)
+    return sorted(range(len(names)), key=Key)
+
+def ReadDurations(run_folders: Iterable[str | Path]) -> dict[str, float]:
+    """Read the test durations recorded by earlier runs.  Later folders take precedence.
+
+    Args:
+        run_folders (Iterable[str | Path]): Run folders created by RunTests() or MergeShards()
+
+    Returns:
+        dict[str, float]: The duration of each configuration in seconds
+    """
+    durations = {}
+    for run_folder in run_folders:
+        for result_file in sorted(Path(run_folder).glob(f"*/{executor.RESULT_FILE_NAME}")):
+            result = executor.ReadResult(result_file.parent)
+            if result is not None and "skipped" not in result and "duration_s" in result:
+                durations[result["name"]] = result["duration_s"]
+    return durations
+
+def MergeShards(shard_folders: Iterable[str | Path], output_dir: str | Path) -> Path:
+    """Combine the run folders of several shards into one run folder, with one summary.json for the whole suite.
+    The results of bisect searches are copied too.
+
+    Args:
+        shard_folders (Iterable[str | Path]): The run folder from each shard
+        output_dir (str | Path): The artifacts directory for the merged run.  A timestamped folder is created in it.
+
+    Raises:
+        ValueError: Two shards ran the same configuration.
+
+    Returns:
+        Path: The merged run folder
+    """
+    shard_folders = [Path(folder) for folder in shard_folders]
+    timestamp = datetime.now().strftime("%m_%d_%Y__%H_%M_%S")
+    merged = Path(output_dir) / f"{timestamp}_merged"
+    merged.mkdir(parents=True)
+    print(f"Merging {len(shard_folders)} shards into {str(merged)}")
+
+    results = []
+    wall_time_s = 0.0
+    cache_stats = {}
+    searches = {}
+    for shard_folder in shard_folders:
+        for test_folder in sorted(path for path in shard_folder.iterdir() if path.is_dir()):
+            destination = merged / test_folder.name
+            if destination.exists():
+                raise ValueError(f"Test {test_folder.name} is in more than one shard")
+            shutil.copytree(test_folder, destination)
+            result = executor.ReadResult(destination)
+            results.append({"name": test_folder.name, "exit_code": None} if result is None else result)
+        for search_file in sorted(shard_folder.glob(f"*{SEARCH_FILE_SUFFIX}")):
+            if (merged / search_file.name).exists():
+                raise ValueError(f"Search {search_file.name} is in more than one shard")
+            shutil.copy2(search_file, merged / search_file.name)
+
+        # The shards ran at the same time, so the merged run took as long as the slowest one
+        try:
+            with open(shard_folder / "summary.json", "r") as file:
+                summary = json.load(file)
+        except (OSError, ValueError):
+            continue
+        wall_time_s = max(wall_time_s, summary.get("tests", {}).get("wall_time_s", 0))
+        for name, value in summary.get("grcc_cache", {}).items():
+            cache_stats[name] = cache_stats.get(name, 0) + value
+        searches.update(summary.get("searches", {}))
+
+    summary = {"tests": executor.CompletionReport(results, wall_time_s), "shards": [str(folder) for folder in shard_folders]}
+    if cache_stats:
+        summary["grcc_cache"] = cache_stats
+    if searches:
+        summary["searches"] = searches
+    print("Merged summary:")
+    for name, value in summary.items():
+        print(f"   {name}: {value}")
+    with open(merged / "summary.json", "w") as of:
+        json.dump(summary, of, indent=2)
+    return merged
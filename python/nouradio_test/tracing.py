@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2024 nou Systems, Inc.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+# The file written to each run folder
+TRACE_FILE_NAME = "trace.json"
+
+def Now() -> int:
+    """The current time in microseconds.  Wall clock time is used so events from worker processes line up."""
+    return time.time_ns() // 1000
+
+
+class Tracer:
+    """Record how long each phase of the test pipeline takes.  Events are kept in the Chrome trace event format,
+    so the output can be opened in Perfetto (ui.perfetto.dev) or chrome://tracing.  Each thread and process
+    appears as its own track.
+    """
+    def __init__(self, enabled: bool = True):
+        """
+        Args:
+            enabled (bool, optional): Record events.  When False, nothing is recorded, including the events of
+                worker processes. Defaults to True.
+        """
+        self.enabled: bool = enabled
+        self.events: list[dict] = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, category: str = "pipeline", **args):
+        """Record the time spent in a block of code.
+
+        Args:
+            name (str): The phase name.  Spans with the same name are summarized together.
+            category (str, optional): A group of phases. Defaults to "pipeline".
+            args: Details to show with the event, such as the configuration name
+        """
+        if not self.enabled:
+            yield
+            return
+        start = Now()
+        try:
+            yield
+        finally:
+            self.add({"name": name, "cat": category, "ph": "X", "ts": start, "dur": Now() - start,
+                      "pid": os.getpid(), "tid": threading.get_ident(), "args": args})
+
+    def iterate(self, iterable: Iterable, name: str, category: str = "pipeline", **args) -> Iterator:
+        """Record the time taken to produce each item of an iterator, such as a generator that does work lazily.
+        """
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            with self.span(name, category, **args):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def add(self, event: dict):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.events.append(event)
+
+    def extend(self, events: Iterable[dict]):
+        """Add events recorded elsewhere, such as in a worker process.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.events.extend(events)
+
+    def drain(self) -> list[dict]:
+        """Remove and return all events recorded so far.
+        """
+        with self.lock:
+            events, self.events = self.events, []
+        return events
+
+    def write(self, path: str | Path, events: list[dict] | None = None):
+        """Write a Chrome trace JSON file.
+
+        Args:
+            path (str | Path): The output file
+            events (list[dict] | None, optional): The events to write. Defaults to None (all events recorded so far).
+        """
+        if events is None:
+            with self.lock:
+                events = list(self.events)
+        with open(path, "w") as of:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, of)
+
+    @staticmethod
+    def summary(events: list[dict]) -> list[dict]:
+        """Total the time spent in each phase.
+
+        Returns:
+            list[dict]: The count, total, mean and max duration of each phase, longest total first
+        """
+        phases = {}
+        for event in events:
+            if event.get("ph") != "X":
+                continue
+            phase = phases.setdefault(event["name"], {"phase": event["name"], "count": 0, "total_s": 0.0, "max_s": 0.0})
+            duration_s = event["dur"] / 1e6
+            phase["count"] += 1
+            phase["total_s"] += duration_s
+            phase["max_s"] = max(phase["max_s"], duration_s)
+        for phase in phases.values():
+            phase["mean_s"] = phase["total_s"] / phase["count"]
+        return sorted(phases.values(), key=lambda phase: -phase["total_s"])
+
+    @staticmethod
+    def print_summary(events: list[dict]):
+        """Print a table of the time spent in each phase.  Phases that run in parallel can add up to more than the wall time.
+        """
+        rows = Tracer.summary(events)
+        if not rows:
+            return
+        width = max(len("Phase"), *(len(row["phase"]) for row in rows))
+        print("Time by phase:")
+        print(f"   {'Phase':<{width}}  {'Count':>7}  {'Total (s)':>10}  {'Mean (ms)':>10}  {'Max (ms)':>10}")
+        for row in rows:
+            print(f"   {row['phase']:<{width}}  {row['count']:>7}  {row['total_s']:>10.3f}  {row['mean_s'] * 1000:>10.1f}  {row['max_s'] * 1000:>10.1f}")
+
+
+# The tracer shared by the whole pipeline in this process
+TRACER = Tracer()
@@ -10,28 +10,35 @@ from gnuradio import gr
 
 class variable_change(gr.basic_block):
     """This block does not execute.  Instead, it holds data to change variables as a sweep for automated runs.
-    Only one variable_change block can be active per test run (except for mode="constant").  Disable others,
-    or use the test_name_filter to specify relevant tests.
+    When several variable_change blocks (other than mode="constant") apply to the same test, every combination
+    of their values is run.  Use the constraint to skip combinations that are not valid, and use the
+    test_name_filter to specify relevant tests.
 
     Possible modes are as follows:
     "constant": Change the specified variable to the chose value.  Will not produce a sweep.
     "range": Produce one flowgraph for each value in [start:step:stop)
     "linspace": Produce "count" number of values in the range [start:stop]
     "choices": Produce one flowgraph for each choice provided in the list.
+    "bisect": Find the value in [start:stop] where the test starts to fail, to within the tolerance.  Each run
+              chooses the next value from the outcome of the earlier ones, so it takes about log2((stop - start) / tolerance)
+              runs.  The variable must be a plain variable block.
     """
-    def __init__(self, test_name_filter:str = ".*", mode:str = "constant", variable:str = "", start_value:float = 0.0, stop_value:float = 100.0, step:float=1.0, count:int = 100, choices:str = "", value = None,):
+    def __init__(self, test_name_filter:str = ".*", mode:str = "constant", variable:str = "", start_value:float = 0.0, stop_value:float = 100.0, step:float=1.0, count:int = 100, choices:str = "", value = None, constraint:str = "", tolerance:float = 1.0):
         """_summary_
 
         Args:
             test_name_filter (str, optional): When running automated tests, filter which tests trigger this stop. Defaults to ".*" (all tests).
-            mode (str, optional): How to apply this sweep.  Can be constant, range, linspace, or choices. Defaults to "constant".
+            mode (str, optional): How to apply this sweep.  Can be constant, range, linspace, choices, or bisect. Defaults to "constant".
             variable (str, optional): The id of the variable block to modify. Defaults to "".
-            start_value (float, optional): The start value when mode = "range" or "linspace". Defaults to 0.0.
-            stop_value (float, optional): The stop value when mode = "range" or "linspace". Defaults to 100.0.
+            start_value (float, optional): The start value when mode = "range", "linspace" or "bisect". Defaults to 0.0.
+            stop_value (float, optional): The stop value when mode = "range", "linspace" or "bisect". Defaults to 100.0.
             step (float, optional): The step size when mode = "range". Defaults to 1.0.
             count (int, optional): The step count when mode = "linspace". Defaults to 100.
             choices (str, optional): A string of comma-separated values when mode = "choice".  Each choice will be copied as-is into the produced flowgraphs. Defaults to "".
             value (Any, optional): The value of the variable when mode = "constant". Defaults to None.
+            constraint (str, optional): A Python expression of the swept variable ids, such as "gain < 2 * bandwidth".  Combinations
+                where it is False are skipped.  Defaults to "" (no constraint).
+            tolerance (float, optional): When mode = "bisect", stop once the passing and failing values are this close. Defaults to 1.0.
 
         Raises:
             ValueError: Indicates an invalid mode choice
@@ -40,7 +47,7 @@ class variable_change(gr.basic_block):
             name="Test: Variable Change",
             in_sig=[],
             out_sig=[])
-        self.possible_modes = ["constant", "range", "linspace", "choices"]
+        self.possible_modes = ["constant", "range", "linspace", "choices", "bisect"]
 
         if mode not in self.possible_modes:
             raise ValueError(f"Variable Change Mode {mode} is not a valid option!  Must be one of {self.possible_modes}")
@@ -53,3 +60,5 @@ class variable_change(gr.basic_block):
         self.step = step
         self.choices = choices
         self.value = value
+        self.constraint = constraint
+        self.tolerance = tolerance